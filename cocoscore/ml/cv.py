@@ -1,7 +1,15 @@
 from collections import defaultdict
 # import gzip
+from concurrent.futures import ThreadPoolExecutor
+import math
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import warnings
+
 import numpy as np
-# import os
 import pandas as pd
 # from sklearn.ensemble import RandomForestClassifier
 # from sklearn.feature_extraction.text import CountVectorizer
@@ -135,6 +143,38 @@ def compute_cv_fold_stats(data_df, cv_splits):
                          'n_test': n_test, 'pos_test': pos_test})
 
 
+def get_fold_workers(n_jobs, thread=1):
+    """
+    Computes how many CV folds can run concurrently within a CPU budget.
+
+    :param n_jobs: int, the number of CPUs to use; capped at the number of CPUs of the machine
+    :param thread: int, the number of threads used by each fold, e.g. by fastText
+    :return: int, the number of folds to run concurrently such that folds times threads do not exceed the budget
+    """
+    if n_jobs < 1 or thread < 1:
+        raise ValueError('n_jobs and thread must be positive.')
+    return max(1, min(n_jobs, os.cpu_count() or 1) // thread)
+
+
+def run_cv_folds(fold_function, cv_splits, max_workers=1):
+    """
+    Applies a function to each CV fold, optionally running folds concurrently in threads. This pays off when folds
+    spend their time in external processes such as fastText.
+
+    :param fold_function: function that takes the (train_indices, test_indices) tuple of a fold and returns its results
+    :param cv_splits: a given cv splitting as e.g. returned by cv_independent_associations()
+    :param max_workers: int, the number of folds to run concurrently, see get_fold_workers()
+    :return: list of the results of fold_function in fold order. If fold_function raises for some folds, the exception
+    of the first of these folds is raised as in a serial loop.
+    """
+    cv_splits = list(cv_splits)
+    if max_workers <= 1 or len(cv_splits) <= 1:
+        return [fold_function(train_test_indices) for train_test_indices in cv_splits]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(cv_splits))) as executor:
+        futures = [executor.submit(fold_function, train_test_indices) for train_test_indices in cv_splits]
+        return [future.result() for future in futures]
+
+
 def _remove_missing_data_points(matrix_loaded, dataset):
     keep_rows = np.all(np.isfinite(matrix_loaded), axis=1)
     dataset_cleaned = dataset.loc[keep_rows, :]
@@ -331,7 +371,113 @@ def get_random_parameter_sampler(param_distributions, n_iter):
         yield params
 
 
-def random_cv(dataset, cv_function, cv_iterations, param_dict, param_distribution, random_seed):
+_shared_trial = {}
+
+
+def get_fork_context():
+    """
+    Returns the multiprocessing context used for worker processes. Workers are forked so that they inherit functions
+    and data that cannot be pickled, such as closures around cross-validation functions, regardless of the default
+    start method of the platform (spawn on macOS, forkserver as of Python 3.14).
+
+    :return: the multiprocessing context of the fork start method or None if it is not available, e.g. on Windows.
+    Callers then do their work serially.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+
+def _init_trial_worker(dataset, cv_function):
+    _shared_trial['dataset'] = dataset
+    _shared_trial['cv_function'] = cv_function
+
+
+def _get_picklable_error(error):
+    # exceptions are sent back to the parent process, which requires them to be picklable
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError('{}: {}'.format(type(error).__name__, error))
+
+
+def _run_trial_worker(trial):
+    params, random_seed = trial
+    # each trial gets its own temporary directory that is removed afterwards, even if the trial fails
+    workspace = tempfile.mkdtemp(prefix='random_cv_')
+    previous_tempdir, previous_tmpdir_env = tempfile.tempdir, os.environ.get('TMPDIR')
+    tempfile.tempdir = workspace
+    os.environ['TMPDIR'] = workspace
+    try:
+        return _shared_trial['cv_function'](_shared_trial['dataset'], params, np.random.RandomState(random_seed)), None
+    except Exception as e:
+        return None, _get_picklable_error(e)
+    finally:
+        tempfile.tempdir = previous_tempdir
+        if previous_tmpdir_env is None:
+            del os.environ['TMPDIR']
+        else:
+            os.environ['TMPDIR'] = previous_tmpdir_env
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def _sample_trial_params(param_dict, param_distribution, cv_iterations):
+    trial_params = []
+    for params in get_random_parameter_sampler(param_distribution, cv_iterations):
+        # set parameters to be kept fixed
+        for param, value in param_dict.items():
+            params[param] = value
+        trial_params.append(params)
+    return trial_params
+
+
+def _run_cv_trials(dataset, cv_function, trial_params, random_seed, n_jobs=1, raise_errors=None):
+    # returns the CV results of each parameter setting in order. If raise_errors, the exception of the first failed
+    # trial is raised; otherwise failed trials are reported with a warning and yield a row without columns, which is
+    # filled with missing values when concatenated with other results
+    context = get_fork_context()
+    parallel = n_jobs > 1 and len(trial_params) > 1 and context is not None
+    if raise_errors is None:
+        raise_errors = not parallel
+    if parallel:
+        with context.Pool(processes=min(n_jobs, len(trial_params)), initializer=_init_trial_worker,
+                          initargs=(dataset, cv_function)) as pool:
+            trial_results = pool.map(_run_trial_worker, [(params, random_seed) for params in trial_params],
+                                     chunksize=1)
+    elif raise_errors:
+        return [cv_function(dataset, params, np.random.RandomState(random_seed)) for params in trial_params]
+    else:
+        trial_results = []
+        for params in trial_params:
+            try:
+                trial_results.append((cv_function(dataset, params, np.random.RandomState(random_seed)), None))
+            except Exception as e:
+                trial_results.append((None, e))
+    cv_results = []
+    for i, (iteration_results, error) in enumerate(trial_results):
+        if error is not None:
+            if raise_errors:
+                raise error
+            warnings.warn('Cross-validation iteration {} failed: {}: {}'.format(i, type(error).__name__, error))
+            iteration_results = pd.DataFrame(index=[0])
+        cv_results.append(iteration_results)
+    return cv_results
+
+
+def _get_cv_results_df(trial_params, cv_results):
+    # Aggregate parameter settings and CV results into output DataFrame
+    cv_parameters = defaultdict(list)
+    for params in trial_params:
+        for param, value in params.items():
+            cv_parameters[param.replace('-', '')].append(value)
+    results_df = pd.DataFrame(cv_parameters, columns=sorted(cv_parameters.keys()))
+    cv_iteration_results = pd.concat(cv_results)
+    return pd.concat([results_df.reset_index(drop=True), cv_iteration_results.reset_index(drop=True)], axis=1)
+
+
+def random_cv(dataset, cv_function, cv_iterations, param_dict, param_distribution, random_seed, n_jobs=1,
+              raise_errors=None):
     """
     Performs a cross-validation over randomly sampled parameter values for a given dataset and
     a given cross-validation function.
@@ -345,23 +491,170 @@ def random_cv(dataset, cv_function, cv_iterations, param_dict, param_distributio
     :param param_dict: dict specifying parameters and values that are to be kept fixed
     :param param_distribution: dict mapping parameters to distributions to sample parameters from
     :param random_seed: int to seed numpy RandomState to use while splitting into CV folds in each iteration
+    :param n_jobs: int, the number of worker processes to run cross-validation iterations in. If larger than 1,
+           parameters are sampled up front as in a serial run and each iteration runs in a worker process with its own
+           temporary directory (tempfile.tempdir and TMPDIR point to it) that is removed afterwards. Results are
+           returned in the order of a serial run. The worker processes are forked (see get_fork_context()), so
+           cv_function does not need to be picklable; where forking is not available, iterations run serially.
+    :param raise_errors: boolean or None. If False, an iteration that raises an exception is reported with a warning
+           and missing (NaN) results, so one failed iteration does not cancel the others. If True, the exception raised
+           by cv_function is raised by random_cv(); a parallel run finishes all iterations before raising the exception
+           of the first failed one. If None (default), exceptions are raised by serial runs only, i.e. parallel runs
+           behave as with False.
     :return: a pandas DataFrame containing results aggregated over the CV iterations; column names should be explanatory
     """
-    cv_parameters = defaultdict(list)
-    cv_results = []
-    for params in get_random_parameter_sampler(param_distribution, cv_iterations):
-        # set parameters to be kept fixed
-        for param, value in param_dict.items():
-            params[param] = value
+    trial_params = _sample_trial_params(param_dict, param_distribution, cv_iterations)
+    cv_results = _run_cv_trials(dataset, cv_function, trial_params, random_seed, n_jobs=n_jobs,
+                                raise_errors=raise_errors)
+    return _get_cv_results_df(trial_params, cv_results)
 
-        iteration_results = cv_function(dataset, params, np.random.RandomState(random_seed))
 
-        # save parameter settings and CV results to aggregate them later
-        for param, value in params.items():
-            cv_parameters[param.replace('-', '')].append(value)
-        cv_results.append(iteration_results)
-    # Aggregate parameter settings and CV results into output DataFrame
-    results_df = pd.DataFrame(cv_parameters, columns=sorted(cv_parameters.keys()))
-    cv_iteration_results = pd.concat(cv_results)
-    results_df = pd.concat([results_df.reset_index(drop=True), cv_iteration_results.reset_index(drop=True)], axis=1)
-    return results_df
+def get_association_ranks(data_df, entity_columns=('entity1', 'entity2'), random_state=None):
+    """
+    Assigns a random rank to each association, i.e. unordered entity pair, of a dataset.
+
+    :param data_df: the DataFrame holding associations
+    :param entity_columns: tuple of str, column names in data_df where interacting entities can be found
+    :param random_state: numpy RandomState used to shuffle associations
+    :return: numpy array holding the rank of the association of each row of data_df. Ranks are a random permutation of
+    0, ..., number of associations - 1 such that all rows of an association share its rank.
+    """
+    if random_state is None:
+        random_state = np.random.RandomState()
+    entity_1 = data_df[entity_columns[0]].astype(str).values
+    entity_2 = data_df[entity_columns[1]].astype(str).values
+    is_sorted = entity_1 <= entity_2
+    associations = pd.Series(np.where(is_sorted, entity_1, entity_2)) + '\t' + \
+        pd.Series(np.where(is_sorted, entity_2, entity_1))
+    codes, uniques = pd.factorize(associations, sort=True)
+    ranks = np.arange(len(uniques))
+    random_state.shuffle(ranks)
+    return ranks[codes]
+
+
+def _get_halving_round_count(n, reduction_factor):
+    # the number of rounds until at most one of n parameter settings remains
+    rounds = 1
+    while n >= reduction_factor ** rounds:
+        rounds += 1
+    return rounds
+
+
+def successive_halving_cv(dataset, cv_function, cv_iterations, param_dict, param_distribution, random_seed,
+                          reduction_factor=3, resource_param=None, max_resource=None, min_resource=None,
+                          score_column='mean_test_score', entity_columns=('entity1', 'entity2'), n_jobs=1):
+    """
+    Performs a successive halving search over randomly sampled parameter values. All sampled settings are first
+    cross-validated with a small budget, the best 1 / reduction_factor of them are cross-validated again with a budget
+    reduction_factor times larger, and so on until the full budget is reached. The budget is either the fraction of
+    associations of the dataset used for cross-validation or the value of a parameter such as fastText's '-epoch'.
+
+    :param dataset: DataFrame, the data set to be cross-validated
+    :param cv_function: function performing a single cross-validation run, see random_cv()
+    :param cv_iterations: int, the number of random parameter assignments to try out in the first round
+    :param param_dict: dict specifying parameters and values that are to be kept fixed
+    :param param_distribution: dict mapping parameters to distributions to sample parameters from
+    :param random_seed: int to seed numpy RandomState to use while splitting into CV folds in each iteration and while
+    subsampling associations
+    :param reduction_factor: int, the factor by which the number of settings decreases and the budget increases in each
+    round
+    :param resource_param: str, the parameter that sets the budget, e.g. '-epoch'. Its values are rounded to integers if
+    max_resource is an integer. If None (default), the budget is the fraction of associations in dataset; rows of the
+    same association are always kept together and each round uses a superset of the associations of previous rounds.
+    :param max_resource: the budget of the last round. Defaults to 1.0, i.e. the whole dataset, if resource_param is
+    None and is mandatory otherwise.
+    :param min_resource: the budget of the first round. If None, it is chosen such that a single setting remains in the
+    last round. Otherwise, the search stops after the round with the full budget even if several settings remain.
+    :param score_column: str, the column of the results of cv_function used to rank settings; higher is better
+    :param entity_columns: tuple of str, column names in dataset where interacting entities can be found
+    :param n_jobs: int, the number of worker processes to run cross-validation iterations in, see random_cv()
+    :return: a pandas DataFrame in the format returned by random_cv() with one row per setting and round and two
+    additional columns: halving_round (starting at 0) and halving_resource (the budget of the round). Iterations that
+    raise an exception are reported with a warning, get missing (NaN) results and are ranked last.
+    """
+    if reduction_factor < 2:
+        raise ValueError('reduction_factor must be at least 2.')
+    if max_resource is None:
+        if resource_param is not None:
+            raise ValueError('max_resource must be given along with resource_param.')
+        max_resource = 1.0
+    if resource_param is None and not 0 < max_resource <= 1:
+        raise ValueError('The fraction of associations max_resource must be in (0, 1].')
+    if min_resource is not None and not 0 < min_resource <= max_resource:
+        raise ValueError('min_resource must be positive and at most max_resource.')
+
+    trial_params = _sample_trial_params(param_dict, param_distribution, cv_iterations)
+    round_count = _get_halving_round_count(len(trial_params), reduction_factor)
+    if min_resource is None:
+        min_resource = max_resource / reduction_factor ** (round_count - 1)
+    else:
+        resource_round_count = 1
+        while min_resource * reduction_factor ** resource_round_count <= max_resource * (1 + 1e-9):
+            resource_round_count += 1
+        round_count = min(round_count, resource_round_count)
+    resources = [min_resource * reduction_factor ** i for i in range(round_count - 1)] + [max_resource]
+    if isinstance(max_resource, (int, np.integer)) and resource_param is not None:
+        resources = [max(1, int(round(resource))) for resource in resources]
+
+    association_ranks = get_association_ranks(dataset, entity_columns, np.random.RandomState(random_seed)) \
+        if resource_param is None else None
+    round_results = []
+    for halving_round, resource in enumerate(resources):
+        if resource_param is None:
+            round_dataset = dataset.iloc[association_ranks < math.ceil(resource * (association_ranks.max() + 1)), :]
+            round_params = trial_params
+        else:
+            round_dataset = dataset
+            round_params = [dict(params, **{resource_param: resource}) for params in trial_params]
+        cv_results = _run_cv_trials(round_dataset, cv_function, round_params, random_seed, n_jobs=n_jobs,
+                                    raise_errors=False)
+        results_df = _get_cv_results_df(round_params, cv_results)
+        results_df['halving_round'] = halving_round
+        results_df['halving_resource'] = resource
+        round_results.append(results_df)
+
+        # keep the best settings, breaking ties by sampling order
+        survivor_count = max(1, len(trial_params) // reduction_factor)
+        if score_column in results_df:
+            scores = results_df[score_column].astype(float).fillna(-np.inf).values
+        else:
+            scores = np.full(len(results_df), -np.inf)
+        survivors = np.sort(np.argsort(-scores, kind='stable')[:survivor_count])
+        trial_params = [trial_params[i] for i in survivors]
+    return pd.concat(round_results, ignore_index=True, sort=False)
+
+
+def hyperband_cv(dataset, cv_function, param_dict, param_distribution, random_seed, min_resource,
+                 reduction_factor=3, resource_param=None, max_resource=None, score_column='mean_test_score',
+                 entity_columns=('entity1', 'entity2'), n_jobs=1):
+    """
+    Performs a Hyperband search, i.e. several successive halving searches (brackets) that trade off the number of
+    sampled settings against the budget of their first round: the first bracket starts many settings with
+    min_resource, the last bracket cross-validates a few settings with the full budget only.
+
+    :param min_resource: the smallest budget of a round, see successive_halving_cv()
+    :return: a pandas DataFrame in the format returned by successive_halving_cv() with an additional column
+    hyperband_bracket (starting at 0)
+
+    See successive_halving_cv() for a description of the remaining parameters.
+    """
+    if max_resource is None:
+        max_resource = 1.0 if resource_param is None else None
+    if max_resource is None:
+        raise ValueError('max_resource must be given along with resource_param.')
+    if not 0 < min_resource <= max_resource:
+        raise ValueError('min_resource must be positive and at most max_resource.')
+    max_bracket = 0
+    while min_resource * reduction_factor ** (max_bracket + 1) <= max_resource * (1 + 1e-9):
+        max_bracket += 1
+    bracket_results = []
+    for bracket, s in enumerate(range(max_bracket, -1, -1)):
+        cv_iterations = int(math.ceil((max_bracket + 1) / (s + 1) * reduction_factor ** s))
+        results_df = successive_halving_cv(dataset, cv_function, cv_iterations, param_dict, param_distribution,
+                                           random_seed, reduction_factor=reduction_factor,
+                                           resource_param=resource_param, max_resource=max_resource,
+                                           min_resource=max_resource / reduction_factor ** s,
+                                           score_column=score_column, entity_columns=entity_columns, n_jobs=n_jobs)
+        results_df['hyperband_bracket'] = bracket
+        bracket_results.append(results_df)
+    return pd.concat(bracket_results, ignore_index=True, sort=False)
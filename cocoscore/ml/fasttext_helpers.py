@@ -1,6 +1,8 @@
 import gzip
 import os
+import shutil
 import subprocess
+import tempfile
 from statistics import mean, stdev
 
 import numpy as np
@@ -8,10 +10,12 @@ import pandas as pd
 from gensim import utils
 from sklearn.metrics import average_precision_score, roc_auc_score
 
-from .cv import compute_cv_fold_stats, cv_independent_associations
+from .cv import compute_cv_fold_stats, cv_independent_associations, get_fold_workers, run_cv_folds
 from .tools import get_uniform_int, get_log_uniform
 from ..tools.file_tools import get_file_handle
 
+_shm_dir = '/dev/shm'
+
 
 def get_hyperparameter_distributions(random_seed=None):
     """
@@ -123,7 +127,7 @@ def fasttext_predict(trained_model_path, test_file_path, fasttext_path, probabil
 
 
 def fasttext_fit_predict_default(train_df, test_df, dim=300, epochs=50, lr=0.005, wordngrams=2, ws=5,
-                                 bucket=2000000):
+                                 bucket=2000000, thread=1):
     """
     Fit and predict fastText with default parameters for given training and test set.
 
@@ -135,10 +139,10 @@ def fasttext_fit_predict_default(train_df, test_df, dim=300, epochs=50, lr=0.005
     :param wordngrams: fasttext parameter
     :param ws: fasttext parameter
     :param bucket: fasttext parameter
+    :param thread: int, the number of threads to be used by fastText
     :return: tuple of training and test performance
     """
     fasttext_path = 'fasttext'
-    thread = 1
     compress_model = True
     param_dict = {'-dim': dim, '-epoch': epochs, '-lr': lr, '-wordNgrams': wordngrams, '-ws': ws, '-bucket': bucket}
     pretrained_vectors_path = None
@@ -153,41 +157,49 @@ def fasttext_fit_predict_default(train_df, test_df, dim=300, epochs=50, lr=0.005
                                  pretrained_vectors_path)
 
 
+def get_fasttext_temp_root():
+    """
+    :return: str, the directory to create temporary fastText files in: /dev/shm if it is writable, such that files are
+    kept in memory, and None (i.e. the default temporary directory, see tempfile.gettempdir()) otherwise
+    """
+    if os.path.isdir(_shm_dir) and os.access(_shm_dir, os.W_OK):
+        return _shm_dir
+    return None
+
+
 def _fasttext_fit_predict(train_text_series, train_class_series,
                           test_text_series, test_class_series,
                           param_dict, fasttext_path, thread, compress_model,
                           pretrained_vectors_path,
                           metric='roc_auc_score'):
-    # manual printing to file as to_csv complains about space as separator and spaces within sentences
-    train_path = '/dev/shm/tmp_ft_train.txt'
-    test_path = '/dev/shm/tmp_ft_test.txt'
-    for curr_file, text_class in zip([train_path, test_path],
-                                     [(train_text_series, train_class_series),
-                                      (test_text_series, test_class_series)]):
-        with open(curr_file, 'wt', encoding='utf-8') as fout:
-            for text, _class in zip(*text_class):
-                fout.write(str(_class) + ' ' + str(text) + os.linesep)
-
-    train_prob_file_path = '/dev/shm/tmp_ft_train-prob_iter_'
-    test_prob_file_path = '/dev/shm/tmp_ft_test-prob_iter_'
+    # each call works in its own directory so that concurrent calls do not overwrite each other's files
+    work_dir = tempfile.mkdtemp(prefix='fasttext_', dir=get_fasttext_temp_root())
     try:
-        model_file = fasttext_fit(train_path, param_dict, fasttext_path, thread=thread,
-                                  compress_model=compress_model,
-                                  pretrained_vectors_path=pretrained_vectors_path)
-        fasttext_predict(model_file, train_path, fasttext_path, train_prob_file_path)
-        fasttext_predict(model_file, test_path, fasttext_path, test_prob_file_path)
-        # os.remove(model_file)
-        train_metric, train_scores = _compute_metric(train_path, train_prob_file_path, metric=metric)
-        test_metric, test_scores = _compute_metric(test_path, test_prob_file_path, metric=metric)
-    except subprocess.CalledProcessError:
-        # fastText may fail (e.g. segfault) for some parameter combinations
-        raise IOError('fasttext failed in _fasttext_fit_predict.')
+        # manual printing to file as to_csv complains about space as separator and spaces within sentences
+        train_path = os.path.join(work_dir, 'train.txt')
+        test_path = os.path.join(work_dir, 'test.txt')
+        for curr_file, text_class in zip([train_path, test_path],
+                                         [(train_text_series, train_class_series),
+                                          (test_text_series, test_class_series)]):
+            with open(curr_file, 'wt', encoding='utf-8') as fout:
+                for text, _class in zip(*text_class):
+                    fout.write(str(_class) + ' ' + str(text) + os.linesep)
+
+        train_prob_file_path = os.path.join(work_dir, 'train-prob')
+        test_prob_file_path = os.path.join(work_dir, 'test-prob')
+        try:
+            model_file = fasttext_fit(train_path, param_dict, fasttext_path, thread=thread,
+                                      compress_model=compress_model, model_path=os.path.join(work_dir, 'model'),
+                                      pretrained_vectors_path=pretrained_vectors_path)
+            fasttext_predict(model_file, train_path, fasttext_path, train_prob_file_path)
+            fasttext_predict(model_file, test_path, fasttext_path, test_prob_file_path)
+            train_metric, train_scores = _compute_metric(train_path, train_prob_file_path, metric=metric)
+            test_metric, test_scores = _compute_metric(test_path, test_prob_file_path, metric=metric)
+        except subprocess.CalledProcessError:
+            # fastText may fail (e.g. segfault) for some parameter combinations
+            raise IOError('fasttext failed in _fasttext_fit_predict.')
     finally:
-        # os.remove(train_path)
-        # os.remove(test_path)
-        # os.remove(train_prob_file_path)
-        # os.remove(test_prob_file_path)
-        pass
+        shutil.rmtree(work_dir, ignore_errors=True)
     return train_metric, train_scores, test_metric, test_scores
 
 
@@ -211,7 +223,7 @@ def fasttext_cv_independent_associations(data_df, param_dict, fasttext_path, cv_
                                          entity_columns=('entity1', 'entity2'), random_state=None,
                                          thread=1, compress_model=False,
                                          pretrained_vectors_path=None,
-                                         metric='roc_auc_score'):
+                                         metric='roc_auc_score', n_jobs=1):
     """
     A wrapper around `cv_independent_associations()` in `ml/cv.py` that runs fastText on each CV fold and returns
     training and validation (by default) AUROC for each fold, means and standard variation across folds along with
@@ -229,6 +241,8 @@ def fasttext_cv_independent_associations(data_df, param_dict, fasttext_path, cv_
     :param pretrained_vectors_path: str, path to pre-trained `.vec` file with word embeddings
     :param metric: performance metric used for evaluation - can be either 'roc_auc_score' (the default) or
     'average_precision_score'
+    :param n_jobs: int, the number of CPUs to use. Folds run concurrently such that folds times thread does not exceed
+    n_jobs or the number of CPUs of the machine, see cv.get_fold_workers(). Results are identical to a serial run.
     :return: a pandas DataFrame with cross_validation results
     """
     cv_sets = list(cv_independent_associations(data_df, cv_folds=cv_folds, random_state=random_state,
@@ -237,41 +251,42 @@ def fasttext_cv_independent_associations(data_df, param_dict, fasttext_path, cv_
 
     # write temporary files for each CV train and test fold
     # then run fasttext and compute AUROC on each fold
-    train_performances = []
-    test_performances = []
-    for cv_iter, train_test_indices in enumerate(cv_sets):
+    def evaluate_fold(train_test_indices):
         train_indices, test_indices = train_test_indices
         train_df = data_df.iloc[train_indices, :]
         test_df = data_df.iloc[test_indices, :]
-        try:
-            train_performance, _, test_performance, _ = _fasttext_fit_predict(train_df['text'].str.lower(),
-                                                                              get_fasttext_classes(train_df),
-                                                                              test_df['text'].str.lower(),
-                                                                              get_fasttext_classes(test_df),
-                                                                              param_dict,
-                                                                              fasttext_path,
-                                                                              thread,
-                                                                              compress_model,
-                                                                              pretrained_vectors_path,
-                                                                              metric=metric)
-            train_performances.append(train_performance)
-            test_performances.append(test_performance)
-        except IOError:
-            # return missing results if fasttext failed for at least one CV fold
-            results_df = pd.DataFrame()
-            results_df['mean_test_score'] = [np.nan]
-            results_df['stdev_test_score'] = [np.nan]
-            results_df['mean_train_score'] = [np.nan]
-            results_df['stdev_train_score'] = [np.nan]
-            for stats_row in cv_stats_df.itertuples():
-                cv_fold = str(stats_row.fold)
-                results_df['split_' + cv_fold + '_test_score'] = [np.nan]
-                results_df['split_' + cv_fold + '_train_score'] = [np.nan]
-                results_df['split_' + cv_fold + '_n_test'] = [np.nan]
-                results_df['split_' + cv_fold + '_pos_test'] = [np.nan]
-                results_df['split_' + cv_fold + '_n_train'] = [np.nan]
-                results_df['split_' + cv_fold + '_pos_train'] = [np.nan]
-            return results_df
+        train_performance, _, test_performance, _ = _fasttext_fit_predict(train_df['text'].str.lower(),
+                                                                          get_fasttext_classes(train_df),
+                                                                          test_df['text'].str.lower(),
+                                                                          get_fasttext_classes(test_df),
+                                                                          param_dict,
+                                                                          fasttext_path,
+                                                                          thread,
+                                                                          compress_model,
+                                                                          pretrained_vectors_path,
+                                                                          metric=metric)
+        return train_performance, test_performance
+
+    try:
+        fold_performances = run_cv_folds(evaluate_fold, cv_sets, max_workers=get_fold_workers(n_jobs, thread))
+    except IOError:
+        # return missing results if fasttext failed for at least one CV fold
+        results_df = pd.DataFrame()
+        results_df['mean_test_score'] = [np.nan]
+        results_df['stdev_test_score'] = [np.nan]
+        results_df['mean_train_score'] = [np.nan]
+        results_df['stdev_train_score'] = [np.nan]
+        for stats_row in cv_stats_df.itertuples():
+            cv_fold = str(stats_row.fold)
+            results_df['split_' + cv_fold + '_test_score'] = [np.nan]
+            results_df['split_' + cv_fold + '_train_score'] = [np.nan]
+            results_df['split_' + cv_fold + '_n_test'] = [np.nan]
+            results_df['split_' + cv_fold + '_pos_test'] = [np.nan]
+            results_df['split_' + cv_fold + '_n_train'] = [np.nan]
+            results_df['split_' + cv_fold + '_pos_train'] = [np.nan]
+        return results_df
+    train_performances = [train_performance for train_performance, _ in fold_performances]
+    test_performances = [test_performance for _, test_performance in fold_performances]
 
     # aggregate performance measures and fold statistics in result DataFrame
     results_df = pd.DataFrame()
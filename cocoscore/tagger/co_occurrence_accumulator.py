@@ -0,0 +1,172 @@
+"""
+Memory-compact accumulator for weighted co-occurrence counts.
+
+co_occurrence_score.get_weighted_counts() accumulates counts in a dictionary keyed by tuples of entity names, which
+needs roughly 120 bytes per pair. PairCountAccumulator interns entity names to integer ids instead, packs the two ids
+of a pair into one int64 key and keeps pair counts in an open-addressing hash table made of two flat NumPy arrays
+(keys and counts). The table is resized to keep its load factor between 0.25 and 0.5, so pair counts need between
+32 and 64 bytes per pair; while the table is resized, old and new table coexist. Entity counts are kept in a flat
+array indexed by entity id and the total count in a scalar.
+
+Updates are buffered and inserted in batches with vectorized linear probing. Counts are added up in the order of the
+updates, so the results are identical to those of get_weighted_counts().
+"""
+import numpy as np
+
+from .co_occurrence_arrays import WeightedCounts
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+_empty_key = -1
+_max_load_factor = 0.5
+_hash_multiplier = np.uint64(0x9E3779B97F4A7C15)
+
+
+class PairCountAccumulator(object):
+    """
+    Accumulates weighted counts of entity pairs, single entities and their total.
+    """
+
+    def __init__(self, initial_capacity=1024, batch_size=65536):
+        """
+        :param initial_capacity: int, initial number of slots of the hash table; rounded up to a power of two
+        :param batch_size: int, the number of updates to buffer before inserting them into the hash table
+        """
+        capacity = 1 << max(int(initial_capacity) - 1, 1).bit_length()
+        self._keys = np.full(capacity, _empty_key, dtype=np.int64)
+        self._counts = np.zeros(capacity, dtype=np.float64)
+        self._pair_total = 0
+        self._entity_ids = {}
+        self._entities = []
+        self._entity_counts = np.zeros(64, dtype=np.float64)
+        self._total_count = 0.0
+        self._batch_size = batch_size
+        self._buffer_entity_1, self._buffer_entity_2, self._buffer_updates = [], [], []
+
+    def __len__(self):
+        self.flush()
+        return self._pair_total
+
+    def _get_entity_id(self, entity):
+        entity_id = self._entity_ids.get(entity)
+        if entity_id is None:
+            entity_id = len(self._entities)
+            self._entity_ids[entity] = entity_id
+            self._entities.append(entity)
+        return entity_id
+
+    def add(self, entity_1, entity_2, update):
+        """
+        Adds update to the count of the pair (entity_1, entity_2), to the counts of both entities and to the total.
+
+        :param entity_1: str, name of the first entity
+        :param entity_2: str, name of the second entity
+        :param update: float, the weighted count update
+        """
+        self._buffer_entity_1.append(self._get_entity_id(entity_1))
+        self._buffer_entity_2.append(self._get_entity_id(entity_2))
+        self._buffer_updates.append(update)
+        if len(self._buffer_updates) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts all buffered updates into the hash table.
+        """
+        if len(self._buffer_updates) == 0:
+            return
+        entity_1 = np.array(self._buffer_entity_1, dtype=np.int64)
+        entity_2 = np.array(self._buffer_entity_2, dtype=np.int64)
+        updates = np.array(self._buffer_updates, dtype=np.float64)
+        self._buffer_entity_1, self._buffer_entity_2, self._buffer_updates = [], [], []
+
+        unique_keys, inverse = np.unique((entity_1 << 32) | entity_2, return_inverse=True)
+        self._reserve(self._pair_total + len(unique_keys))
+        slots, claimed_total = self._find_slots(self._keys, unique_keys)
+        self._pair_total += claimed_total
+        # np.add.at() adds unbuffered in the order of the updates, just like the sequential sums of the dictionaries
+        np.add.at(self._counts, slots[inverse], updates)
+
+        if len(self._entities) > len(self._entity_counts):
+            entity_counts = np.zeros(max(len(self._entities), 2 * len(self._entity_counts)), dtype=np.float64)
+            entity_counts[:len(self._entity_counts)] = self._entity_counts
+            self._entity_counts = entity_counts
+        np.add.at(self._entity_counts, np.column_stack((entity_1, entity_2)).ravel(), np.repeat(updates, 2))
+        self._total_count = float(np.cumsum(np.concatenate(([self._total_count], updates)))[-1])
+
+    @staticmethod
+    def _find_slots(keys, query_keys):
+        # vectorized linear probing: returns the slot of each query key and the number of empty slots claimed for
+        # keys missing from the table
+        mask = np.uint64(len(keys) - 1)
+        slots = ((query_keys.astype(np.uint64) * _hash_multiplier) >> np.uint64(32)) & mask
+        slots = slots.astype(np.int64)
+        result = np.empty(len(query_keys), dtype=np.int64)
+        pending = np.arange(len(query_keys))
+        claimed_total = 0
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            slot_keys = keys[pending_slots]
+            found = slot_keys == query_keys[pending]
+            result[pending[found]] = pending_slots[found]
+            is_empty = slot_keys == _empty_key
+            if is_empty.any():
+                # several keys may probe the same empty slot; the first one claims it, the others probe on
+                empty_slots, first = np.unique(pending_slots[is_empty], return_index=True)
+                winners = pending[is_empty][first]
+                keys[empty_slots] = query_keys[winners]
+                result[winners] = empty_slots
+                found[np.flatnonzero(is_empty)[first]] = True
+                claimed_total += len(winners)
+            collided = ~found & ~is_empty
+            slots[pending[collided]] = (pending_slots[collided] + 1) & int(mask)
+            pending = pending[~found]
+        return result, claimed_total
+
+    def _reserve(self, pair_total):
+        if pair_total <= _max_load_factor * len(self._keys):
+            return
+        capacity = len(self._keys)
+        while pair_total > _max_load_factor * capacity:
+            capacity *= 2
+        occupied = self._keys != _empty_key
+        old_keys, old_counts = self._keys[occupied], self._counts[occupied]
+        self._keys = np.full(capacity, _empty_key, dtype=np.int64)
+        self._counts = np.zeros(capacity, dtype=np.float64)
+        self._counts[self._find_slots(self._keys, old_keys)[0]] = old_counts
+
+    def memory_bytes(self):
+        """
+        :return: int, the number of bytes used by the hash table and the entity count array
+        """
+        return self._keys.nbytes + self._counts.nbytes + self._entity_counts.nbytes
+
+    def to_weighted_counts(self):
+        """
+        :return: a co_occurrence_arrays.WeightedCounts over a sorted entity vocabulary
+        """
+        self.flush()
+        occupied = np.flatnonzero(self._keys != _empty_key)
+        keys = self._keys[occupied]
+        entities = np.array(self._entities, dtype=object)
+        order = np.argsort(entities, kind='stable')
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        return WeightedCounts(entities[order], ranks[keys >> 32], ranks[keys & 0xFFFFFFFF], self._counts[occupied],
+                              self._entity_counts[:len(self._entities)][order], self._total_count)
+
+    def to_dict(self):
+        """
+        :return: dict mapping entity pairs, single entities and None to pair, entity and total counts as returned by
+        co_occurrence_score.get_weighted_counts()
+        """
+        self.flush()
+        occupied = np.flatnonzero(self._keys != _empty_key)
+        keys = self._keys[occupied]
+        entities = np.array(self._entities, dtype=object)
+        weighted_counts = dict(zip(zip(entities[keys >> 32].tolist(), entities[keys & 0xFFFFFFFF].tolist()),
+                                   self._counts[occupied].tolist()))
+        weighted_counts.update(zip(self._entities, self._entity_counts[:len(self._entities)].tolist()))
+        if len(keys) > 0:
+            weighted_counts[None] = self._total_count
+        return weighted_counts
@@ -0,0 +1,776 @@
+"""
+Integer-coded, columnar implementation of the co-occurrence score.
+
+Entity names are interned to integer ids and co-mentions are kept as NumPy arrays so that weighted counts and final
+scores can be computed with vectorized group-by operations instead of per co-mention Python dictionaries.
+The dictionary-based implementation in co_occurrence_score.py remains the reference implementation; all functions in
+this module are meant to produce the same results.
+"""
+import collections
+import gzip
+import io
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .entity_mappers import get_serial_to_taxid_name_mapper
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+# Entity vocabularies are sorted. Hence, for ids a < b it holds that vocabulary[a] < vocabulary[b] and canonical
+# (sorted) entity pairs can be formed by comparing ids instead of names.
+ScoreTable = collections.namedtuple('ScoreTable', ['entities', 'pmid', 'paragraph', 'sentence',
+                                                   'entity_1', 'entity_2', 'score'])
+MatchTable = collections.namedtuple('MatchTable', ['entities', 'document', 'pmid', 'paragraph', 'sentence',
+                                                   'type', 'entity'])
+CoMentionTable = collections.namedtuple('CoMentionTable', ['entities', 'pmid', 'entity_1', 'entity_2',
+                                                           'sentence_score', 'paragraph_score', 'document_score'])
+WeightedCounts = collections.namedtuple('WeightedCounts', ['entities', 'entity_1', 'entity_2', 'pair_counts',
+                                                           'entity_counts', 'total_count'])
+# level_sums holds one row per pair with the sums of its sentence, paragraph and document scores
+PairStatistics = collections.namedtuple('PairStatistics', ['entities', 'entity_1', 'entity_2', 'level_sums'])
+
+_score_file_columns = ['pmid', 'paragraph', 'sentence', 'entity_1', 'entity_2', 'score']
+_matches_file_columns = ['pmid', 'paragraph', 'sentence', 'type', 'serial']
+_parameter_defaults = collections.OrderedDict([('sentence_weight', 1.0), ('paragraph_weight', 0.0),
+                                               ('document_weight', 15.0), ('weighting_exponent', 0.6)])
+_binary_score_columns = collections.OrderedDict([('pmid', np.int64), ('paragraph', np.int32),
+                                                 ('sentence', np.int32), ('entity_1', np.int32),
+                                                 ('entity_2', np.int32), ('score', np.float64)])
+
+
+def intern_entities(names):
+    """
+    Maps entity names to integer ids.
+
+    :param names: array-like of str
+    :return: tuple (vocabulary, ids) where vocabulary is a sorted numpy array of unique names and ids is an int64 array
+    such that vocabulary[ids] equals names.
+    """
+    names = np.asarray(names, dtype=object)
+    if len(names) == 0:
+        return np.array([], dtype=object), np.zeros(0, dtype=np.int64)
+    # hashing names first and sorting only the unique names is much faster than np.unique() on object arrays
+    codes, uniques = pd.factorize(names)
+    uniques = np.asarray(uniques, dtype=object)
+    order = np.argsort(uniques, kind='stable')
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return uniques[order], ranks[codes]
+
+
+def merge_vocabularies(*vocabularies):
+    """
+    Merges sorted entity vocabularies.
+
+    :param vocabularies: sorted numpy arrays of unique entity names
+    :return: tuple (vocabulary, mappings) where vocabulary is the sorted union of all given vocabularies and mappings
+    is a list of int64 arrays mapping ids in each given vocabulary to ids in the merged vocabulary.
+    """
+    merged = np.unique(np.concatenate([np.asarray(v, dtype=object) for v in vocabularies] +
+                                      [np.array([], dtype=object)]))
+    mappings = [np.searchsorted(merged, v).astype(np.int64) for v in vocabularies]
+    return merged, mappings
+
+
+def group_ids(*columns):
+    """
+    Assigns dense group ids to rows that are keyed by the given columns.
+
+    :param columns: equally long numpy arrays
+    :return: tuple (ids, group_count) where ids is an int64 array of group ids (ordered by key) for each row
+    """
+    row_count = len(columns[0])
+    if row_count == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    order = np.lexsort(columns[::-1])
+    is_new_group = np.zeros(row_count, dtype=bool)
+    is_new_group[0] = True
+    for column in columns:
+        sorted_column = column[order]
+        is_new_group[1:] |= sorted_column[1:] != sorted_column[:-1]
+    sorted_ids = np.cumsum(is_new_group) - 1
+    ids = np.empty(row_count, dtype=np.int64)
+    ids[order] = sorted_ids
+    return ids, int(sorted_ids[-1]) + 1
+
+
+def _first_in_group(ids, group_count):
+    """Returns the index of the first row of each group."""
+    first = np.full(group_count, len(ids), dtype=np.int64)
+    np.minimum.at(first, ids, np.arange(len(ids), dtype=np.int64))
+    return first
+
+
+def _last_in_group(ids, group_count):
+    """Returns the index of the last row of each group."""
+    last = np.full(group_count, -1, dtype=np.int64)
+    np.maximum.at(last, ids, np.arange(len(ids), dtype=np.int64))
+    return last
+
+
+def _lookup_max(query_columns, key_columns, values):
+    """
+    For each query row, returns the maximum of values over all key rows with the same key and 0.0 if no such key row
+    exists (or if all such values are negative).
+    """
+    query_count = len(query_columns[0])
+    ids, group_count = group_ids(*(np.concatenate((q, k)) for q, k in zip(query_columns, key_columns)))
+    table = np.zeros(group_count, dtype=np.float64)
+    np.maximum.at(table, ids[query_count:], values)
+    return table[ids[:query_count]]
+
+
+def _lookup_exists(query_columns, key_columns):
+    """For each query row, returns True if a key row with the same key exists."""
+    query_count = len(query_columns[0])
+    ids, group_count = group_ids(*(np.concatenate((q, k)) for q, k in zip(query_columns, key_columns)))
+    table = np.zeros(group_count, dtype=bool)
+    table[ids[query_count:]] = True
+    return table[ids[:query_count]]
+
+
+def _sequential_sum(values):
+    # np.sum() uses pairwise summation; summing sequentially mirrors the += updates of the reference implementation
+    if len(values) == 0:
+        return 0.0
+    return float(np.bincount(np.zeros(len(values), dtype=np.int64), weights=values)[0])
+
+
+def load_score_table(score_file_path):
+    """
+    Loads a score file into integer-coded arrays.
+
+    Entity pairs are canonicalized such that entity_1 < entity_2 by name. If the same (pmid, paragraph, sentence,
+    entity pair) is listed several times, only the last score is kept as done in co_occurrence_score.load_score_file().
+
+    :param score_file_path: score file (tsv formatted, optionally gzipped) with six columns: pmid, paragraph number,
+    sentence number, first entity, second entity, score. Binary score files written by save_binary_score_table() are
+    memory-mapped instead.
+    :return: a ScoreTable
+    """
+    if is_binary_score_file(score_file_path):
+        return load_binary_score_table(score_file_path)
+    score_df = pd.read_csv(score_file_path, sep='\t', header=None, names=_score_file_columns, index_col=False,
+                           quoting=3, keep_default_na=False, float_precision='round_trip',
+                           compression='gzip' if score_file_path.endswith('.gz') else None,
+                           dtype={'pmid': np.int64, 'paragraph': np.int64, 'sentence': np.int64,
+                                  'entity_1': str, 'entity_2': str, 'score': np.float64})
+    return score_table_from_columns(score_df['pmid'].values, score_df['paragraph'].values,
+                                    score_df['sentence'].values, score_df['entity_1'].values,
+                                    score_df['entity_2'].values, score_df['score'].values)
+
+
+def score_table_from_columns(pmid, paragraph, sentence, entity_1_names, entity_2_names, score):
+    """
+    Builds a ScoreTable from column arrays.
+
+    :param pmid: array-like of int
+    :param paragraph: array-like of int, -1 for document-level scores
+    :param sentence: array-like of int, -1 for document- and paragraph-level scores
+    :param entity_1_names: array-like of str
+    :param entity_2_names: array-like of str
+    :param score: array-like of float
+    :return: a ScoreTable with canonical entity pairs and duplicated rows removed (the last score is kept)
+    """
+    entity_1_names = np.asarray(entity_1_names, dtype=object)
+    entity_2_names = np.asarray(entity_2_names, dtype=object)
+    entities, ids = intern_entities(np.concatenate((entity_1_names, entity_2_names)))
+    entity_1, entity_2 = ids[:len(entity_1_names)], ids[len(entity_1_names):]
+    entity_1, entity_2 = np.minimum(entity_1, entity_2), np.maximum(entity_1, entity_2)
+    pmid = np.asarray(pmid, dtype=np.int64)
+    paragraph = np.asarray(paragraph, dtype=np.int64)
+    sentence = np.asarray(sentence, dtype=np.int64)
+    score = np.asarray(score, dtype=np.float64)
+
+    ids, group_count = group_ids(pmid, paragraph, sentence, entity_1, entity_2)
+    keep = np.sort(_last_in_group(ids, group_count))
+    return ScoreTable(entities, pmid[keep], paragraph[keep], sentence[keep], entity_1[keep], entity_2[keep],
+                      score[keep])
+
+
+def score_table_from_data_frame(score_df, score_column='predicted', entity_columns=('entity1', 'entity2')):
+    """
+    Builds a ScoreTable from a pandas DataFrame as loaded by tools.data_tools.load_data_frame().
+
+    :param score_df: pandas DataFrame with columns pmid, paragraph, sentence, the two entity columns and score_column
+    :param score_column: str, the column holding the score of each row
+    :param entity_columns: tuple of str, the columns holding the entities of each row
+    :return: a ScoreTable, see score_table_from_columns()
+    """
+    return score_table_from_columns(score_df['pmid'].values, score_df['paragraph'].values,
+                                    score_df['sentence'].values, score_df[entity_columns[0]].values,
+                                    score_df[entity_columns[1]].values, score_df[score_column].values)
+
+
+def save_entities(entities, directory):
+    """
+    Writes an entity vocabulary to a directory as a single UTF-8 encoded byte string along with offsets.
+
+    :param entities: numpy array of entity names
+    :param directory: path of an existing directory to write entities.bin and entity_offsets.npy to
+    """
+    encoded_entities = [e.encode('utf-8') for e in entities.tolist()]
+    entity_offsets = np.zeros(len(encoded_entities) + 1, dtype=np.int64)
+    entity_offsets[1:] = np.cumsum([len(e) for e in encoded_entities])
+    with open(os.path.join(directory, 'entities.bin'), 'wb') as entities_out:
+        entities_out.write(b''.join(encoded_entities))
+    np.save(os.path.join(directory, 'entity_offsets.npy'), entity_offsets)
+
+
+def load_entities(directory):
+    """
+    Reads an entity vocabulary written by save_entities().
+
+    :param directory: path of the directory holding entities.bin and entity_offsets.npy
+    :return: numpy array of entity names
+    """
+    entity_offsets = np.load(os.path.join(directory, 'entity_offsets.npy')).tolist()
+    with open(os.path.join(directory, 'entities.bin'), 'rb') as entities_in:
+        encoded_entities = entities_in.read()
+    return np.array([encoded_entities[start:end].decode('utf-8')
+                     for start, end in zip(entity_offsets[:-1], entity_offsets[1:])], dtype=object)
+
+
+def save_binary_score_table(score_table, binary_score_path):
+    """
+    Writes a ScoreTable to a directory of uncompressed NumPy arrays that can be memory-mapped by
+    load_binary_score_table(). Entity names are stored as a single UTF-8 encoded byte string along with offsets.
+
+    :param score_table: a ScoreTable
+    :param binary_score_path: path of the directory to write to; it is created if necessary
+    """
+    os.makedirs(binary_score_path, exist_ok=True)
+    save_entities(score_table.entities, binary_score_path)
+    for column, dtype in _binary_score_columns.items():
+        np.save(os.path.join(binary_score_path, column + '.npy'),
+                np.ascontiguousarray(getattr(score_table, column), dtype=dtype))
+
+
+def convert_score_file(score_file_path, binary_score_path):
+    """
+    Converts a (gzipped) tsv score file to the binary format read by load_binary_score_table().
+
+    :param score_file_path: score file as described in load_score_table()
+    :param binary_score_path: path of the directory to write to; it is created if necessary
+    """
+    save_binary_score_table(load_score_table(score_file_path), binary_score_path)
+
+
+def is_binary_score_file(score_file_path):
+    """
+    :param score_file_path: str, path to a score file
+    :return: True if score_file_path points to a binary score file written by save_binary_score_table()
+    """
+    return os.path.isfile(os.path.join(score_file_path, 'entity_offsets.npy'))
+
+
+def load_binary_score_table(binary_score_path):
+    """
+    Loads a binary score file written by save_binary_score_table(). All arrays apart from entity names are
+    memory-mapped read-only and are thus not copied into memory.
+
+    :param binary_score_path: path of the directory holding the binary score file
+    :return: a ScoreTable
+    """
+    entities = load_entities(binary_score_path)
+    columns = {column: np.load(os.path.join(binary_score_path, column + '.npy'), mmap_mode='r')
+               for column in _binary_score_columns}
+    return ScoreTable(entities=entities, **columns)
+
+
+def score_table_to_dict(score_table):
+    """
+    Converts a ScoreTable to the nested dictionary returned by co_occurrence_score.load_score_file().
+
+    :param score_table: a ScoreTable
+    :return: dict mapping sorted entity pairs to dicts that map (pmid, paragraph, sentence), (pmid, paragraph) or pmid
+    keys for sentence-, paragraph- and document-level scores, respectively, to scores.
+    """
+    score_dict = collections.defaultdict(dict)
+    entities = score_table.entities.tolist()
+    for pmid, paragraph, sentence, entity_1, entity_2, score in zip(score_table.pmid.tolist(),
+                                                                     score_table.paragraph.tolist(),
+                                                                     score_table.sentence.tolist(),
+                                                                     score_table.entity_1.tolist(),
+                                                                     score_table.entity_2.tolist(),
+                                                                     score_table.score.tolist()):
+        if sentence != -1:  # sentence-level score
+            score_key = (pmid, paragraph, sentence)
+        elif paragraph != -1:  # paragraph-level score
+            score_key = (pmid, paragraph)
+        else:  # document-level score
+            score_key = pmid
+        score_dict[(entities[entity_1], entities[entity_2])][score_key] = score
+    return dict(score_dict)
+
+
+def split_score_table(score_table):
+    """
+    Splits a ScoreTable by level of the scored co-mentions.
+
+    :param score_table: a ScoreTable
+    :return: tuple of boolean masks selecting sentence-, paragraph- and document-level rows, respectively
+    """
+    is_sentence = score_table.sentence != -1
+    is_paragraph = np.logical_and(np.logical_not(is_sentence), score_table.paragraph != -1)
+    is_document = np.logical_not(np.logical_or(is_sentence, is_paragraph))
+    return is_sentence, is_paragraph, is_document
+
+
+class _ByteRangeFile(io.RawIOBase):
+    """Read-only binary file restricted to a byte range of an uncompressed file."""
+
+    def __init__(self, file_path, byte_range):
+        super().__init__()
+        self._file = open(file_path, 'rb')
+        start, self._end = byte_range
+        self._file.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self._end - self._file.tell()
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:remaining]
+        return self._file.readinto(view)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class _CountingFile(io.RawIOBase):
+    """Read-only binary file that counts the bytes read from a wrapped binary file."""
+
+    def __init__(self, file):
+        super().__init__()
+        self._file = file
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        byte_count = self._file.readinto(buffer)
+        self.bytes_read += byte_count or 0
+        return byte_count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def read_matches_file_chunks(matches_file_path, first_type, second_type, chunk_size=1000000, byte_range=None,
+                             types=None, progress=None):
+    """
+    Reads the columns needed for scoring (pmid, paragraph, sentence, type, serial) from a tagger matches file in chunks
+    using the C parser of pandas. Rows whose type is neither first_type nor second_type are dropped right away.
+
+    :param matches_file_path: matches file as produced by tagger, optionally gzipped
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param chunk_size: int, the number of lines to parse at once
+    :param byte_range: optional (start, end) tuple of byte offsets to restrict reading to; see
+    co_occurrence_score.get_matches_file_byte_ranges(). Only supported for uncompressed files.
+    :param types: optional iterable of int, the types of matches to retain instead of first_type and second_type
+    :param progress: optional co_occurrence_progress.ProgressTracker that is updated with the number of lines and
+    uncompressed bytes parsed
+    :return: generator of (DataFrame, int) tuples. Each DataFrame holds the retained rows of a chunk along with a
+    document column that numbers consecutive runs of lines sharing a pmid (continuing across chunks). The int is the
+    number of lines parsed in the chunk.
+    """
+    retained_types = list(types) if types is not None else [first_type, second_type]
+    compression = 'gzip' if matches_file_path.endswith('.gz') else None
+    if byte_range is not None:
+        if compression is not None:
+            raise ValueError('Byte ranges are not supported for compressed matches file {}.'.format(
+                matches_file_path))
+        matches_file = io.BufferedReader(_ByteRangeFile(matches_file_path, byte_range))
+    elif progress is not None:
+        matches_file = gzip.open(matches_file_path, 'rb') if compression is not None else open(matches_file_path, 'rb')
+        compression = None
+    else:
+        matches_file = matches_file_path
+    counting_file = None
+    if progress is not None:
+        # count uncompressed bytes as they are handed to the parser
+        counting_file = _CountingFile(matches_file)
+        matches_file = io.BufferedReader(counting_file)
+    reader = pd.read_csv(matches_file, sep='\t', header=None, index_col=False, quoting=3,
+                         usecols=[0, 1, 2, 6, 7], names=_matches_file_columns, dtype=np.int64,
+                         compression=compression, chunksize=chunk_size)
+    try:
+        next_document = 0
+        previous_pmid = None
+        bytes_reported = 0
+        for chunk_df in reader:
+            pmid = chunk_df['pmid'].values
+            if len(pmid) == 0:
+                continue
+            # documents are consecutive runs of lines sharing a pmid as in co_occurrence_score.load_matches_file()
+            is_new_document = np.ones(len(pmid), dtype=bool)
+            is_new_document[1:] = pmid[1:] != pmid[:-1]
+            is_new_document[0] = previous_pmid is None or pmid[0] != previous_pmid
+            document = next_document + np.cumsum(is_new_document) - 1
+            next_document = int(document[-1]) + 1
+            previous_pmid = pmid[-1]
+
+            keep = np.isin(chunk_df['type'].values, retained_types)
+            chunk_df = chunk_df.loc[keep, :]
+            chunk_df.insert(0, 'document', document[keep])
+            if progress is not None:
+                progress.update(lines=len(pmid), bytes_read=counting_file.bytes_read - bytes_reported)
+                bytes_reported = counting_file.bytes_read
+            yield chunk_df, len(pmid)
+    finally:
+        reader.close()
+        if byte_range is not None or progress is not None:
+            matches_file.close()
+
+
+def load_match_table(matches_file_path, entities_file, first_type, second_type, chunk_size=1000000):
+    """
+    Loads a tagger matches file into integer-coded arrays. Only matches of first_type and second_type are kept.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param entities_file: entities file as used by tagger
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param chunk_size: int, the number of lines to parse at once
+    :return: a MatchTable
+    """
+    serial_to_type_name = get_serial_to_taxid_name_mapper(entities_file, taxids=(first_type, second_type))
+    chunk_dfs = [chunk_df for chunk_df, _ in read_matches_file_chunks(matches_file_path, first_type, second_type,
+                                                                      chunk_size=chunk_size)]
+    if len(chunk_dfs) > 0:
+        matches_df = pd.concat(chunk_dfs, axis=0, ignore_index=True)
+    else:
+        matches_df = pd.DataFrame({c: np.zeros(0, dtype=np.int64) for c in ['document'] + _matches_file_columns})
+
+    serials, serial_ids = np.unique(matches_df['serial'].values, return_inverse=True)
+    serial_types = np.array([serial_to_type_name[s][0] for s in serials.tolist()], dtype=np.int64)
+    entities, serial_entities = intern_entities([serial_to_type_name[s][1] for s in serials.tolist()])
+    entity_type = matches_df['type'].values
+    assert np.all(serial_types[serial_ids] == entity_type)
+    return MatchTable(entities, matches_df['document'].values, matches_df['pmid'].values,
+                      matches_df['paragraph'].values, matches_df['sentence'].values, entity_type,
+                      serial_entities[serial_ids].astype(np.int64))
+
+
+def _get_type_pairs(left_df, right_df, on, same_type):
+    pairs = left_df.merge(right_df, on=on, suffixes=('_x', '_y'))
+    if same_type:
+        pairs = pairs.loc[pairs['entity_x'].values < pairs['entity_y'].values, :]
+    return pairs
+
+
+def match_table_co_mentions(match_table, first_type, second_type):
+    """
+    Enumerates co-mentioned entity pairs for each document in a MatchTable.
+
+    :param match_table: a MatchTable
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :return: tuple of arrays (pmid, entity_1, entity_2, is_sentence_co_mention, is_paragraph_co_mention) with one row
+    per document and co-mentioned pair, where entity_1 < entity_2.
+    """
+    same_type = first_type == second_type
+    matches_df = pd.DataFrame({'document': match_table.document, 'pmid': match_table.pmid,
+                               'paragraph': match_table.paragraph, 'sentence': match_table.sentence,
+                               'type': match_table.type, 'entity': match_table.entity})
+    first_df = matches_df.loc[matches_df['type'] == first_type, :]
+    second_df = matches_df.loc[matches_df['type'] == second_type, :]
+
+    document_columns = ['document', 'pmid', 'entity']
+    pairs = _get_type_pairs(first_df.loc[:, document_columns].drop_duplicates(),
+                            second_df.loc[:, document_columns].drop_duplicates(),
+                            on=['document', 'pmid'], same_type=same_type)
+    pair_keys = [pairs[c].values for c in ('document', 'entity_x', 'entity_y')]
+
+    co_mention_flags = []
+    for level_columns in (['document', 'paragraph', 'sentence'], ['document', 'paragraph']):
+        level_pairs = _get_type_pairs(first_df.loc[:, level_columns + ['entity']].drop_duplicates(),
+                                      second_df.loc[:, level_columns + ['entity']].drop_duplicates(),
+                                      on=level_columns, same_type=same_type)
+        level_keys = [level_pairs[c].values for c in ('document', 'entity_x', 'entity_y')]
+        co_mention_flags.append(_lookup_exists(pair_keys, level_keys))
+
+    entity_x, entity_y = pairs['entity_x'].values, pairs['entity_y'].values
+    return (pairs['pmid'].values, np.minimum(entity_x, entity_y), np.maximum(entity_x, entity_y),
+            co_mention_flags[0], co_mention_flags[1])
+
+
+def _score_table_co_mentions(score_table):
+    # Since document-level co-mentions are a superset of paragraph-level co-mentions which are a superset of
+    # sentence-level co-mentions, prefer the scores in this order as done in co_occurrence_score.get_weighted_counts()
+    is_sentence, is_paragraph, is_document = split_score_table(score_table)
+    for is_level, has_sentences, has_paragraphs in ((is_document, False, False),
+                                                    (is_paragraph, False, True),
+                                                    (is_sentence, True, True)):
+        if np.any(is_level):
+            break
+    else:
+        raise ValueError('No co-mentions available; matches file and sentence/paragraph/document scores missing?')
+    keys = [c[is_level] for c in (score_table.pmid, score_table.entity_1, score_table.entity_2)]
+    ids, group_count = group_ids(*keys)
+    first = _first_in_group(ids, group_count)
+    pmid, entity_1, entity_2 = (k[first] for k in keys)
+    return (pmid, entity_1, entity_2, np.full(group_count, has_sentences, dtype=bool),
+            np.full(group_count, has_paragraphs, dtype=bool))
+
+
+def get_co_mention_table(match_table, score_table, first_type, second_type, ignore_scores=False):
+    """
+    Computes sentence-, paragraph- and document-level scores for each document and co-mentioned entity pair.
+
+    :param match_table: a MatchTable or None. If None, co-mentions are extracted from score_table.
+    :param score_table: a ScoreTable or None
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param ignore_scores: If True, sentence scores are ignored.
+    :return: a CoMentionTable with one row per document and co-mentioned pair
+    """
+    if match_table is None and score_table is None:
+        raise ValueError('No co-mentions available; matches file and sentence/paragraph/document scores missing?')
+    if match_table is not None and score_table is not None:
+        entities, (match_mapping, score_mapping) = merge_vocabularies(match_table.entities, score_table.entities)
+        match_table = match_table._replace(entities=entities, entity=match_mapping[match_table.entity])
+        # mappings between sorted vocabularies are monotonic, so score pairs remain in canonical order
+        score_table = score_table._replace(entities=entities, entity_1=score_mapping[score_table.entity_1],
+                                           entity_2=score_mapping[score_table.entity_2])
+    if match_table is not None:
+        entities = match_table.entities
+        pmid, entity_1, entity_2, has_sentence, has_paragraph = match_table_co_mentions(match_table, first_type,
+                                                                                         second_type)
+    else:
+        entities = score_table.entities
+        pmid, entity_1, entity_2, has_sentence, has_paragraph = _score_table_co_mentions(score_table)
+
+    keys = (pmid, entity_1, entity_2)
+    level_scores = []
+    if score_table is not None:
+        for is_level, has_level in zip(split_score_table(score_table), (has_sentence, has_paragraph, None)):
+            if not np.any(is_level):
+                # no scores on this level; fall back to co-mentions
+                level_scores.append(has_level)
+                continue
+            level_keys = [c[is_level] for c in (score_table.pmid, score_table.entity_1, score_table.entity_2)]
+            if not ignore_scores:
+                level_scores.append(_lookup_max(keys, level_keys, score_table.score[is_level]))
+            elif has_level is not None:
+                level_scores.append(np.logical_or(has_level, _lookup_exists(keys, level_keys)))
+            else:
+                level_scores.append(None)
+    else:
+        level_scores = [has_sentence, has_paragraph, None]
+    sentence_score, paragraph_score, document_score = (np.ones(len(pmid)) if s is None else s.astype(np.float64)
+                                                       for s in level_scores)
+    return CoMentionTable(entities, pmid, entity_1, entity_2, sentence_score, paragraph_score, document_score)
+
+
+def get_weighted_counts_arrays(co_mention_table, document_weight, paragraph_weight, sentence_weight):
+    """
+    Computes pair, entity and total weighted counts for a CoMentionTable.
+
+    :param co_mention_table: a CoMentionTable
+    :param document_weight: document weight in co-occurrence score
+    :param paragraph_weight: paragraph weight in the co-occurrence score
+    :param sentence_weight: sentence weight in the co-occurrence score
+    :return: a WeightedCounts with one entry in entity_1, entity_2 and pair_counts per co-mentioned pair
+    """
+    updates = co_mention_table.sentence_score * sentence_weight + \
+        co_mention_table.paragraph_score * paragraph_weight + \
+        co_mention_table.document_score * document_weight
+    # skip zero scores since they could lead to ZeroDivisionErrors later on when computing final scores
+    positive = updates > 0
+    updates = updates[positive]
+    entity_1 = co_mention_table.entity_1[positive]
+    entity_2 = co_mention_table.entity_2[positive]
+
+    pair_ids, pair_count = group_ids(entity_1, entity_2)
+    first = _first_in_group(pair_ids, pair_count)
+    pair_counts = np.bincount(pair_ids, weights=updates, minlength=pair_count)
+    # interleave both entities of each pair to add up entity counts in the same order as the reference implementation
+    entity_counts = np.bincount(np.column_stack((entity_1, entity_2)).ravel(), weights=np.repeat(updates, 2),
+                                minlength=len(co_mention_table.entities))
+    return WeightedCounts(co_mention_table.entities, entity_1[first], entity_2[first], pair_counts, entity_counts,
+                          _sequential_sum(updates))
+
+
+def weighted_counts_to_dict(weighted_counts):
+    """
+    Converts a WeightedCounts to the dictionary format returned by co_occurrence_score.get_weighted_counts().
+
+    :param weighted_counts: a WeightedCounts
+    :return: dict mapping entity pairs, single entities and None to pair, entity and total counts, respectively
+    """
+    entities = weighted_counts.entities
+    count_dict = dict(zip(zip(entities[weighted_counts.entity_1].tolist(), entities[weighted_counts.entity_2].tolist()),
+                          weighted_counts.pair_counts.tolist()))
+    observed = np.union1d(weighted_counts.entity_1, weighted_counts.entity_2)
+    count_dict.update(zip(entities[observed].tolist(), weighted_counts.entity_counts[observed].tolist()))
+    if len(weighted_counts.pair_counts) > 0:
+        count_dict[None] = weighted_counts.total_count
+    return count_dict
+
+
+def score_weighted_counts(weighted_counts, weighting_exponent):
+    """
+    Computes co-occurrence scores from weighted counts.
+
+    :param weighted_counts: a WeightedCounts
+    :param weighting_exponent: exponent weight in the co-occurrence score
+    :return: numpy array of co-occurrence scores for each pair in weighted_counts
+    """
+    score = weighted_counts.pair_counts
+    norm_factor = weighted_counts.total_count
+    entity_counts = weighted_counts.entity_counts
+    return (score ** weighting_exponent) * \
+        (((score * norm_factor) / (entity_counts[weighted_counts.entity_1] * entity_counts[weighted_counts.entity_2]))
+         ** (1 - weighting_exponent))
+
+
+def scores_to_dict(weighted_counts, scores):
+    """
+    Converts co-occurrence scores to the dictionary format returned by co_occurrence_score.co_occurrence_score().
+
+    :param weighted_counts: a WeightedCounts
+    :param scores: numpy array of co-occurrence scores for each pair in weighted_counts
+    :return: a dictionary mapping entity pairs to their co-occurrence scores
+    """
+    entities = weighted_counts.entities
+    return dict(zip(zip(entities[weighted_counts.entity_1].tolist(), entities[weighted_counts.entity_2].tolist()),
+                    scores.tolist()))
+
+
+def co_occurrence_score_arrays(matches_file_path, score_file_path,
+                               entities_file, first_type, second_type,
+                               document_weight=15.0, paragraph_weight=0.0,
+                               sentence_weight=1.0, weighting_exponent=0.6, ignore_scores=False):
+    """
+    Columnar counterpart of co_occurrence_score.co_occurrence_score(). See there for a description of the parameters.
+
+    :return: a dictionary mapping entity pairs to their co-occurrence scores
+    """
+    weighted_counts = get_weighted_counts_files(matches_file_path, score_file_path, entities_file, first_type,
+                                                second_type, document_weight=document_weight,
+                                                paragraph_weight=paragraph_weight, sentence_weight=sentence_weight,
+                                                ignore_scores=ignore_scores)
+    return scores_to_dict(weighted_counts, score_weighted_counts(weighted_counts, weighting_exponent))
+
+
+def load_co_mention_table(matches_file_path, score_file_path, entities_file, first_type, second_type,
+                          ignore_scores=False):
+    """
+    Loads a matches file and/or score file and extracts their co-mentions. See
+    co_occurrence_score.co_occurrence_score() for a description of the parameters.
+
+    :return: a CoMentionTable
+    """
+    if matches_file_path is None and score_file_path is None:
+        raise ValueError('matches_file_path or score_file_path must be specified.')
+    score_table = load_score_table(score_file_path) if score_file_path is not None else None
+    match_table = load_match_table(matches_file_path, entities_file, first_type, second_type) \
+        if matches_file_path is not None else None
+    return get_co_mention_table(match_table, score_table, first_type, second_type, ignore_scores=ignore_scores)
+
+
+def get_weighted_counts_files(matches_file_path, score_file_path, entities_file, first_type, second_type,
+                              document_weight=15.0, paragraph_weight=0.0, sentence_weight=1.0, ignore_scores=False):
+    """
+    Computes weighted counts for a matches file and/or score file. See co_occurrence_score.co_occurrence_score() for a
+    description of the parameters.
+
+    :return: a WeightedCounts
+    """
+    co_mention_table = load_co_mention_table(matches_file_path, score_file_path, entities_file, first_type,
+                                             second_type, ignore_scores=ignore_scores)
+    return get_weighted_counts_arrays(co_mention_table, document_weight=document_weight,
+                                      paragraph_weight=paragraph_weight, sentence_weight=sentence_weight)
+
+
+def get_pair_statistics(co_mention_table):
+    """
+    Sums up sentence, paragraph and document scores per entity pair. Since weighted counts are linear in the weights,
+    these sums are sufficient to compute weighted counts and scores for any non-negative weights.
+
+    :param co_mention_table: a CoMentionTable
+    :return: a PairStatistics with one entry per pair that has at least one non-zero score
+    """
+    level_scores = np.column_stack((co_mention_table.sentence_score, co_mention_table.paragraph_score,
+                                    co_mention_table.document_score)).astype(np.float64)
+    pair_ids, pair_count = group_ids(co_mention_table.entity_1, co_mention_table.entity_2)
+    first = _first_in_group(pair_ids, pair_count)
+    level_sums = np.column_stack([np.bincount(pair_ids, weights=level_scores[:, level], minlength=pair_count)
+                                  for level in range(level_scores.shape[1])]).reshape(pair_count, -1)
+    observed = level_sums.any(axis=1)
+    return PairStatistics(co_mention_table.entities, co_mention_table.entity_1[first][observed],
+                          co_mention_table.entity_2[first][observed], level_sums[observed])
+
+
+def get_parameter_matrix(parameter_settings):
+    """
+    Converts co-occurrence score parameter settings to arrays.
+
+    :param parameter_settings: iterable of K dicts mapping 'document_weight', 'paragraph_weight', 'sentence_weight' and
+    'weighting_exponent' to values, e.g. as sampled from co_occurrence_score.get_hyperparameter_distributions().
+    Missing parameters are set to the defaults of co_occurrence_score.co_occurrence_score(); other keys are ignored.
+    :return: tuple of a K x 3 array of sentence, paragraph and document weights and an array of K weighting exponents
+    """
+    parameter_matrix = np.array([[settings.get(name, default) for name, default in _parameter_defaults.items()]
+                                 for settings in parameter_settings], dtype=np.float64).reshape(-1, 4)
+    weights, weighting_exponents = parameter_matrix[:, :3], parameter_matrix[:, 3]
+    if (weights < 0).any():
+        raise ValueError('Weights must be non-negative to score several parameter settings at once.')
+    return weights, weighting_exponents
+
+
+def score_pair_statistics(pair_statistics, parameter_settings):
+    """
+    Computes co-occurrence scores for several parameter settings at once.
+
+    :param pair_statistics: a PairStatistics
+    :param parameter_settings: iterable of K parameter settings, see get_parameter_matrix()
+    :return: pairs x K numpy array of co-occurrence scores. Pairs with a weighted count of zero for a setting, which
+    are missing from the results of co_occurrence_score.co_occurrence_score(), are set to NaN.
+    """
+    weights, weighting_exponents = get_parameter_matrix(parameter_settings)
+    pair_counts = pair_statistics.level_sums @ weights.T
+    pair_total = len(pair_counts)
+    # entities x pairs incidence matrix; both entities of a pair are counted, just like in get_weighted_counts_arrays()
+    incidence = sparse.csr_matrix((np.ones(2 * pair_total),
+                                   (np.concatenate((pair_statistics.entity_1, pair_statistics.entity_2)),
+                                    np.tile(np.arange(pair_total), 2))),
+                                  shape=(len(pair_statistics.entities), pair_total))
+    entity_counts = incidence @ pair_counts
+    norm_factors = pair_counts.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (pair_counts ** weighting_exponents) * \
+            (((pair_counts * norm_factors) /
+              (entity_counts[pair_statistics.entity_1] * entity_counts[pair_statistics.entity_2]))
+             ** (1 - weighting_exponents))
+    scores[pair_counts == 0] = np.nan
+    return scores
+
+
+def co_occurrence_score_settings(matches_file_path, score_file_path, entities_file, first_type, second_type,
+                                 parameter_settings, ignore_scores=False):
+    """
+    Computes co-occurrence scores for several weight settings with a single pass over the input. See
+    co_occurrence_score.co_occurrence_score() for a description of the remaining parameters.
+
+    :param parameter_settings: iterable of K parameter settings, see get_parameter_matrix()
+    :return: tuple of a list of entity pairs and a pairs x K numpy array of their co-occurrence scores, see
+    score_pair_statistics()
+    """
+    co_mention_table = load_co_mention_table(matches_file_path, score_file_path, entities_file, first_type,
+                                             second_type, ignore_scores=ignore_scores)
+    pair_statistics = get_pair_statistics(co_mention_table)
+    entities = pair_statistics.entities
+    pairs = list(zip(entities[pair_statistics.entity_1].tolist(), entities[pair_statistics.entity_2].tolist()))
+    return pairs, score_pair_statistics(pair_statistics, parameter_settings)
@@ -0,0 +1,224 @@
+"""
+Incremental maintenance of co-occurrence scores.
+
+A CoOccurrenceState keeps the weighted count contributions of each document so that documents can be added, updated
+and removed without re-processing the whole corpus. The counts of each document are summed in a fixed order and
+rounded to fixed-point integers (multiples of 2 ** -32) once. Pair, entity and total counts are sums of these integers,
+so adding and removing a document cancel exactly and the counts do not depend on the order in which documents were
+added or removed: a state built incrementally yields exactly the same scores as a state built from all documents at
+once.
+"""
+import collections
+import gzip
+import pickle
+
+from .co_occurrence_score import iterate_weighted_count_updates, load_score_file, split_scores
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+_count_scale = 2 ** 32  # fixed-point scale of the weighted counts kept in a CoOccurrenceState
+
+
+def _to_fixed_point(count):
+    return int(round(count * _count_scale))
+
+
+def _from_fixed_point(count):
+    return count / _count_scale
+
+
+class CoOccurrenceState(object):
+    """
+    Weighted counts and co-occurrence scores of a corpus that can be updated document by document.
+
+    Scores equal those of co_occurrence_score.co_occurrence_score() for the same documents up to floating point
+    rounding and the rounding of counts to fixed-point integers.
+    """
+
+    def __init__(self, first_type, second_type, entities_file=None, document_weight=15.0, paragraph_weight=0.0,
+                 sentence_weight=1.0, weighting_exponent=0.6, ignore_scores=False, score_levels=None):
+        """
+        :param first_type: int, type of the first entity class to be scored
+        :param second_type: int, type of the second entity class to be scored
+        :param entities_file: entities file as used by tagger, needed to add matches files
+        :param document_weight: document weight in co-occurrence score
+        :param paragraph_weight: paragraph weight in the co-occurrence score
+        :param sentence_weight: sentence weight in the co-occurrence score
+        :param weighting_exponent: exponent weight in the co-occurrence score
+        :param ignore_scores: If True, sentence scores are ignored.
+        :param score_levels: tuple of three bools stating if sentence-, paragraph- and document-level scores are given
+        for the corpus. Which levels are present changes how co-mentions are scored, see
+        co_occurrence_score.get_weighted_counts(). If None, the levels are taken from the first batch of documents
+        added with a score file.
+        """
+        self.first_type = first_type
+        self.second_type = second_type
+        self.entities_file = entities_file
+        self.document_weight = document_weight
+        self.paragraph_weight = paragraph_weight
+        self.sentence_weight = sentence_weight
+        self.weighting_exponent = weighting_exponent
+        self.ignore_scores = ignore_scores
+        self.score_levels = tuple(score_levels) if score_levels is not None else None
+
+        self._pmid_counts = {}
+        self._pair_counts = {}
+        self._entity_counts = {}
+        self._entity_pairs = collections.defaultdict(set)
+        self._total_count = 0
+        self._unnormalized_scores = {}
+
+    @property
+    def pmids(self):
+        """
+        :return: set of pmids with at least one scored co-mention
+        """
+        return set(self._pmid_counts)
+
+    def _get_level_scores(self, score_file_path):
+        if score_file_path is None:
+            if self.score_levels is None:
+                self.score_levels = (False, False, False)
+            elif any(self.score_levels):
+                raise ValueError('A score file is required since the state was built from scores.')
+            return None, None, None
+        level_scores = split_scores(load_score_file(score_file_path))
+        batch_levels = tuple(scores is not None for scores in level_scores)
+        if self.score_levels is None:
+            self.score_levels = batch_levels
+        if any(batch_level and not state_level for batch_level, state_level in zip(batch_levels,
+                                                                                      self.score_levels)):
+            raise ValueError('Score file {} contains score levels {} not present in the state with levels {}; '
+                             'rebuild the state instead.'.format(score_file_path, batch_levels, self.score_levels))
+        # levels that are present in the corpus but not in this batch still determine how co-mentions are scored
+        return tuple(scores if scores is not None else {} if state_level else None
+                     for scores, state_level in zip(level_scores, self.score_levels))
+
+    def add_documents(self, matches_file_path=None, score_file_path=None, silent=True):
+        """
+        Adds the documents in a matches file and/or score file to the state. Documents that are already part of the
+        state and have co-mentions in the new batch replace their previous version. Use remove_documents() to remove
+        documents that no longer have any co-mentions.
+
+        :param matches_file_path: matches file as produced by tagger. If this is None, co-occurrences are extracted
+        from score_file_path.
+        :param score_file_path: score file as described in co_occurrence_score.co_occurrence_score()
+        :param silent: If True, no progress updates are printed
+        :return: set of pmids that were added or updated
+        """
+        if matches_file_path is None and score_file_path is None:
+            raise ValueError('matches_file_path or score_file_path must be specified.')
+        sentence_scores, paragraph_scores, document_scores = self._get_level_scores(score_file_path)
+        batch_counts = collections.defaultdict(lambda: collections.defaultdict(float))
+        for pmid, entity_1, entity_2, update in iterate_weighted_count_updates(
+                matches_file_path, sentence_scores, paragraph_scores, document_scores, self.entities_file,
+                self.first_type, self.second_type, self.document_weight, self.paragraph_weight,
+                self.sentence_weight, ignore_scores=self.ignore_scores, silent=silent):
+            batch_counts[pmid][(entity_1, entity_2)] += update
+
+        affected_pairs = self._remove_counts(set(batch_counts) & set(self._pmid_counts))
+        for pmid, pair_counts in batch_counts.items():
+            pair_counts = {pair: _to_fixed_point(count) for pair, count in pair_counts.items()}
+            self._pmid_counts[pmid] = pair_counts
+            for pair, count in pair_counts.items():
+                self._add_count(pair, count)
+                affected_pairs.add(pair)
+        self._refresh_scores(affected_pairs)
+        return set(batch_counts)
+
+    def remove_documents(self, pmids):
+        """
+        Removes documents, e.g. retracted articles, from the state. Unknown pmids are ignored.
+
+        :param pmids: iterable of pmids to remove
+        :return: set of pmids that were removed
+        """
+        removed_pmids = set(pmids) & set(self._pmid_counts)
+        self._refresh_scores(self._remove_counts(removed_pmids))
+        return removed_pmids
+
+    def _add_count(self, pair, count):
+        entity_1, entity_2 = pair
+        self._pair_counts[pair] = self._pair_counts.get(pair, 0) + count
+        self._entity_counts[entity_1] = self._entity_counts.get(entity_1, 0) + count
+        self._entity_counts[entity_2] = self._entity_counts.get(entity_2, 0) + count
+        self._entity_pairs[entity_1].add(pair)
+        self._entity_pairs[entity_2].add(pair)
+        self._total_count += count
+
+    def _remove_counts(self, pmids):
+        affected_pairs = set()
+        for pmid in pmids:
+            for pair, count in self._pmid_counts.pop(pmid).items():
+                self._add_count(pair, -count)
+                affected_pairs.add(pair)
+        return affected_pairs
+
+    def _refresh_scores(self, affected_pairs):
+        affected_entities = {entity for pair in affected_pairs for entity in pair}
+        for entity in affected_entities:
+            if self._entity_counts.get(entity, 0) == 0:
+                self._entity_counts.pop(entity, None)
+        # the score of a pair changes if its count or the count of one of its entities changes
+        update_pairs = set(affected_pairs)
+        for entity in affected_entities:
+            update_pairs.update(self._entity_pairs[entity])
+        for pair in update_pairs:
+            pair_count = self._pair_counts.get(pair, 0)
+            if pair_count == 0:
+                self._pair_counts.pop(pair, None)
+                self._unnormalized_scores.pop(pair, None)
+                for entity in pair:
+                    self._entity_pairs[entity].discard(pair)
+                continue
+            entity_1, entity_2 = pair
+            count, entity_1_count, entity_2_count = (_from_fixed_point(c) for c in (pair_count,
+                                                                                    self._entity_counts[entity_1],
+                                                                                    self._entity_counts[entity_2]))
+            self._unnormalized_scores[pair] = (count ** self.weighting_exponent) * \
+                ((count / (entity_1_count * entity_2_count)) ** (1 - self.weighting_exponent))
+        for entity in affected_entities:
+            if len(self._entity_pairs[entity]) == 0:
+                del self._entity_pairs[entity]
+
+    def get_weighted_counts(self):
+        """
+        :return: dict mapping entity pairs, single entities and None to pair, entity and total counts, respectively,
+        as returned by co_occurrence_score.get_weighted_counts()
+        """
+        weighted_counts = {key: _from_fixed_point(count) for key, count in self._pair_counts.items()}
+        weighted_counts.update((entity, _from_fixed_point(count)) for entity, count in self._entity_counts.items())
+        if len(self._pair_counts) > 0:
+            weighted_counts[None] = _from_fixed_point(self._total_count)
+        return weighted_counts
+
+    def get_scores(self):
+        """
+        :return: a dictionary mapping entity pairs to their co-occurrence scores
+        """
+        # the total count affects all scores alike and is therefore applied when scores are read
+        norm_factor = _from_fixed_point(self._total_count) ** (1 - self.weighting_exponent)
+        return {pair: score * norm_factor for pair, score in self._unnormalized_scores.items()}
+
+    def save(self, state_path):
+        """
+        Writes the state to a gzip-compressed pickle file.
+
+        :param state_path: path to write the state to
+        """
+        with gzip.open(state_path, 'wb') as state_file:
+            pickle.dump(self, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(state_path):
+        """
+        Reads a state written by CoOccurrenceState.save().
+
+        :param state_path: path of the state file
+        :return: a CoOccurrenceState
+        """
+        with gzip.open(state_path, 'rb') as state_file:
+            state = pickle.load(state_file)
+        if not isinstance(state, CoOccurrenceState):
+            raise ValueError('{} does not contain a CoOccurrenceState.'.format(state_path))
+        return state
@@ -0,0 +1,120 @@
+"""
+Query index over co-occurrence scores.
+
+For each entity, the index holds the list of its co-occurring partners sorted by decreasing score in CSR layout:
+the partners of the entity with id i are stored in partners[offsets[i]:offsets[i + 1]] and their scores in the same
+range of scores. Entities and partners are integer ids into a sorted vocabulary. The arrays are written as
+uncompressed NumPy files that are memory-mapped when the index is loaded, so that queries only touch the slice of
+the queried entity.
+"""
+import bisect
+import os
+
+import numpy as np
+
+from .co_occurrence_arrays import intern_entities, load_entities, save_entities
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+
+class PartnerIndex(object):
+    """
+    Per-entity partner lists presorted by co-occurrence score. Ties are broken by partner name.
+    """
+
+    def __init__(self, entities, offsets, partners, scores):
+        """
+        :param entities: sorted numpy array of entity names
+        :param offsets: int64 numpy array of length len(entities) + 1 delimiting the partner list of each entity
+        :param partners: int32 numpy array of partner ids
+        :param scores: float64 numpy array of partner scores, decreasing within each partner list
+        """
+        self.entities = entities
+        self.offsets = offsets
+        self.partners = partners
+        self.scores = scores
+        self._entity_list = entities.tolist()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def _get_range(self, entity):
+        i = bisect.bisect_left(self._entity_list, entity)
+        if i == len(self._entity_list) or self._entity_list[i] != entity:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def _get_partners(self, start, end):
+        return list(zip(self.entities[self.partners[start:end]].tolist(), self.scores[start:end].tolist()))
+
+    def top_k(self, entity, k):
+        """
+        :param entity: str, name of the entity to query
+        :param k: int, the maximum number of partners to return
+        :return: list of up to k (partner, score) tuples with the highest scores in decreasing order of score. Empty if
+        the entity is unknown.
+        """
+        if k < 0:
+            raise ValueError('k must be non-negative.')
+        start, end = self._get_range(entity)
+        return self._get_partners(start, min(end, start + k))
+
+    def above_threshold(self, entity, threshold):
+        """
+        :param entity: str, name of the entity to query
+        :param threshold: float, minimum score of partners to return
+        :return: list of (partner, score) tuples with score >= threshold in decreasing order of score. Empty if the
+        entity is unknown.
+        """
+        start, end = self._get_range(entity)
+        # scores are sorted in decreasing order, so their negation can be binary searched
+        count = int(np.searchsorted(-self.scores[start:end], -threshold, side='right'))
+        return self._get_partners(start, start + count)
+
+    def save(self, index_path):
+        """
+        Writes the index to a directory of uncompressed NumPy arrays that can be memory-mapped by
+        PartnerIndex.load().
+
+        :param index_path: path of the directory to write to; it is created if necessary
+        """
+        os.makedirs(index_path, exist_ok=True)
+        save_entities(self.entities, index_path)
+        np.save(os.path.join(index_path, 'partner_offsets.npy'), np.ascontiguousarray(self.offsets, dtype=np.int64))
+        np.save(os.path.join(index_path, 'partners.npy'), np.ascontiguousarray(self.partners, dtype=np.int32))
+        np.save(os.path.join(index_path, 'partner_scores.npy'), np.ascontiguousarray(self.scores, dtype=np.float64))
+
+    @staticmethod
+    def load(index_path):
+        """
+        Loads an index written by PartnerIndex.save(). Partner lists and scores are memory-mapped read-only.
+
+        :param index_path: path of the directory holding the index
+        :return: a PartnerIndex
+        """
+        arrays = [np.load(os.path.join(index_path, name + '.npy'), mmap_mode='r')
+                  for name in ('partner_offsets', 'partners', 'partner_scores')]
+        return PartnerIndex(load_entities(index_path), *arrays)
+
+
+def build_partner_index(co_occurrence_scores):
+    """
+    Builds a PartnerIndex from co-occurrence scores. Each pair is added to the partner lists of both of its entities.
+
+    :param co_occurrence_scores: a dictionary mapping entity pairs to their co-occurrence scores as returned by
+    co_occurrence_score.co_occurrence_score()
+    :return: a PartnerIndex
+    """
+    pairs = list(co_occurrence_scores.keys())
+    entities, ids = intern_entities([entity for pair in pairs for entity in pair])
+    pair_ids = ids.reshape(-1, 2)
+    pair_scores = np.fromiter(co_occurrence_scores.values(), dtype=np.float64, count=len(pairs))
+
+    sources = np.concatenate((pair_ids[:, 0], pair_ids[:, 1]))
+    partners = np.concatenate((pair_ids[:, 1], pair_ids[:, 0])).astype(np.int32)
+    scores = np.concatenate((pair_scores, pair_scores))
+    # ids follow the order of entity names, so sorting by id breaks ties by name
+    order = np.lexsort((partners, -scores, sources))
+    offsets = np.zeros(len(entities) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(sources, minlength=len(entities)))
+    return PartnerIndex(entities, offsets, partners[order], scores[order])
@@ -0,0 +1,134 @@
+"""
+Progress and throughput reporting for co-occurrence scoring.
+
+A ProgressTracker is handed down the scoring pipeline, where readers and accumulators update its counters (documents,
+lines, pairs and bytes read) and attribute wall-clock time to the phases of the run:
+
+- parse: reading and splitting the matches file (and loading score files)
+- map: mapping matches to entities and extracting co-mentioned pairs
+- accumulate: computing weighted count updates and adding them up
+- finalize: computing co-occurrence scores from the weighted counts and writing them
+
+Reports are plain dicts passed to a callback every `interval` documents and once more as a final summary, so that they
+can be logged, serialized or forwarded to a batch scheduler. log_progress() is a ready-made callback that logs each
+report as a single line of JSON.
+"""
+import json
+import logging
+import sys
+import time
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+module_logger = logging.getLogger(__name__)
+
+phases = ('parse', 'map', 'accumulate', 'finalize')
+
+
+def get_max_rss_bytes():
+    """
+    :return: int, the peak resident set size of the current process in bytes or None if it cannot be determined
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def log_progress(report):
+    """
+    Progress callback that logs a report as JSON at level INFO.
+
+    :param report: dict as passed to progress callbacks by ProgressTracker
+    """
+    module_logger.info(json.dumps(report, sort_keys=True))
+
+
+class ProgressTracker(object):
+    """
+    Collects counters and per-phase timings of a scoring run and reports them to a callback.
+    """
+
+    def __init__(self, callback=None, interval=100000):
+        """
+        :param callback: function called with a report dict every interval documents and with the final summary. See
+        get_report() for its keys.
+        :param interval: int, the number of documents between two progress reports
+        """
+        if interval < 1:
+            raise ValueError('interval must be positive.')
+        self.callback = callback
+        self.interval = interval
+        self.documents = 0
+        self.lines = 0
+        self.pairs = 0
+        self.bytes_read = 0
+        self.phase_seconds = {phase: 0.0 for phase in phases}
+        self._start_time = time.perf_counter()
+        self._phase = None
+        self._phase_start = self._start_time
+        self._next_report = interval
+
+    def set_phase(self, phase):
+        """
+        Attributes the time since the last call to the previous phase and starts timing the given phase.
+
+        :param phase: str, one of phases or None to stop timing
+        """
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.phase_seconds[self._phase] += now - self._phase_start
+        self._phase = phase
+        self._phase_start = now
+
+    def update(self, documents=0, lines=0, pairs=0, bytes_read=0):
+        """
+        Increments counters and passes a progress report to the callback whenever another interval documents have been
+        processed.
+
+        :param documents: int, the number of documents processed
+        :param lines: int, the number of lines read
+        :param pairs: int, the number of weighted count updates emitted
+        :param bytes_read: int, the number of uncompressed bytes read from the matches file
+        """
+        self.documents += documents
+        self.lines += lines
+        self.pairs += pairs
+        self.bytes_read += bytes_read
+        if self.documents >= self._next_report:
+            self._next_report = (self.documents // self.interval + 1) * self.interval
+            if self.callback is not None:
+                self.callback(self.get_report('progress'))
+
+    def get_report(self, event='progress'):
+        """
+        :param event: str, 'progress' for intermediate reports or 'summary' for the final one
+        :return: dict with keys event, documents, lines, pairs, bytes_read, elapsed_seconds, documents_per_second,
+        lines_per_second, pairs_per_second, bytes_per_second, max_rss_bytes and phase_seconds, the latter mapping each
+        phase to the seconds spent in it so far
+        """
+        elapsed_seconds = time.perf_counter() - self._start_time
+        phase_seconds = dict(self.phase_seconds)
+        if self._phase is not None:
+            phase_seconds[self._phase] += time.perf_counter() - self._phase_start
+        rate_seconds = max(elapsed_seconds, 1e-9)
+        return {'event': event, 'documents': self.documents, 'lines': self.lines, 'pairs': self.pairs,
+                'bytes_read': self.bytes_read, 'elapsed_seconds': elapsed_seconds,
+                'documents_per_second': self.documents / rate_seconds, 'lines_per_second': self.lines / rate_seconds,
+                'pairs_per_second': self.pairs / rate_seconds, 'bytes_per_second': self.bytes_read / rate_seconds,
+                'max_rss_bytes': get_max_rss_bytes(), 'phase_seconds': phase_seconds}
+
+    def finish(self):
+        """
+        Stops timing and passes the summary report to the callback.
+
+        :return: dict, the summary report
+        """
+        self.set_phase(None)
+        report = self.get_report('summary')
+        if self.callback is not None:
+            self.callback(report)
+        return report
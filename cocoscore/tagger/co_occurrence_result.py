@@ -0,0 +1,106 @@
+"""
+Typed, sparse representation of co-occurrence scores.
+
+Instead of a dictionary keyed by entity name pairs, CoOccurrenceScores holds a sorted entity vocabulary and a
+scipy.sparse CSR matrix whose entry (i, j) is the score of the pair (entities[i], entities[j]). Entity marginals and
+the total weighted count used to normalize scores are kept alongside.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .co_occurrence_arrays import intern_entities
+from .co_occurrence_writer import write_co_occurrence_scores
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+
+class CoOccurrenceScores(object):
+    """
+    Co-occurrence scores of entity pairs as a sparse matrix over an entity vocabulary.
+    """
+
+    def __init__(self, entities, scores, entity_counts, total_count):
+        """
+        :param entities: sorted numpy array of entity names
+        :param scores: scipy.sparse matrix of shape (len(entities), len(entities)) holding the score of each pair
+        :param entity_counts: numpy array of the weighted count of each entity
+        :param total_count: float, total weighted count used to normalize scores
+        """
+        self.entities = entities
+        self.scores = sparse.csr_matrix(scores)
+        self.entity_counts = entity_counts
+        self.total_count = total_count
+
+    def __len__(self):
+        return self.scores.nnz
+
+    def _get_pairs(self):
+        coo_scores = self.scores.tocoo()
+        return coo_scores.row, coo_scores.col, coo_scores.data
+
+    def _get_sorted_pairs(self):
+        rows, cols, data = self._get_pairs()
+        # entity ids follow the order of entity names, so sorting by ids sorts pairs by name
+        order = np.lexsort((cols, rows))
+        return self.entities[rows[order]], self.entities[cols[order]], data[order]
+
+    def to_dict(self):
+        """
+        :return: a dictionary mapping entity pairs to their co-occurrence scores as returned by
+        co_occurrence_score.co_occurrence_score()
+        """
+        rows, cols, data = self._get_pairs()
+        return dict(zip(zip(self.entities[rows].tolist(), self.entities[cols].tolist()), data.tolist()))
+
+    def to_data_frame(self):
+        """
+        :return: pandas DataFrame with columns entity_1, entity_2 and score, sorted by entity pair
+        """
+        entity_1, entity_2, score = self._get_sorted_pairs()
+        return pd.DataFrame({'entity_1': entity_1, 'entity_2': entity_2, 'score': score},
+                            columns=['entity_1', 'entity_2', 'score'])
+
+    def to_file(self, file_path):
+        """
+        Writes scores sorted by entity pair to a file with columns entity_1, entity_2 and score using
+        co_occurrence_writer.write_co_occurrence_scores(), see there for the supported formats.
+
+        :param file_path: path of the file to write
+        :return: int, the number of pairs written
+        """
+        entity_1, entity_2, score = self._get_sorted_pairs()
+        return write_co_occurrence_scores(zip(entity_1.tolist(), entity_2.tolist(), score.tolist()), file_path)
+
+
+def scores_from_arrays(weighted_counts, scores):
+    """
+    :param weighted_counts: a co_occurrence_arrays.WeightedCounts
+    :param scores: numpy array of co-occurrence scores for each pair in weighted_counts
+    :return: a CoOccurrenceScores
+    """
+    entity_total = len(weighted_counts.entities)
+    score_matrix = sparse.csr_matrix((scores, (weighted_counts.entity_1, weighted_counts.entity_2)),
+                                     shape=(entity_total, entity_total))
+    return CoOccurrenceScores(weighted_counts.entities, score_matrix,
+                              np.asarray(weighted_counts.entity_counts, dtype=np.float64),
+                              weighted_counts.total_count)
+
+
+def scores_from_dict(weighted_counts, co_occurrence_scores):
+    """
+    :param weighted_counts: dict mapping entity pairs, single entities and None to pair, entity and total counts as
+    returned by co_occurrence_score.get_weighted_counts()
+    :param co_occurrence_scores: a dictionary mapping entity pairs to their co-occurrence scores
+    :return: a CoOccurrenceScores
+    """
+    entity_names = [key for key in weighted_counts if key is not None and not isinstance(key, tuple)]
+    entities, ids = intern_entities(entity_names + [entity for pair in co_occurrence_scores for entity in pair])
+    entity_counts = np.zeros(len(entities), dtype=np.float64)
+    entity_counts[ids[:len(entity_names)]] = [weighted_counts[name] for name in entity_names]
+    pair_ids = ids[len(entity_names):].reshape(-1, 2)
+    score_matrix = sparse.csr_matrix((np.fromiter(co_occurrence_scores.values(), dtype=np.float64,
+                                                  count=len(co_occurrence_scores)),
+                                      (pair_ids[:, 0], pair_ids[:, 1])),
+                                     shape=(len(entities), len(entities)))
+    return CoOccurrenceScores(entities, score_matrix, entity_counts, weighted_counts.get(None, 0.0))
@@ -1,8 +1,13 @@
 import collections
 import copy
+import gc
 import gzip
+import hashlib
+import heapq
 import itertools
 import os
+import tempfile
+import time
 import warnings
 from statistics import mean, stdev
 
@@ -10,6 +15,13 @@ import numpy as np
 import pandas as pd
 from sklearn import metrics
 
+from .co_occurrence_accumulator import PairCountAccumulator
+from .co_occurrence_progress import ProgressTracker
+from .co_occurrence_arrays import get_co_mention_table, get_weighted_counts_arrays, get_weighted_counts_files, \
+    is_binary_score_file, load_binary_score_table, read_matches_file_chunks, score_table_from_data_frame, \
+    score_table_to_dict, score_weighted_counts, scores_to_dict
+from .co_occurrence_result import scores_from_arrays, scores_from_dict
+from .co_occurrence_writer import write_co_occurrence_scores
 from .entity_mappers import get_serial_to_taxid_name_mapper
 from ..ml import cv
 from ..ml.distance_scores import constant_distance, reciprocal_distance
@@ -58,19 +70,71 @@ def get_entity_pairs(type_name_set, first_type, second_type):
         return itertools.combinations(first_type_names, 2)
 
 
-def process_current_pmid_score_lines(current_pmid_lines, serial_to_type_entity, first_type, second_type):
+def get_entity_pair_indices(entity_types, first_type, second_type):
+    """
+    Vectorized counterpart of get_entity_pairs() that enumerates all pairs of a document as index arrays.
+
+    :param entity_types: numpy array of int, the type of each distinct entity of a document
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :return: tuple of two numpy arrays holding the indices into entity_types of the first and second entity of each
+    pair. If first_type equals second_type, each unordered pair of distinct entities is returned once.
+    """
+    is_first = entity_types == first_type
+    is_second = entity_types == second_type
+    if not (is_first | is_second).all():
+        raise ValueError("Encountered unknown type {:d}.".format(entity_types[~(is_first | is_second)][0]))
+    first_ids = np.flatnonzero(is_first)
+    if first_type == second_type:
+        return tuple(first_ids[indices] for indices in np.triu_indices(len(first_ids), 1))
+    second_ids = np.flatnonzero(is_second)
+    return np.repeat(first_ids, len(second_ids)), np.tile(second_ids, len(first_ids))
+
+
+# minimum number of candidate pairs of a document for which process_document_matches() uses vectorized joins
+_array_pair_threshold = 2000
+
+_dense_document_policies = ('skip', 'downweight')
+
+
+def _get_position_pairs(position_ids, entity_ids, entity_total, is_first, is_second, same_type):
+    # joins the (position, entity) incidences of first-type and second-type entities on position; returns the packed
+    # pair key and the position of each co-mention
+    incidence = np.unique(position_ids * entity_total + entity_ids)
+    positions, entities = np.divmod(incidence, entity_total)
+    first_positions, first_entities = positions[is_first[entities]], entities[is_first[entities]]
+    second_positions, second_entities = positions[is_second[entities]], entities[is_second[entities]]
+    # incidences are sorted by position, so each first-type incidence matches a contiguous run of second-type ones
+    starts = np.searchsorted(second_positions, first_positions, side='left')
+    counts = np.searchsorted(second_positions, first_positions, side='right') - starts
+    first_rows = np.repeat(np.arange(len(first_positions)), counts)
+    second_rows = starts[first_rows] + np.arange(len(first_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    entity_1, entity_2 = first_entities[first_rows], second_entities[second_rows]
+    keep = entity_1 < entity_2 if same_type else slice(None)
+    return entity_1[keep] * entity_total + entity_2[keep], first_positions[first_rows][keep]
+
+
+def _group_positions(pair_keys, co_mention_keys, co_mention_positions, position_values):
+    # returns the set of co-mention positions of each pair in pair_keys
+    order = np.argsort(co_mention_keys, kind='stable')
+    slots = np.searchsorted(pair_keys, co_mention_keys[order])
+    bounds = np.searchsorted(slots, np.arange(len(pair_keys) + 1)).tolist()
+    values = position_values[co_mention_positions[order]].tolist()
+    return [set(values[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _process_document_matches_sets(pmid, paragraphs, sentences, types, serials, serial_to_type_entity, first_type,
+                                   second_type):
     return_list = []
-    pmid = int(current_pmid_lines[0][0])
     type_entities = set()
     type_entity_to_sentences = collections.defaultdict(set)
     type_entity_to_paragraphs = collections.defaultdict(set)
-    for current_line in current_pmid_lines:
-        _, paragraph, sentence, _, _, _, my_type, serial = current_line
-        type_entity = serial_to_type_entity[int(serial)]
-        assert int(my_type) == type_entity[0]
+    for paragraph, sentence, my_type, serial in zip(paragraphs, sentences, types, serials):
+        type_entity = serial_to_type_entity[serial]
+        assert my_type == type_entity[0]
         type_entities.add(type_entity)
-        type_entity_to_sentences[type_entity].add((int(paragraph), int(sentence)))
-        type_entity_to_paragraphs[type_entity].add(int(paragraph))
+        type_entity_to_sentences[type_entity].add((paragraph, sentence))
+        type_entity_to_paragraphs[type_entity].add(paragraph)
     for entity_pair in get_entity_pairs(type_entities, first_type, second_type):
         first_type_entity, second_type_entity = entity_pair
         assert first_type_entity[0] == first_type
@@ -82,24 +146,318 @@ def process_current_pmid_score_lines(current_pmid_lines, serial_to_type_entity,
     return return_list
 
 
-def load_matches_file(matches_file_path, entities_file, first_type, second_type):
-    serial_to_type_name = get_serial_to_taxid_name_mapper(entities_file, taxids=(first_type, second_type))
-    matches_file = get_file_handle(matches_file_path, matches_file_path.endswith('.gz'))
+def _process_document_matches_arrays(pmid, paragraphs, sentences, types, serials, serial_to_type_entity, first_type,
+                                     second_type):
+    # sentence and paragraph positions are encoded as integer ids and the common positions of all pairs are found at
+    # once by joining the sorted (position, entity) incidences of both entity types on position
+    entity_index = {}
+    match_entities = np.array([entity_index.setdefault(serial_to_type_entity[serial], len(entity_index))
+                               for serial in serials], dtype=np.int64)
+    if len(entity_index) == 0:
+        return []
+    entity_types = np.array([type_entity[0] for type_entity in entity_index], dtype=np.int64)
+    entity_names = np.array([type_entity[1] for type_entity in entity_index], dtype=object)
+    assert (entity_types[match_entities] == np.asarray(types, dtype=np.int64)).all()
+    entity_1, entity_2 = get_entity_pair_indices(entity_types, first_type, second_type)
+    if len(entity_1) == 0:
+        return []
+    is_first = entity_types == first_type
+    is_second = entity_types == second_type
+    same_type = first_type == second_type
+    entity_total = len(entity_index)
+    # pairs are ordered by packed key so that co-mentions can be assigned to pairs by binary search
+    pair_keys = entity_1 * entity_total + entity_2
+    order = np.argsort(pair_keys, kind='stable')
+    pair_keys, entity_1, entity_2 = pair_keys[order], entity_1[order], entity_2[order]
+
+    paragraphs = np.asarray(paragraphs, dtype=np.int64)
+    sentences = np.asarray(sentences, dtype=np.int64)
+    _, sentence_first, sentence_ids = np.unique((paragraphs << 32) | (sentences & 0xFFFFFFFF), return_index=True,
+                                                return_inverse=True)
+    _, paragraph_first, paragraph_ids = np.unique(paragraphs, return_index=True, return_inverse=True)
+    sentence_values = np.empty(len(sentence_first), dtype=object)
+    sentence_values[:] = list(zip(paragraphs[sentence_first].tolist(), sentences[sentence_first].tolist()))
+    paragraph_values = np.array(paragraphs[paragraph_first].tolist(), dtype=object)
+
+    common_sentences = _group_positions(pair_keys, *_get_position_pairs(sentence_ids.ravel(), match_entities,
+                                                                        entity_total, is_first, is_second,
+                                                                        same_type), sentence_values)
+    common_paragraphs = _group_positions(pair_keys, *_get_position_pairs(paragraph_ids.ravel(), match_entities,
+                                                                         entity_total, is_first, is_second,
+                                                                         same_type), paragraph_values)
+    names_1, names_2 = entity_names[entity_1], entity_names[entity_2]
+    swap = names_1 > names_2
+    names_1[swap], names_2[swap] = names_2[swap], names_1[swap]
+    return [[pmid, name_1, name_2, sentence_set, paragraph_set]
+            for name_1, name_2, sentence_set, paragraph_set in zip(names_1.tolist(), names_2.tolist(),
+                                                                      common_sentences, common_paragraphs)]
+
+
+def process_document_matches(pmid, paragraphs, sentences, types, serials, serial_to_type_entity, first_type,
+                             second_type, max_entities=None):
+    """
+    Extracts co-mentioned entity pairs from the matches of a single document.
+
+    Common sentences and paragraphs of documents with at least _array_pair_threshold candidate pairs are computed with
+    vectorized joins over integer-encoded positions, those of smaller documents by intersecting sets. Both give the
+    same result.
+
+    :param pmid: int, the document's pmid
+    :param paragraphs: list of int, paragraph number of each match
+    :param sentences: list of int, sentence number of each match
+    :param types: list of int, entity type of each match
+    :param serials: list of int, serial number of the entity of each match
+    :param serial_to_type_entity: dict mapping serial numbers to (type, entity name) tuples
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param max_entities: int, if given, documents with more distinct entities of the two types are skipped without
+    enumerating their pairs
+    :return: list of [pmid, entity_1, entity_2, common_sentences, common_paragraphs] lists, one per co-mentioned pair
+    """
+    type_counts = collections.Counter(type_entity[0] for type_entity in
+                                      {serial_to_type_entity[serial] for serial in serials})
+    if max_entities is not None and \
+            type_counts[first_type] + (type_counts[second_type] if first_type != second_type else 0) > max_entities:
+        return []
+    if first_type == second_type:
+        pair_total = type_counts[first_type] * (type_counts[first_type] - 1) // 2
+    else:
+        pair_total = type_counts[first_type] * type_counts[second_type]
+    process_function = _process_document_matches_arrays if pair_total >= _array_pair_threshold \
+        else _process_document_matches_sets
+    # the returned lists and sets cannot form reference cycles, but the cyclic garbage collector repeatedly scans
+    # them while they are created, which takes most of the time for documents with many pairs
+    gc_enabled = gc.isenabled()
+    gc.disable()
     try:
-        current_pmid_lines = []
-        for line in matches_file:
-            # Fields are: pmid, paragraph, sentence, start_match, end_match, matched, type, serial
-            line_split = line.rstrip().split('\t')
-            if len(current_pmid_lines) > 0 and line_split[0] != current_pmid_lines[0][0]:
-                yield process_current_pmid_score_lines(current_pmid_lines, serial_to_type_name, first_type,
-                                                       second_type)
-                current_pmid_lines = [line_split]
-            else:
-                current_pmid_lines.append(line_split)
-        if len(current_pmid_lines) > 0:
-            yield process_current_pmid_score_lines(current_pmid_lines, serial_to_type_name, first_type, second_type)
+        return process_function(pmid, paragraphs, sentences, types, serials, serial_to_type_entity, first_type,
+                                second_type)
     finally:
-        matches_file.close()
+        if gc_enabled:
+            gc.enable()
+
+
+def process_current_pmid_score_lines(current_pmid_lines, serial_to_type_entity, first_type, second_type,
+                                     max_entities=None):
+    # Fields are: pmid, paragraph, sentence, start_match, end_match, matched, type, serial
+    return process_document_matches(int(current_pmid_lines[0][0]),
+                                    [int(line[1]) for line in current_pmid_lines],
+                                    [int(line[2]) for line in current_pmid_lines],
+                                    [int(line[6]) for line in current_pmid_lines],
+                                    [int(line[7]) for line in current_pmid_lines],
+                                    serial_to_type_entity, first_type, second_type, max_entities=max_entities)
+
+
+def _get_matches_file_lines(matches_file_path, byte_range=None):
+    if byte_range is None:
+        matches_file = get_file_handle(matches_file_path, matches_file_path.endswith('.gz'))
+        try:
+            yield from matches_file
+        finally:
+            matches_file.close()
+    else:
+        if matches_file_path.endswith('.gz'):
+            raise ValueError('Byte ranges are not supported for compressed matches file {}.'.format(
+                matches_file_path))
+        start, end = byte_range
+        with open(matches_file_path, 'rb') as matches_file:
+            matches_file.seek(start)
+            position = start
+            for line in matches_file:
+                if position >= end:
+                    break
+                position += len(line)
+                yield line.decode('utf-8', errors='strict')
+
+
+def _get_line_pmid(line):
+    return line.rstrip().split(b'\t')[0]
+
+
+def _seek_document_start(matches_file, offset, max_line_length=65536):
+    # returns the first offset >= the given offset at which a new document starts
+    if offset == 0:
+        return 0
+    matches_file.seek(offset - 1)
+    matches_file.readline()
+    line_start = matches_file.tell()
+    line = matches_file.readline()
+    if not line:
+        return line_start
+
+    # pmid of the line preceding line_start
+    window_start = max(0, line_start - max_line_length)
+    matches_file.seek(window_start)
+    window = matches_file.read(line_start - window_start)[:-1]
+    if window_start == 0 or b'\n' in window:
+        previous_pmid = _get_line_pmid(window.rsplit(b'\n', 1)[-1])
+    else:
+        previous_pmid = _get_line_pmid(line)
+
+    matches_file.seek(line_start)
+    while True:
+        line_start = matches_file.tell()
+        line = matches_file.readline()
+        if not line or _get_line_pmid(line) != previous_pmid:
+            return line_start
+
+
+def get_matches_file_byte_ranges(matches_file_path, range_count):
+    """
+    Splits an uncompressed matches file into byte ranges of roughly equal size such that all lines of a document
+    (consecutive lines sharing a pmid) fall into the same range.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param range_count: int, the number of byte ranges to generate. Fewer ranges are returned if the file contains
+    too few documents.
+    :return: list of (start, end) tuples of byte offsets, end being exclusive
+    """
+    file_size = os.path.getsize(matches_file_path)
+    boundaries = [0]
+    with open(matches_file_path, 'rb') as matches_file:
+        for i in range(1, range_count):
+            offset = file_size * i // range_count
+            if offset <= boundaries[-1]:
+                continue
+            boundary = _seek_document_start(matches_file, offset)
+            if boundaries[-1] < boundary < file_size:
+                boundaries.append(boundary)
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if start < end]
+
+
+def _map_document(get_document_matches, progress, lines=0, bytes_read=0):
+    # yields the co-mentioned pairs of one document; with a progress tracker, mapping is timed as the map phase, the
+    # time until the consumer asks for the next document as the accumulate phase and the time after that as parse
+    if progress is None:
+        yield get_document_matches()
+        return
+    progress.set_phase('map')
+    document_matches = get_document_matches()
+    progress.set_phase('accumulate')
+    progress.update(documents=1, lines=lines, bytes_read=bytes_read)
+    yield document_matches
+    progress.set_phase('parse')
+
+
+def load_matches_file(matches_file_path, entities_file, first_type, second_type, byte_range=None,
+                      max_document_entities=None, progress=None):
+    """
+    Reads a matches file line by line and extracts the co-mentioned pairs of each document.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param entities_file: entities file as used by tagger
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param byte_range: optional (start, end) tuple of byte offsets to restrict reading to
+    :param max_document_entities: int, if given, documents with more distinct entities of the two types yield no
+    pairs, see process_document_matches()
+    :param progress: optional co_occurrence_progress.ProgressTracker that is updated with the number of documents,
+    lines and bytes read as well as the time spent parsing and mapping. Bytes are counted as characters, which only
+    differ for non-ASCII text.
+    :return: generator of lists of co-mentioned pairs, one per document, as returned by process_document_matches()
+    """
+    serial_to_type_name = get_serial_to_taxid_name_mapper(entities_file, taxids=(first_type, second_type))
+    current_pmid_lines = []
+    current_pmid_bytes = 0
+    if progress is not None:
+        progress.set_phase('parse')
+    for line in _get_matches_file_lines(matches_file_path, byte_range=byte_range):
+        # Fields are: pmid, paragraph, sentence, start_match, end_match, matched, type, serial
+        line_split = line.rstrip().split('\t')
+        if len(current_pmid_lines) > 0 and line_split[0] != current_pmid_lines[0][0]:
+            yield from _map_document(lambda: process_current_pmid_score_lines(
+                current_pmid_lines, serial_to_type_name, first_type, second_type, max_entities=max_document_entities),
+                progress, lines=len(current_pmid_lines), bytes_read=current_pmid_bytes)
+            current_pmid_lines = [line_split]
+            current_pmid_bytes = len(line)
+        else:
+            current_pmid_lines.append(line_split)
+            current_pmid_bytes += len(line)
+    if len(current_pmid_lines) > 0:
+        yield from _map_document(lambda: process_current_pmid_score_lines(
+            current_pmid_lines, serial_to_type_name, first_type, second_type, max_entities=max_document_entities),
+            progress, lines=len(current_pmid_lines), bytes_read=current_pmid_bytes)
+
+
+def _get_chunk_documents(chunk_df):
+    if len(chunk_df) == 0:
+        return
+    documents = chunk_df['document'].values
+    document_starts = [0] + (np.flatnonzero(documents[1:] != documents[:-1]) + 1).tolist() + [len(documents)]
+    pmids, paragraphs, sentences, types, serials = (chunk_df[c].values.tolist()
+                                                    for c in ('pmid', 'paragraph', 'sentence', 'type', 'serial'))
+    for start, end in zip(document_starts[:-1], document_starts[1:]):
+        yield pmids[start], paragraphs[start:end], sentences[start:end], types[start:end], serials[start:end]
+
+
+def iterate_matches_file_documents(matches_file_path, types, chunk_size=1000000, byte_range=None, silent=True,
+                                   progress=None):
+    """
+    Reads the matches of a matches file one document at a time. The file is parsed in large chunks with the C parser
+    of pandas; only the pmid, paragraph, sentence, type and serial columns are read and matches whose type is not
+    among types are dropped before any per-match processing. Documents without such matches are skipped.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param types: iterable of int, the types of matches to retain
+    :param chunk_size: int, the number of lines to parse at once
+    :param byte_range: optional (start, end) tuple of byte offsets to restrict reading to
+    :param silent: If True, no parsing throughput is printed
+    :param progress: optional co_occurrence_progress.ProgressTracker that is updated with the number of lines and
+    bytes parsed
+    :return: generator of tuples (pmid, paragraphs, sentences, types, serials) holding int and lists of int
+    describing the retained matches of each document
+    """
+    start_time = time.time()
+    line_count = 0
+    incomplete_df = None  # matches of the last document of the previous chunk which may continue in the next chunk
+    for chunk_df, chunk_line_count in read_matches_file_chunks(matches_file_path, None, None, chunk_size=chunk_size,
+                                                               byte_range=byte_range, types=types,
+                                                               progress=progress):
+        line_count += chunk_line_count
+        if incomplete_df is not None:
+            chunk_df = pd.concat([incomplete_df, chunk_df], axis=0)
+        if len(chunk_df) == 0:
+            continue
+        documents = chunk_df['document'].values
+        last_document_start = int(np.searchsorted(documents, documents[-1]))
+        incomplete_df = chunk_df.iloc[last_document_start:, :]
+        yield from _get_chunk_documents(chunk_df.iloc[:last_document_start, :])
+        if not silent:
+            elapsed_time = time.time() - start_time
+            print('Lines', line_count, '({:.0f} lines/sec)'.format(line_count / max(elapsed_time, 1e-9)))
+    if incomplete_df is not None and len(incomplete_df) > 0:
+        yield from _get_chunk_documents(incomplete_df)
+
+
+def load_matches_file_chunked(matches_file_path, entities_file, first_type, second_type, chunk_size=1000000,
+                              byte_range=None, silent=True, max_document_entities=None, progress=None):
+    """
+    Faster alternative to load_matches_file() that parses the matches file in large chunks with the C parser of pandas.
+    See iterate_matches_file_documents() for details.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param entities_file: entities file as used by tagger
+    :param first_type: int, type of the first entity class to be scored
+    :param second_type: int, type of the second entity class to be scored
+    :param chunk_size: int, the number of lines to parse at once
+    :param byte_range: optional (start, end) tuple of byte offsets to restrict reading to
+    :param silent: If True, no parsing throughput is printed
+    :param max_document_entities: int, if given, documents with more distinct entities of the two types yield no
+    pairs, see process_document_matches()
+    :param progress: optional co_occurrence_progress.ProgressTracker, see load_matches_file(). Bytes are counted
+    exactly.
+    :return: generator of co-mentioned entity pairs per document as yielded by load_matches_file()
+    """
+    serial_to_type_name = get_serial_to_taxid_name_mapper(entities_file, taxids=(first_type, second_type))
+    if progress is not None:
+        progress.set_phase('parse')
+    for document in iterate_matches_file_documents(matches_file_path, (first_type, second_type),
+                                                   chunk_size=chunk_size, byte_range=byte_range, silent=silent,
+                                                   progress=progress):
+        yield from _map_document(lambda: process_document_matches(*document, serial_to_type_name, first_type,
+                                                                  second_type, max_entities=max_document_entities),
+                                 progress)
 
 
 def load_sentence_score_iterator(score_dict):
@@ -123,7 +481,7 @@ def load_paragraph_score_iterator(score_dict):
             pmid, paragraph = pmid_paragraph
             pmid_to_paragraphs[pmid].add(paragraph)
         for pmid in pmid_to_paragraphs:
-            yield pmid, entity_1, entity_2, {}, pmid_to_paragraphs[pmid]
+            yield pmid, entity_1, entity_2, set(), pmid_to_paragraphs[pmid]
 
 
 def load_document_score_iterator(score_dict):
@@ -148,14 +506,73 @@ def get_max_score(scores_dict, pmid, entity_1, entity_2):
         return max(scores)
 
 
-def get_weighted_counts(matches_file_path, sentence_scores, paragraph_scores, document_scores,
-                        entities_file, first_type, second_type,
-                        document_weight, paragraph_weight, sentence_weight,
-                        ignore_scores=False, silent=False):
-    pair_scores = collections.defaultdict(float)
+def get_max_score_index(scores_dict):
+    """
+    Indexes the maximum score of each entity pair in each document. Looking up a (entity_1, entity_2, pmid) key in the
+    returned index is equivalent to calling get_max_score(scores_dict, pmid, entity_1, entity_2) but takes
+    constant time instead of time linear in the number of scores of the entity pair.
+
+    :param scores_dict: sentence, paragraph or document scores as returned by load_score_file() or split_scores()
+    :return: dict mapping (entity_1, entity_2, pmid) tuples to the maximum score (but at least 0.0)
+    """
+    max_score_index = {}
+    for entity_pair, key_to_score in scores_dict.items():
+        entity_1, entity_2 = entity_pair
+        for key, score in key_to_score.items():
+            # sentence and paragraphs scores are index with (pmid, paragraph[, sentence]), documents only with pmid
+            pmid = key[0] if isinstance(key, tuple) else key
+            index_key = (entity_1, entity_2, pmid)
+            max_score_index[index_key] = max(max_score_index.get(index_key, 0.0), score)
+    return max_score_index
+
+
+def get_co_mention_index(scores_dict):
+    """
+    Indexes the scored co-mentions of each entity pair in each document.
+
+    :param scores_dict: sentence or paragraph scores as returned by split_scores()
+    :return: dict mapping (entity_1, entity_2, pmid) tuples to the set of co-mentions in the document, i.e.,
+    (paragraph, sentence) tuples for sentence scores and paragraph numbers for paragraph scores.
+    """
+    co_mention_index = collections.defaultdict(set)
+    for entity_pair, key_to_score in scores_dict.items():
+        entity_1, entity_2 = entity_pair
+        for key in key_to_score.keys():
+            co_mention_index[(entity_1, entity_2, key[0])].add(key[1:] if len(key) > 2 else key[1])
+    return dict(co_mention_index)
+
+
+def iterate_weighted_count_updates(matches_file_path, sentence_scores, paragraph_scores, document_scores,
+                                   entities_file, first_type, second_type,
+                                   document_weight, paragraph_weight, sentence_weight,
+                                   ignore_scores=False, silent=False, byte_range=None, matches_chunk_size=None,
+                                   max_document_entities=None, dense_document_policy='skip', progress=None):
+    """
+    Computes the weighted count update of each co-mention. See get_weighted_counts() for a description of the
+    parameters.
+
+    :param max_document_entities: int, if given, documents of matches_file_path with more distinct entities of the two
+    types are treated according to dense_document_policy, see score_document_matches()
+    :param dense_document_policy: str - either 'skip' (the default) or 'downweight', see score_document_matches()
+    :param progress: optional co_occurrence_progress.ProgressTracker that is updated with the number of updates
+    emitted and passed on to the matches file readers
+    :return: generator of tuples (pmid, entity_1, entity_2, update) for each co-mention with a positive update
+    """
+    if dense_document_policy not in _dense_document_policies:
+        raise ValueError('Unknown dense_document_policy: {}'.format(dense_document_policy))
+    if max_document_entities is not None and matches_file_path is None:
+        raise ValueError('max_document_entities requires a matches file.')
+    # skipped documents are dropped before their pairs are enumerated
+    skip_document_entities = max_document_entities if dense_document_policy == 'skip' else None
     matches_iter = None
-    if matches_file_path is not None:
-        matches_iter = load_matches_file(matches_file_path, entities_file, first_type, second_type)
+    if matches_file_path is not None and matches_chunk_size is not None:
+        matches_iter = load_matches_file_chunked(matches_file_path, entities_file, first_type, second_type,
+                                                 chunk_size=matches_chunk_size, byte_range=byte_range, silent=silent,
+                                                 max_document_entities=skip_document_entities, progress=progress)
+    elif matches_file_path is not None:
+        matches_iter = load_matches_file(matches_file_path, entities_file, first_type, second_type,
+                                         byte_range=byte_range, max_document_entities=skip_document_entities,
+                                         progress=progress)
     else:
         # since document-level co-mentions are a superset of paragraph-level co-mentions which are a superset of
         # sentence-level co-mentions, prefer the scores in this order
@@ -170,76 +587,396 @@ def get_weighted_counts(matches_file_path, sentence_scores, paragraph_scores, do
             matches_iter = [my_iterator]
     assert matches_iter is not None, \
         'No iterator available; matches files and sentence/paragraph/document scores missing?'
+
+    score_indices = get_score_indices(sentence_scores, paragraph_scores, document_scores, ignore_scores=ignore_scores)
+    if progress is not None and matches_file_path is None:
+        progress.set_phase('accumulate')
     for i, document_matches in enumerate(matches_iter):
         if i > 0 and i % 100000 == 0 and not silent:
             print('Document', i)
-        for matches in document_matches:
-            pmid, entity_1, entity_2, sentence_co_mentions, paragraph_co_mentions = matches
+        document_updates = score_document_matches(document_matches, score_indices, document_weight,
+                                                  paragraph_weight, sentence_weight, ignore_scores=ignore_scores,
+                                                  max_document_entities=max_document_entities,
+                                                  dense_document_policy=dense_document_policy)
+        if progress is None:
+            yield from document_updates
+        else:
+            pair_count = 0
+            for pair_update in document_updates:
+                pair_count += 1
+                yield pair_update
+            progress.update(pairs=pair_count)
 
-            if isinstance(sentence_scores, dict) and not ignore_scores:
-                sentence_score = get_max_score(sentence_scores, pmid, entity_1, entity_2)
-            else:
-                # make sure all sentence-level co-mentions are considered as this is not the case when iterating
-                # over document or paragraph scores
-                if isinstance(sentence_scores, dict) and (entity_1, entity_2) in sentence_scores:
-                    for pmid_paragraph_sentence in sentence_scores[(entity_1, entity_2)].keys():
-                        if pmid_paragraph_sentence[0] == pmid:
-                            sentence_co_mentions.add(pmid_paragraph_sentence[1:])
-                if len(sentence_co_mentions) > 0:
-                    sentence_score = 1
-                else:
-                    sentence_score = 0
-
-            if isinstance(paragraph_scores, dict) and not ignore_scores:
-                paragraph_score = get_max_score(paragraph_scores, pmid, entity_1, entity_2)
+
+def get_score_indices(sentence_scores, paragraph_scores, document_scores, ignore_scores=False):
+    """
+    Indexes scores by entity pair and document so that they can be looked up in constant time by
+    score_document_matches().
+
+    :param sentence_scores: sentence-level scores as returned by split_scores() or None
+    :param paragraph_scores: paragraph-level scores as returned by split_scores() or None
+    :param document_scores: document-level scores as returned by split_scores() or None
+    :param ignore_scores: If True, only co-mentions are indexed instead of scores.
+    :return: tuple of sentence, paragraph and document index, each None if the level has no scores
+    """
+    if ignore_scores:
+        sentence_index, paragraph_index = (get_co_mention_index(scores) if isinstance(scores, dict) else None
+                                           for scores in (sentence_scores, paragraph_scores))
+        document_index = None
+    else:
+        sentence_index, paragraph_index, document_index = (get_max_score_index(scores)
+                                                           if isinstance(scores, dict) else None
+                                                           for scores in (sentence_scores, paragraph_scores,
+                                                                          document_scores))
+    return sentence_index, paragraph_index, document_index
+
+
+def get_document_entity_total(document_matches):
+    """
+    :param document_matches: co-mentioned pairs of a single document as yielded by load_matches_file()
+    :return: int, the number of distinct entities in the co-mentioned pairs
+    """
+    return len({matches[1] for matches in document_matches} | {matches[2] for matches in document_matches})
+
+
+def score_document_matches(document_matches, score_indices, document_weight, paragraph_weight, sentence_weight,
+                           ignore_scores=False, max_document_entities=None, dense_document_policy='skip'):
+    """
+    Computes the weighted count update of each co-mentioned pair in a document.
+
+    :param document_matches: co-mentioned pairs of a single document as yielded by load_matches_file()
+    :param score_indices: tuple of score indices as returned by get_score_indices()
+    :param document_weight: document weight in co-occurrence score
+    :param paragraph_weight: paragraph weight in the co-occurrence score
+    :param sentence_weight: sentence weight in the co-occurrence score
+    :param ignore_scores: If True, sentence scores are ignored.
+    :param max_document_entities: int, if given, documents with more distinct entities than this are treated
+    according to dense_document_policy. Review articles and similar documents mentioning hundreds of entities
+    otherwise contribute a number of pairs that grows quadratically with their entity count.
+    :param dense_document_policy: str - either 'skip' (the default) to ignore dense documents or 'downweight' to
+    multiply the updates of a dense document by max_document_entities divided by its number of entities
+    :return: generator of tuples (pmid, entity_1, entity_2, update) for each co-mention with a positive update
+    """
+    document_factor = 1.0
+    if max_document_entities is not None:
+        entity_total = get_document_entity_total(document_matches)
+        if entity_total > max_document_entities:
+            if dense_document_policy == 'skip':
+                return
+            document_factor = max_document_entities / entity_total
+    sentence_index, paragraph_index, document_index = score_indices
+    for matches in document_matches:
+        pmid, entity_1, entity_2, sentence_co_mentions, paragraph_co_mentions = matches
+        index_key = (entity_1, entity_2, pmid)
+
+        if sentence_index is not None and not ignore_scores:
+            sentence_score = sentence_index.get(index_key, 0.0)
+        else:
+            # make sure all sentence-level co-mentions are considered as this is not the case when iterating
+            # over document or paragraph scores
+            if sentence_index is not None and index_key in sentence_index:
+                sentence_co_mentions.update(sentence_index[index_key])
+            if len(sentence_co_mentions) > 0:
+                sentence_score = 1
             else:
-                # make sure all paragraph-level co-mentions are considered as this is not the case when iterating
-                # over document scores
-                if isinstance(paragraph_scores, dict) and (entity_1, entity_2) in paragraph_scores:
-                    for pmid_paragraph in paragraph_scores[(entity_1, entity_2)].keys():
-                        if pmid_paragraph[0] == pmid:
-                            paragraph_co_mentions.add(pmid_paragraph[1])
-                if len(paragraph_co_mentions) > 0:
-                    paragraph_score = 1
-                else:
-                    paragraph_score = 0
-
-            if isinstance(document_scores, dict) and not ignore_scores:
-                document_score = get_max_score(document_scores, pmid, entity_1, entity_2)
+                sentence_score = 0
+
+        if paragraph_index is not None and not ignore_scores:
+            paragraph_score = paragraph_index.get(index_key, 0.0)
+        else:
+            # make sure all paragraph-level co-mentions are considered as this is not the case when iterating
+            # over document scores
+            if paragraph_index is not None and index_key in paragraph_index:
+                paragraph_co_mentions.update(paragraph_index[index_key])
+            if len(paragraph_co_mentions) > 0:
+                paragraph_score = 1
             else:
-                document_score = 1
+                paragraph_score = 0
 
-            pair_score_update = sentence_score * sentence_weight + paragraph_score * paragraph_weight + \
-                document_score * document_weight
-            # skip zero scores since they could lead to ZeroDivisionErrors later on when computing final scores
-            if pair_score_update > 0:
-                pair_scores[(entity_1, entity_2)] += pair_score_update
-                pair_scores[entity_1] += pair_score_update
-                pair_scores[entity_2] += pair_score_update
-                pair_scores[None] += pair_score_update
+        if document_index is not None:
+            document_score = document_index.get(index_key, 0.0)
+        else:
+            document_score = 1
+
+        pair_score_update = sentence_score * sentence_weight + paragraph_score * paragraph_weight + \
+            document_score * document_weight
+        if document_factor != 1.0:
+            pair_score_update *= document_factor
+        # skip zero scores since they could lead to ZeroDivisionErrors later on when computing final scores
+        if pair_score_update > 0:
+            yield pmid, entity_1, entity_2, pair_score_update
+
+
+def get_weighted_counts_compact(matches_file_path, sentence_scores, paragraph_scores, document_scores,
+                                entities_file, first_type, second_type,
+                                document_weight, paragraph_weight, sentence_weight,
+                                ignore_scores=False, silent=False, byte_range=None, matches_chunk_size=None,
+                                max_document_entities=None, dense_document_policy='skip', progress=None):
+    """
+    Computes the same weighted counts as get_weighted_counts() in a memory-compact PairCountAccumulator.
+
+    :return: a co_occurrence_accumulator.PairCountAccumulator
+    """
+    accumulator = PairCountAccumulator()
+    for _, entity_1, entity_2, pair_score_update in iterate_weighted_count_updates(
+            matches_file_path, sentence_scores, paragraph_scores, document_scores, entities_file, first_type,
+            second_type, document_weight, paragraph_weight, sentence_weight, ignore_scores=ignore_scores,
+            silent=silent, byte_range=byte_range, matches_chunk_size=matches_chunk_size,
+            max_document_entities=max_document_entities, dense_document_policy=dense_document_policy,
+            progress=progress):
+        accumulator.add(entity_1, entity_2, pair_score_update)
+    accumulator.flush()
+    return accumulator
+
+
+def get_weighted_counts(matches_file_path, sentence_scores, paragraph_scores, document_scores,
+                        entities_file, first_type, second_type,
+                        document_weight, paragraph_weight, sentence_weight,
+                        ignore_scores=False, silent=False, byte_range=None, matches_chunk_size=None,
+                        max_document_entities=None, dense_document_policy='skip', progress=None):
+    pair_scores = collections.defaultdict(float)
+    for _, entity_1, entity_2, pair_score_update in iterate_weighted_count_updates(
+            matches_file_path, sentence_scores, paragraph_scores, document_scores, entities_file, first_type,
+            second_type, document_weight, paragraph_weight, sentence_weight, ignore_scores=ignore_scores,
+            silent=silent, byte_range=byte_range, matches_chunk_size=matches_chunk_size,
+            max_document_entities=max_document_entities, dense_document_policy=dense_document_policy,
+            progress=progress):
+        pair_scores[(entity_1, entity_2)] += pair_score_update
+        pair_scores[entity_1] += pair_score_update
+        pair_scores[entity_2] += pair_score_update
+        pair_scores[None] += pair_score_update
     return dict(pair_scores)
 
 
+_shared_scores = {}
+
+
+def _init_weighted_counts_worker(sentence_scores, paragraph_scores, document_scores):
+    _shared_scores['sentence_scores'] = sentence_scores
+    _shared_scores['paragraph_scores'] = paragraph_scores
+    _shared_scores['document_scores'] = document_scores
+
+
+def _get_weighted_counts_worker(kwargs):
+    return get_weighted_counts(**_shared_scores, **kwargs)
+
+
+def merge_weighted_counts(weighted_counts_list):
+    """
+    Merges weighted counts computed on disjoint sets of documents.
+
+    :param weighted_counts_list: iterable of dicts as returned by get_weighted_counts()
+    :return: dict mapping entity pairs, single entities and None to the summed pair, entity and total counts
+    """
+    merged_counts = collections.defaultdict(float)
+    for weighted_counts in weighted_counts_list:
+        for key, count in weighted_counts.items():
+            merged_counts[key] += count
+    return dict(merged_counts)
+
+
+def get_weighted_counts_parallel(matches_file_path, sentence_scores, paragraph_scores, document_scores,
+                                 entities_file, first_type, second_type,
+                                 document_weight, paragraph_weight, sentence_weight,
+                                 ignore_scores=False, silent=False, n_jobs=2, matches_chunk_size=None,
+                                 max_document_entities=None, dense_document_policy='skip'):
+    """
+    Computes the same weighted counts as get_weighted_counts() using several processes. The uncompressed matches file
+    is split into byte ranges of whole documents, each worker process computes weighted counts for one range and the
+    partial counts are summed up afterwards. Like ml.cv.random_cv(), worker processes are forked (see
+    ml.cv.get_fork_context()); where forking is not available, the byte ranges are processed one after the other.
+
+    :param n_jobs: int, the number of worker processes to use
+    :return: dict mapping entity pairs, single entities and None to pair, entity and total counts, respectively
+    """
+    byte_ranges = get_matches_file_byte_ranges(matches_file_path, n_jobs)
+    worker_kwargs = [{'matches_file_path': matches_file_path, 'entities_file': entities_file,
+                      'first_type': first_type, 'second_type': second_type,
+                      'document_weight': document_weight, 'paragraph_weight': paragraph_weight,
+                      'sentence_weight': sentence_weight, 'ignore_scores': ignore_scores, 'silent': silent,
+                      'byte_range': byte_range, 'matches_chunk_size': matches_chunk_size,
+                      'max_document_entities': max_document_entities, 'dense_document_policy': dense_document_policy}
+                     for byte_range in byte_ranges]
+    context = cv.get_fork_context()
+    if context is None:
+        return merge_weighted_counts(get_weighted_counts(sentence_scores=sentence_scores,
+                                                         paragraph_scores=paragraph_scores,
+                                                         document_scores=document_scores, **kwargs)
+                                     for kwargs in worker_kwargs)
+    with context.Pool(processes=max(1, len(byte_ranges)), initializer=_init_weighted_counts_worker,
+                      initargs=(sentence_scores, paragraph_scores, document_scores)) as pool:
+        weighted_counts_list = pool.map(_get_weighted_counts_worker, worker_kwargs, chunksize=1)
+    return merge_weighted_counts(weighted_counts_list)
+
+
+def _parse_score_line(line):
+    pmid, paragraph, sentence, entity_1, entity_2, score = line.rstrip().split('\t')
+    entity_key = tuple(sorted((entity_1, entity_2)))
+    if sentence != '-1':  # sentence-level score
+        score_key = (int(pmid), int(paragraph), int(sentence))
+    elif sentence == '-1' and paragraph != '-1':  # paragraph-level score
+        score_key = (int(pmid), int(paragraph))
+    else:  # document-level score
+        score_key = int(pmid)
+    return int(pmid), entity_key, score_key, float(score)
+
+
 def load_score_file(score_file_path):
     compression = score_file_path.endswith('.gz')
     score_file = get_file_handle(score_file_path, compression)
     score_dict = collections.defaultdict(dict)
     try:
         for line in score_file:
-            pmid, paragraph, sentence, entity_1, entity_2, score = line.rstrip().split('\t')
-            entity_key = tuple(sorted((entity_1, entity_2)))
-            if sentence != '-1':  # sentence-level score
-                score_key = (int(pmid), int(paragraph), int(sentence))
-            elif sentence == '-1' and paragraph != '-1':  # paragraph-level score
-                score_key = (int(pmid), int(paragraph))
-            else:  # document-level score
-                score_key = int(pmid)
-            score_dict[entity_key][score_key] = float(score)
+            _, entity_key, score_key, score = _parse_score_line(line)
+            score_dict[entity_key][score_key] = score
     finally:
         score_file.close()
     return dict(score_dict)
 
 
+def get_score_file_levels(score_file_path):
+    """
+    Scans a score file for the levels it contains scores for without keeping any scores in memory.
+
+    :param score_file_path: score file as described in co_occurrence_score()
+    :return: tuple of three bools stating if the file contains sentence-, paragraph- and document-level scores
+    """
+    has_sentence, has_paragraph, has_document = False, False, False
+    compression = score_file_path.endswith('.gz')
+    score_file = get_file_handle(score_file_path, compression)
+    try:
+        for line in score_file:
+            _, paragraph, sentence, _ = line.split('\t', 3)
+            if sentence != '-1':
+                has_sentence = True
+            elif paragraph != '-1':
+                has_paragraph = True
+            else:
+                has_document = True
+            if has_sentence and has_paragraph and has_document:
+                break
+    finally:
+        score_file.close()
+    return has_sentence, has_paragraph, has_document
+
+
+def iterate_score_file_documents(score_file_path):
+    """
+    Reads a score file sorted by pmid one document at a time.
+
+    :param score_file_path: score file as described in co_occurrence_score(), sorted by pmid (see sort_score_file())
+    :return: generator of tuples (pmid, score_dict) where score_dict holds the scores of the document in the format
+    returned by load_score_file()
+    :raises ValueError: if the score file is not sorted by pmid
+    """
+    compression = score_file_path.endswith('.gz')
+    score_file = get_file_handle(score_file_path, compression)
+    current_pmid = None
+    score_dict = collections.defaultdict(dict)
+    try:
+        for line_number, line in enumerate(score_file, start=1):
+            pmid, entity_key, score_key, score = _parse_score_line(line)
+            if pmid != current_pmid:
+                if current_pmid is not None:
+                    if pmid < current_pmid:
+                        raise ValueError('Score file {} is not sorted by pmid: pmid {} in line {} follows pmid {}. '
+                                         'Use sort_score_file() to sort it.'.format(score_file_path, pmid,
+                                                                                    line_number, current_pmid))
+                    yield current_pmid, dict(score_dict)
+                current_pmid = pmid
+                score_dict = collections.defaultdict(dict)
+            score_dict[entity_key][score_key] = score
+        if current_pmid is not None:
+            yield current_pmid, dict(score_dict)
+    finally:
+        score_file.close()
+
+
+def _get_score_line_pmid(line):
+    return int(line.split('\t', 1)[0])
+
+
+def sort_score_file(score_file_path, sorted_score_file_path, max_lines_in_memory=1000000, temp_dir=None):
+    """
+    Sorts a score file by pmid using an external merge sort so that it can be scored with
+    get_weighted_counts_streaming(). Sorted runs of at most max_lines_in_memory lines are written to temporary files
+    and merged afterwards. The sort is stable, i.e. lines of the same document keep their relative order.
+
+    :param score_file_path: score file as described in co_occurrence_score()
+    :param sorted_score_file_path: path the sorted score file is written to; gzip-compressed if it ends in .gz
+    :param max_lines_in_memory: int, the maximum number of lines held in memory at a time
+    :param temp_dir: directory to write temporary files to. If None, the system default is used.
+    """
+    if max_lines_in_memory < 1:
+        raise ValueError('max_lines_in_memory must be positive.')
+    with tempfile.TemporaryDirectory(dir=temp_dir) as run_dir:
+        run_paths = []
+        score_file = get_file_handle(score_file_path, score_file_path.endswith('.gz'))
+        try:
+            while True:
+                lines = list(itertools.islice(score_file, max_lines_in_memory))
+                if len(lines) == 0:
+                    break
+                if not lines[-1].endswith('\n'):
+                    lines[-1] += '\n'
+                lines.sort(key=_get_score_line_pmid)
+                run_path = os.path.join(run_dir, 'run_{}.tsv'.format(len(run_paths)))
+                with open(run_path, 'wt') as run_file:
+                    run_file.writelines(lines)
+                run_paths.append(run_path)
+        finally:
+            score_file.close()
+
+        run_files = [open(run_path, 'rt') for run_path in run_paths]
+        try:
+            if sorted_score_file_path.endswith('.gz'):
+                sorted_score_file = gzip.open(sorted_score_file_path, 'wt')
+            else:
+                sorted_score_file = open(sorted_score_file_path, 'wt')
+            with sorted_score_file:
+                # heapq.merge() is stable with respect to the order of the runs
+                sorted_score_file.writelines(heapq.merge(*run_files, key=_get_score_line_pmid))
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+
+def get_weighted_counts_streaming(score_file_path, document_weight, paragraph_weight, sentence_weight,
+                                  ignore_scores=False, silent=False, progress=None):
+    """
+    Computes the same weighted counts as get_weighted_counts() for a score file without a matches file, but holds only
+    the scores of a single document and the running pair, entity and total counts in memory.
+
+    :param score_file_path: score file as described in co_occurrence_score(), sorted by pmid (see sort_score_file())
+    :param progress: optional co_occurrence_progress.ProgressTracker that is updated with the number of documents
+    and the time spent parsing the score file and accumulating counts
+    :return: dict mapping entity pairs, single entities and None to pair, entity and total counts, respectively
+    :raises ValueError: if the score file is not sorted by pmid
+    """
+    # the levels present anywhere in the file decide how co-mentions are extracted, see get_weighted_counts()
+    file_levels = get_score_file_levels(score_file_path)
+    weighted_counts = collections.defaultdict(float)
+    if progress is not None:
+        progress.set_phase('parse')
+    for i, (_, document_scores) in enumerate(iterate_score_file_documents(score_file_path)):
+        if progress is not None:
+            progress.set_phase('accumulate')
+        if i > 0 and i % 100000 == 0 and not silent:
+            print('Document', i)
+        level_scores = (scores if scores is not None else {} if has_level else None
+                        for scores, has_level in zip(split_scores(document_scores), file_levels))
+        document_counts = get_weighted_counts(None, *level_scores, None, None, None,
+                                              document_weight=document_weight, paragraph_weight=paragraph_weight,
+                                              sentence_weight=sentence_weight, ignore_scores=ignore_scores,
+                                              silent=True)
+        for key, count in document_counts.items():
+            weighted_counts[key] += count
+        if progress is not None:
+            progress.update(documents=1)
+            progress.set_phase('parse')
+    return dict(weighted_counts)
+
+
 def split_scores(score_dict):
     sentence_scores = collections.defaultdict(dict)
     paragraph_scores = collections.defaultdict(dict)
@@ -264,10 +1001,68 @@ def split_scores(score_dict):
     return sentence_scores, paragraph_scores, document_scores
 
 
+def iterate_co_occurrence_scores(weighted_counts, weighting_exponent):
+    """
+    Computes co-occurrence scores from weighted counts one pair at a time.
+
+    :param weighted_counts: dict mapping entity pairs, single entities and None to pair, entity and total counts as
+    returned by get_weighted_counts()
+    :param weighting_exponent: exponent weight in the co-occurrence score
+    :return: generator of (entity_1, entity_2, score) tuples
+    """
+    if len(weighted_counts) == 0:
+        return
+    norm_factor = weighted_counts[None]
+    for key, score in weighted_counts.items():
+        if not isinstance(key, tuple):
+            continue
+        entity_1, entity_2 = key
+        co_occurrence = (score ** weighting_exponent) * \
+                        (((score * norm_factor) / (weighted_counts[entity_1] * weighted_counts[entity_2])) **
+                         (1 - weighting_exponent))
+        yield entity_1, entity_2, co_occurrence
+
+
+def get_co_occurrence_scores(weighted_counts, weighting_exponent):
+    """
+    Computes co-occurrence scores from weighted counts.
+
+    :param weighted_counts: dict mapping entity pairs, single entities and None to pair, entity and total counts as
+    returned by get_weighted_counts()
+    :param weighting_exponent: exponent weight in the co-occurrence score
+    :return: a dictionary mapping entity pairs to their co-occurrence scores
+    """
+    return {(entity_1, entity_2): score
+            for entity_1, entity_2, score in iterate_co_occurrence_scores(weighted_counts, weighting_exponent)}
+
+
+def _iterate_array_scores(weighted_counts, scores, chunk_size=100000):
+    entities = weighted_counts.entities
+    for start in range(0, len(scores), chunk_size):
+        end = start + chunk_size
+        yield from zip(entities[weighted_counts.entity_1[start:end]].tolist(),
+                       entities[weighted_counts.entity_2[start:end]].tolist(), scores[start:end].tolist())
+
+
+def _get_array_scores_output(weighted_counts, weighting_exponent, return_type, output_file_path, score_threshold,
+                             output_sort):
+    scores = score_weighted_counts(weighted_counts, weighting_exponent)
+    if output_file_path is not None:
+        return write_co_occurrence_scores(_iterate_array_scores(weighted_counts, scores), output_file_path,
+                                          score_threshold=score_threshold, sort=output_sort)
+    elif return_type == 'sparse':
+        return scores_from_arrays(weighted_counts, scores)
+    return scores_to_dict(weighted_counts, scores)
+
+
 def co_occurrence_score(matches_file_path, score_file_path,
                         entities_file, first_type, second_type,
                         document_weight=15.0, paragraph_weight=0.0,
-                        sentence_weight=1.0, weighting_exponent=0.6, ignore_scores=False, silent=False):
+                        sentence_weight=1.0, weighting_exponent=0.6, ignore_scores=False, silent=False,
+                        engine='dict', n_jobs=1, matches_chunk_size=None, streaming=False, return_type='dict',
+                        compact_counts=False, output_file_path=None, score_threshold=None, output_sort=None,
+                        max_document_entities=None, dense_document_policy='skip', progress_callback=None,
+                        progress_interval=100000):
     """
     Computes co-occurrence score for a given matches file and/or sentence score file. See notes from 20170803 for an
     explanation compared to DISEASES scoring scheme (as implemented in co_occurrence_score_diseases).
@@ -276,7 +1071,8 @@ def co_occurrence_score(matches_file_path, score_file_path,
     If this is None, co-occurrences are extracted from score_file_path.
     :param score_file_path: score file (tsv formatted) with five columns: pmid, paragraph number,
     sentence number, first entity, second entity, sentence score. For document-level scores, set paragraph number and
-    sentence number to -1. For paragraph-level scores, set sentence number to -1.
+    sentence number to -1. For paragraph-level scores, set sentence number to -1. Alternatively, the path to a binary
+    score file as written by co_occurrence_arrays.convert_score_file(), which is memory-mapped by the 'numpy' engine.
     :param entities_file: entities file as used by tagger
     :param first_type: int, type of the first entity class to be scored
     :param second_type: int, type of the second entity class to be scored
@@ -286,34 +1082,239 @@ def co_occurrence_score(matches_file_path, score_file_path,
     :param weighting_exponent: exponent weight in the co-occurrence score
     :param ignore_scores: If True, sentence scores are ignored.
     :param silent: If True, no progress updates are printed
-    :return: a dictionary mapping entity pairs to their co-occurrence scores
+    :param engine: str - either 'dict' (the default) or 'numpy'. 'dict' computes scores using Python dictionaries keyed
+    by entity names. 'numpy' interns entity names to integer ids and computes scores using vectorized operations on
+    arrays (see co_occurrence_arrays.py), which is faster and needs less memory for large inputs.
+    :param n_jobs: int, the number of processes used to process matches_file_path with the 'dict' engine. If larger
+    than 1, the matches file is split into byte ranges of whole documents that are processed in parallel. This
+    requires an uncompressed matches file; otherwise, the file is processed by a single process.
+    :param matches_chunk_size: int, if given, matches_file_path is parsed with load_matches_file_chunked() in chunks of
+    this many lines when using the 'dict' engine. This is considerably faster than the default line-by-line parser.
+    :param streaming: If True, score_file_path is processed one document at a time with the 'dict' engine, keeping
+    only the weighted counts in memory instead of the whole score file. This requires matches_file_path to be None and
+    a tsv score file sorted by pmid (see sort_score_file()); a ValueError is raised for unsorted score files.
+    :param return_type: str - either 'dict' (the default) or 'sparse'. See below.
+    :param compact_counts: If True, the 'dict' engine accumulates weighted counts in a
+    co_occurrence_accumulator.PairCountAccumulator instead of a dictionary, which needs 32 to 64 instead of roughly
+    120 bytes per entity pair. Weighted counts are identical; final scores are computed with NumPy and may differ in
+    the last digits. Cannot be combined with n_jobs > 1 or streaming.
+    :param output_file_path: if given, scores are not returned but written to this file in chunks of bounded size as
+    they are computed, see co_occurrence_writer.write_co_occurrence_scores() for the supported formats.
+    :param score_threshold: float, if given, only pairs with a score >= score_threshold are written to
+    output_file_path
+    :param output_sort: None, 'pair', 'score' or 'entity'. Sort order of the pairs written to output_file_path, see
+    co_occurrence_writer.write_co_occurrence_scores(). 'entity' groups pairs by their first entity, i.e. the entity
+    whose name sorts first, not by every entity they contain. Sorting uses an external merge sort.
+    :param max_document_entities: int, if given, documents of matches_file_path with more distinct entities of the two
+    types are skipped or down-weighted according to dense_document_policy, which keeps pathological documents such
+    as reviews mentioning hundreds of genes from dominating run time and scores. Requires a matches file and the
+    'dict' engine.
+    :param dense_document_policy: str - either 'skip' (the default) or 'downweight'. See
+    score_document_matches().
+    :param progress_callback: function called with a report dict every progress_interval documents and with a final
+    summary that includes the time spent in the parse, map, accumulate and finalize phases, see
+    co_occurrence_progress.ProgressTracker. co_occurrence_progress.log_progress() logs reports as JSON. Documents,
+    lines and bytes are not counted when matches are processed by several processes or the 'numpy' engine.
+    :param progress_interval: int, the number of documents between two progress reports
+    :return: if return_type is 'dict', a dictionary mapping entity pairs to their co-occurrence scores. If return_type
+    is 'sparse', a co_occurrence_result.CoOccurrenceScores holding an entity vocabulary, a sparse score matrix, entity
+    marginals and the total weighted count, which needs much less memory and can be exported to the dictionary, a
+    pandas DataFrame or a file. If output_file_path is given, the number of pairs written to it.
     """
     if matches_file_path is None and score_file_path is None:
         raise ValueError('matches_file_path or score_file_path must be specified.')
-    if score_file_path is not None:
-        scores = load_score_file(score_file_path)
+    if return_type not in ('dict', 'sparse'):
+        raise ValueError(f'Unknown return_type: {return_type}')
+    if streaming and (matches_file_path is not None or score_file_path is None or engine != 'dict' or
+                      is_binary_score_file(score_file_path)):
+        raise ValueError('Streaming mode requires a tsv score file, no matches file and the dict engine.')
+    if compact_counts and (streaming or n_jobs > 1):
+        raise ValueError('compact_counts cannot be combined with streaming or n_jobs > 1.')
+    if output_file_path is not None and return_type != 'dict':
+        raise ValueError('Scores written to output_file_path cannot be returned as {}.'.format(return_type))
+    if max_document_entities is not None and (matches_file_path is None or engine != 'dict'):
+        raise ValueError('max_document_entities requires a matches file and the dict engine.')
+    if dense_document_policy not in _dense_document_policies:
+        raise ValueError('Unknown dense_document_policy: {}'.format(dense_document_policy))
+    if engine not in ('dict', 'numpy'):
+        raise ValueError(f'Unknown engine: {engine}')
+    progress = ProgressTracker(progress_callback, progress_interval) if progress_callback is not None else None
+    if engine == 'numpy':
+        if progress is not None:
+            progress.set_phase('accumulate')
+        weighted_counts = get_weighted_counts_files(matches_file_path, score_file_path, entities_file, first_type,
+                                                    second_type, document_weight=document_weight,
+                                                    paragraph_weight=paragraph_weight,
+                                                    sentence_weight=sentence_weight, ignore_scores=ignore_scores)
+        if progress is not None:
+            progress.set_phase('finalize')
+        return _finish_progress(progress, _get_array_scores_output(weighted_counts, weighting_exponent, return_type,
+                                                                   output_file_path, score_threshold, output_sort))
+    if progress is not None:
+        progress.set_phase('parse')
+    if streaming:
+        sentence_scores, paragraph_scores, document_scores = None, None, None
+    elif score_file_path is not None:
+        if is_binary_score_file(score_file_path):
+            scores = score_table_to_dict(load_binary_score_table(score_file_path))
+        else:
+            scores = load_score_file(score_file_path)
         sentence_scores, paragraph_scores, document_scores = split_scores(scores)
         del scores  # hint to GC as this may be large
     else:
         sentence_scores, paragraph_scores, document_scores = None, None, None
 
-    co_occurrence_scores = {}
-    weighted_counts = get_weighted_counts(matches_file_path=matches_file_path, sentence_scores=sentence_scores,
-                                          paragraph_scores=paragraph_scores, document_scores=document_scores,
-                                          entities_file=entities_file, first_type=first_type, second_type=second_type,
-                                          document_weight=document_weight, paragraph_weight=paragraph_weight,
-                                          sentence_weight=sentence_weight,
-                                          ignore_scores=ignore_scores, silent=silent)
-    norm_factor = weighted_counts[None]
-    for key, score in weighted_counts.items():
-        if not isinstance(key, tuple):
-            continue
-        entity_1, entity_2 = key
-        co_occurrence = (score ** weighting_exponent) * \
-                        (((score * norm_factor) / (weighted_counts[entity_1] * weighted_counts[entity_2])) **
-                         (1 - weighting_exponent))
-        co_occurrence_scores[key] = co_occurrence
-    return co_occurrence_scores
+    if n_jobs > 1 and matches_file_path is not None and matches_file_path.endswith('.gz'):
+        warnings.warn('Compressed matches file {} cannot be split into byte ranges; '
+                      'processing it in a single process.'.format(matches_file_path))
+        n_jobs = 1
+
+    weighted_counts_kwargs = dict(matches_file_path=matches_file_path, sentence_scores=sentence_scores,
+                                  paragraph_scores=paragraph_scores, document_scores=document_scores,
+                                  entities_file=entities_file, first_type=first_type, second_type=second_type,
+                                  document_weight=document_weight, paragraph_weight=paragraph_weight,
+                                  sentence_weight=sentence_weight,
+                                  ignore_scores=ignore_scores, silent=silent, matches_chunk_size=matches_chunk_size,
+                                  max_document_entities=max_document_entities,
+                                  dense_document_policy=dense_document_policy)
+    if streaming:
+        weighted_counts = get_weighted_counts_streaming(score_file_path, document_weight=document_weight,
+                                                        paragraph_weight=paragraph_weight,
+                                                        sentence_weight=sentence_weight,
+                                                        ignore_scores=ignore_scores, silent=silent, progress=progress)
+    elif n_jobs > 1 and matches_file_path is not None:
+        if progress is not None:
+            progress.set_phase('accumulate')
+        weighted_counts = get_weighted_counts_parallel(n_jobs=n_jobs, **weighted_counts_kwargs)
+    elif compact_counts:
+        weighted_counts = get_weighted_counts_compact(progress=progress, **weighted_counts_kwargs)
+        if progress is not None:
+            progress.set_phase('finalize')
+        return _finish_progress(progress, _get_array_scores_output(weighted_counts.to_weighted_counts(),
+                                                                   weighting_exponent, return_type, output_file_path,
+                                                                   score_threshold, output_sort))
+    else:
+        weighted_counts = get_weighted_counts(progress=progress, **weighted_counts_kwargs)
+    if progress is not None:
+        progress.set_phase('finalize')
+    if output_file_path is not None:
+        return _finish_progress(progress, write_co_occurrence_scores(
+            iterate_co_occurrence_scores(weighted_counts, weighting_exponent), output_file_path,
+            score_threshold=score_threshold, sort=output_sort))
+    co_occurrence_scores = get_co_occurrence_scores(weighted_counts, weighting_exponent)
+    if return_type == 'sparse':
+        return _finish_progress(progress, scores_from_dict(weighted_counts, co_occurrence_scores))
+    return _finish_progress(progress, co_occurrence_scores)
+
+
+def co_occurrence_score_data_frame(score_df, document_weight=15.0, paragraph_weight=0.0, sentence_weight=1.0,
+                                   weighting_exponent=0.6, ignore_scores=False, score_column='predicted',
+                                   entity_columns=('entity1', 'entity2'), return_type='dict'):
+    """
+    Computes co-occurrence scores for scored co-mentions held in a pandas DataFrame, using the vectorized operations of
+    the 'numpy' engine. Gives the same scores as writing the DataFrame to a score file and passing it to
+    co_occurrence_score() without a matches file, but avoids writing and parsing the file.
+
+    :param score_df: pandas DataFrame with columns pmid, paragraph, sentence, the two entity columns and score_column,
+    e.g. as loaded by tools.data_tools.load_data_frame(). Paragraph and sentence are -1 for document- and
+    paragraph-level rows as in score files.
+    :param document_weight: document weight in co-occurrence score
+    :param paragraph_weight: paragraph weight in the co-occurrence score
+    :param sentence_weight: sentence weight in the co-occurrence score
+    :param weighting_exponent: exponent weight in the co-occurrence score
+    :param ignore_scores: If True, sentence scores are ignored.
+    :param score_column: str, the column of score_df holding the score of each co-mention
+    :param entity_columns: tuple of str, the columns of score_df holding the co-mentioned entities
+    :param return_type: str - either 'dict' (the default) or 'sparse', see co_occurrence_score()
+    :return: a dictionary mapping entity pairs to their co-occurrence scores or a
+    co_occurrence_result.CoOccurrenceScores if return_type is 'sparse'
+    """
+    if return_type not in ('dict', 'sparse'):
+        raise ValueError(f'Unknown return_type: {return_type}')
+    co_mention_table = get_co_mention_table(None, score_table_from_data_frame(score_df, score_column=score_column,
+                                                                              entity_columns=entity_columns),
+                                            0, 0, ignore_scores=ignore_scores)
+    weighted_counts = get_weighted_counts_arrays(co_mention_table, document_weight=document_weight,
+                                                 paragraph_weight=paragraph_weight, sentence_weight=sentence_weight)
+    return _get_array_scores_output(weighted_counts, weighting_exponent, return_type, None, None, None)
+
+
+def _finish_progress(progress, result):
+    if progress is not None:
+        progress.finish()
+    return result
+
+
+_target_defaults = {'document_weight': 15.0, 'paragraph_weight': 0.0, 'sentence_weight': 1.0,
+                    'weighting_exponent': 0.6, 'ignore_scores': False, 'score_file_path': None,
+                    'max_document_entities': None, 'dense_document_policy': 'skip'}
+
+
+def _get_target(target):
+    unknown_keys = set(target) - set(_target_defaults) - {'first_type', 'second_type'}
+    if unknown_keys:
+        raise ValueError('Unknown target parameters: {}'.format(', '.join(sorted(unknown_keys))))
+    if 'first_type' not in target or 'second_type' not in target:
+        raise ValueError('Each target must specify first_type and second_type.')
+    target = {**_target_defaults, **target}
+    if target['dense_document_policy'] not in _dense_document_policies:
+        raise ValueError('Unknown dense_document_policy: {}'.format(target['dense_document_policy']))
+    if target['score_file_path'] is not None:
+        scores = load_score_file(target['score_file_path'])
+        target['score_indices'] = get_score_indices(*split_scores(scores), ignore_scores=target['ignore_scores'])
+        del scores  # hint to GC as this may be large
+    else:
+        target['score_indices'] = (None, None, None)
+    return target
+
+
+def co_occurrence_score_multi(matches_file_path, entities_file, targets, silent=False, matches_chunk_size=1000000):
+    """
+    Computes co-occurrence scores for several targets, i.e. pairs of entity types with their own weights and scores,
+    while parsing the matches file and mapping the matches of each document only once.
+
+    :param matches_file_path: matches file as produced by tagger
+    :param entities_file: entities file as used by tagger
+    :param targets: list of dicts, each describing one score table to compute. Keys are first_type and second_type
+    (mandatory) as well as document_weight, paragraph_weight, sentence_weight, weighting_exponent, ignore_scores,
+    score_file_path, max_document_entities and dense_document_policy that default to the defaults of
+    co_occurrence_score().
+    :param silent: If True, no progress updates are printed
+    :param matches_chunk_size: int, the number of lines of the matches file to parse at once
+    :return: list of dictionaries mapping entity pairs to their co-occurrence scores, one per target in the order of
+    targets. Each equals the result of co_occurrence_score() called with the parameters of the target.
+    """
+    targets = [_get_target(target) for target in targets]
+    all_types = sorted({target[type_key] for target in targets for type_key in ('first_type', 'second_type')})
+    serial_to_type_name = get_serial_to_taxid_name_mapper(entities_file, taxids=all_types)
+    target_counts = [collections.defaultdict(float) for _ in targets]
+    for i, document in enumerate(iterate_matches_file_documents(matches_file_path, all_types,
+                                                                chunk_size=matches_chunk_size, silent=silent)):
+        if i > 0 and i % 100000 == 0 and not silent:
+            print('Document', i)
+        pmid, paragraphs, sentences, types, serials = document
+        for target, pair_scores in zip(targets, target_counts):
+            target_types = (target['first_type'], target['second_type'])
+            keep = [j for j, my_type in enumerate(types) if my_type in target_types]
+            if len(keep) == 0:
+                continue
+            document_matches = process_document_matches(pmid, [paragraphs[j] for j in keep],
+                                                         [sentences[j] for j in keep], [types[j] for j in keep],
+                                                         [serials[j] for j in keep], serial_to_type_name,
+                                                         *target_types,
+                                                         max_entities=target['max_document_entities']
+                                                         if target['dense_document_policy'] == 'skip' else None)
+            for _, entity_1, entity_2, pair_score_update in score_document_matches(
+                    document_matches, target['score_indices'], target['document_weight'],
+                    target['paragraph_weight'], target['sentence_weight'], ignore_scores=target['ignore_scores'],
+                    max_document_entities=target['max_document_entities'],
+                    dense_document_policy=target['dense_document_policy']):
+                pair_scores[(entity_1, entity_2)] += pair_score_update
+                pair_scores[entity_1] += pair_score_update
+                pair_scores[entity_2] += pair_score_update
+                pair_scores[None] += pair_score_update
+    return [get_co_occurrence_scores(dict(pair_scores), target['weighting_exponent'])
+            for target, pair_scores in zip(targets, target_counts)]
 
 
 def co_occurrence_score_diseases(matches_file_path, entities_file, document_weight=3.0, paragraph_weight=0.0,
@@ -340,21 +1341,34 @@ def co_occurrence_score_string(matches_file_path, entities_file, entity_type, do
 
 
 def _compute_metric(score_dict, data_frame, warn=True, metric='roc_auc_score'):
-    scores = []
-    classes = []
-    for _, group_df in data_frame.groupby(['entity1', 'entity2', 'class']):
-        if group_df.ndim == 1:
-            entity1, entity2, _class = group_df.loc[['entity1', 'entity2', 'class']]
-        else:
-            entity1, entity2, _class = group_df.iloc[0, :].loc[['entity1', 'entity2', 'class']]
-        entity_pair = tuple(sorted((entity1, entity2)))
-        if entity_pair in score_dict:
-            scores.append(score_dict[entity_pair])
-        else:
-            if warn:
-                warnings.warn(f'Missing score for entity pair {entity_pair}.')
-            scores.append(0.0)
-        classes.append(_class)
+    """
+    Evaluates co-occurrence scores on the associations in a DataFrame. Each distinct (entity1, entity2, class) group
+    of data_frame is one instance whose score is looked up in score_dict under the sorted entity pair.
+
+    :param score_dict: dict mapping sorted entity pairs to co-occurrence scores
+    :param data_frame: DataFrame with columns entity1, entity2 and class
+    :param warn: boolean, if a single warning is to be issued in case scores of entity pairs are missing. Missing scores
+    are set to 0.0.
+    :param metric: performance metric, either 'roc_auc_score' or 'average_precision_score'
+    :return: the performance metric
+    """
+    associations = data_frame.groupby(['entity1', 'entity2', 'class']).size().index
+    entity_1 = associations.get_level_values('entity1').values
+    entity_2 = associations.get_level_values('entity2').values
+    classes = associations.get_level_values('class').values
+    swap = entity_1 > entity_2
+    first_entities = np.where(swap, entity_2, entity_1)
+    second_entities = np.where(swap, entity_1, entity_2)
+
+    scores = [score_dict.get(entity_pair) for entity_pair in zip(first_entities.tolist(), second_entities.tolist())]
+    missing = np.fromiter((score is None for score in scores), dtype=bool, count=len(scores))
+    if missing.any():
+        missing_count = int(missing.sum())
+        if warn:
+            example_pair = (first_entities[missing][0], second_entities[missing][0])
+            warnings.warn(f'Missing scores for {missing_count} of {len(scores)} associations, e.g. entity pair '
+                          f'{example_pair}. Setting them to 0.0.')
+        scores = [0.0 if score is None else score for score in scores]
     if metric == 'roc_auc_score':
         return metrics.roc_auc_score(classes, scores)
     elif metric == 'average_precision_score':
@@ -363,8 +1377,29 @@ def _compute_metric(score_dict, data_frame, warn=True, metric='roc_auc_score'):
         raise ValueError(f'Unknown scoring metric: {metric}')
 
 
+def get_sentence_score_key(sentence_train_df, sentence_test_df, fasttext_epochs, fasttext_dim, fasttext_bucket,
+                           fasttext_settings=None):
+    """
+    Computes the key under which fastText sentence scores of a CV fold are memoized by cv_independent_associations().
+
+    :param sentence_train_df: DataFrame holding the sentence-level rows of the training set of a fold
+    :param sentence_test_df: DataFrame holding the sentence-level rows of the test set of a fold
+    :param fasttext_epochs: int, number of fasttext epochs
+    :param fasttext_dim: int, fasttext vector dimensionality
+    :param fasttext_bucket: int, number of fasttext buckets
+    :param fasttext_settings: hashable identifier of the classifier and all of its other settings
+    :return: tuple of a digest of the index, text and class of all rows of both sets and the fastText settings
+    """
+    digest = hashlib.sha1()
+    for sentence_df in (sentence_train_df, sentence_test_df):
+        digest.update(np.int64(len(sentence_df)).tobytes())
+        digest.update(pd.util.hash_pandas_object(sentence_df.loc[:, ['text', 'class']], index=True).values.tobytes())
+    return digest.hexdigest(), fasttext_settings, fasttext_epochs, fasttext_dim, fasttext_bucket
+
+
 def _get_train_test_scores(train_df, test_df, fasttext_function, fasttext_epochs, fasttext_dim, fasttext_bucket,
-                           match_distance_function, constant_scoring):
+                           match_distance_function, constant_scoring, sentence_score_cache=None,
+                           sentence_score_settings=None):
     train_scores = pd.Series([0] * len(train_df), index=train_df.index)
     test_scores = pd.Series([0] * len(test_df), index=test_df.index)
     sentence_rows_train = np.logical_and(train_df.loc[:, 'sentence'] != -1,
@@ -379,10 +1414,20 @@ def _get_train_test_scores(train_df, test_df, fasttext_function, fasttext_epochs
             sentence_train_scores = constant_distance(sentence_train_df)
             sentence_test_scores = constant_distance(sentence_test_df)
         else:
-            _, sentence_train_scores, _, sentence_test_scores = fasttext_function(sentence_train_df, sentence_test_df,
-                                                                                  epochs=fasttext_epochs,
-                                                                                  dim=fasttext_dim,
-                                                                                  bucket=fasttext_bucket)
+            score_key = get_sentence_score_key(sentence_train_df, sentence_test_df, fasttext_epochs, fasttext_dim,
+                                               fasttext_bucket, sentence_score_settings) \
+                if sentence_score_cache is not None else None
+            if score_key is not None and score_key in sentence_score_cache:
+                sentence_train_scores, sentence_test_scores = sentence_score_cache[score_key]
+            else:
+                _, sentence_train_scores, _, sentence_test_scores = fasttext_function(sentence_train_df,
+                                                                                      sentence_test_df,
+                                                                                      epochs=fasttext_epochs,
+                                                                                      dim=fasttext_dim,
+                                                                                      bucket=fasttext_bucket)
+                if score_key is not None:
+                    sentence_score_cache[score_key] = (np.asarray(sentence_train_scores, dtype=np.float64),
+                                                       np.asarray(sentence_test_scores, dtype=np.float64))
     else:
         sentence_train_scores = [0.0] * len(sentence_train_df)
         sentence_test_scores = [0.0] * len(sentence_train_df)
@@ -421,11 +1466,11 @@ def _get_train_test_scores(train_df, test_df, fasttext_function, fasttext_epochs
 
 def cv_independent_associations(data_df,
                                 param_dict,
-                                fasttext_function=lambda train, valid, epochs, dim, bucket:
-                                fasttext_fit_predict_default(train, valid, epochs=epochs, dim=dim, bucket=bucket),
+                                fasttext_function=None,
                                 fasttext_epochs=50,
                                 fasttext_dim=20,
                                 fasttext_bucket=1000,
+                                fasttext_thread=1,
                                 match_distance_function=reciprocal_distance,
                                 constant_scoring=None,
                                 cv_folds=5,
@@ -433,6 +1478,9 @@ def cv_independent_associations(data_df,
                                 random_state=None,
                                 warn_missing_scores=True,
                                 metric='roc_auc_score',
+                                n_jobs=1,
+                                sentence_score_cache=None,
+                                sentence_score_settings=None,
                                 ):
     """
     A wrapper around `cv_independent_associations()` in `ml/cv.py` that computes co-occurrences scores for each
@@ -445,12 +1493,16 @@ def cv_independent_associations(data_df,
            Takes three arguments: training dataset as pandas DataFrame; validation dataset as pandas DataFrame;
            number of fasttext epochs to perform.
            Returns: predicted scores for each instance.
+           If None (default), fastText is trained by ml.fasttext_helpers.fasttext_fit_predict_default() with
+           fasttext_thread threads.
     :param fasttext_epochs: int, number of fasttext epochs to perform. This is primarily used for testing and should
     not be changed in production.
     :param fasttext_dim: int, fasttext vector dimensionality. This is primarily used for testing and should
     not be changed in production.
     :param fasttext_bucket: int, number of fasttext buckets. This is primarily used for testing and should
     not be changed in production.
+    :param fasttext_thread: int, the number of threads each fastText run uses. It is passed to the default
+    fasttext_function and limits the number of concurrent folds, see n_jobs.
     :param match_distance_function: function to score match distances. Takes a pandas DataFrame loaded using
     tools.data_tools.load_data_frame(..., match_distance=True). Returns a pandas Series of distance scores.
     :param constant_scoring: str - either 'sentence', 'paragraph' or 'document'. Indicates whether a constant scoring
@@ -463,12 +1515,37 @@ def cv_independent_associations(data_df,
     :param warn_missing_scores: boolean: if warnings should be issues during AUROC computation
     :param metric: performance metric used for evaluation - can be either 'roc_auc_score' (the default) or
     'average_precision_score'
+    :param n_jobs: int, the number of CPUs to use. Folds run concurrently in up to n_jobs // fasttext_thread threads
+    (n_jobs being capped at the number of CPUs of the machine), each running fasttext_function with fasttext_thread
+    fastText threads, see cv.get_fold_workers(). fasttext_function must therefore be thread-safe if n_jobs > 1.
+    Results are identical to a serial run.
+    :param sentence_score_cache: dict (or any other mutable mapping) to memoize fastText sentence scores in. Sentence
+    scores only depend on the rows of a fold and the fastText settings but not on param_dict, so passing the same cache
+    to the calls of a hyperparameter search with fixed random seed (see ml.cv.random_cv()) trains fastText only once
+    per fold. Keys are computed by get_sentence_score_key() from the training and test rows, fasttext_epochs,
+    fasttext_dim, fasttext_bucket and sentence_score_settings. Worker processes of random_cv(..., n_jobs > 1) fill
+    separate copies of a dict, whereas a multiprocessing.Manager().dict() is shared between them.
+    :param sentence_score_settings: hashable identifier of fasttext_function and all settings it uses besides
+    fasttext_epochs, fasttext_dim and fasttext_bucket, e.g. ('fasttext', lr, word_ngrams, pretrained_vectors_path).
+    It is part of the keys of sentence_score_cache so that scores of different classifiers are never mixed up and must
+    be given along with sentence_score_cache if a fasttext_function is given.
     :return: a pandas DataFrame with cross validation results
     """
+    if sentence_score_cache is not None and sentence_score_settings is None:
+        if fasttext_function is not None:
+            raise ValueError('sentence_score_settings must identify fasttext_function if sentence_score_cache is '
+                             'given.')
+        sentence_score_settings = 'fasttext_fit_predict_default'
+
     cv_sets = list(cv.cv_independent_associations(data_df, cv_folds=cv_folds, random_state=random_state,
                                                   entity_columns=entity_columns))
     cv_stats_df = cv.compute_cv_fold_stats(data_df, cv_sets)
 
+    if fasttext_function is None:
+        def fasttext_function(train, valid, epochs, dim, bucket):
+            return fasttext_fit_predict_default(train, valid, epochs=epochs, dim=dim, bucket=bucket,
+                                                thread=fasttext_thread)
+
     param_dict = copy.deepcopy(param_dict)
     if 'decay_rate' in param_dict or 'distance_offset' in param_dict:
         decay_rate = param_dict['decay_rate']
@@ -482,62 +1559,50 @@ def cv_independent_associations(data_df,
     else:
         new_match_distance_function = match_distance_function
 
-    train_performances = []
-    test_performances = []
-    for cv_iter, train_test_indices in enumerate(cv_sets):
+    def evaluate_fold(train_test_indices):
         train_indices, test_indices = train_test_indices
 
         train_df = data_df.iloc[train_indices, :].copy()
         test_df = data_df.iloc[test_indices, :].copy()
 
-        score_file_path = 'cv_cos_' + str(cv_iter) + '.tsv.gz'
-        try:
-            train_scores, test_scores = _get_train_test_scores(train_df, test_df, fasttext_function, fasttext_epochs,
-                                                               fasttext_dim, fasttext_bucket,
-                                                               new_match_distance_function,
-                                                               constant_scoring)
-            train_df['predicted'] = train_scores
-            test_df['predicted'] = test_scores
-
-            # write combined score file for sentences/documents/paragraphs and evaluate training and validation AUROC
-            cv_df = pd.concat([train_df, test_df], axis=0)
-            with gzip.open(score_file_path, 'wt') as test_out:
-                cv_df.to_csv(test_out, sep='\t', header=False, index=False,
-                             columns=['pmid', 'paragraph', 'sentence', 'entity1', 'entity2', 'predicted'])
-
-            score_dict = co_occurrence_score(matches_file_path=None,
-                                             score_file_path=score_file_path,
-                                             entities_file=None,
-                                             first_type=0,
-                                             second_type=0,
-                                             ignore_scores=False,
-                                             silent=True,
-                                             **param_dict,
-                                             )
-
-            train_performance = _compute_metric(score_dict, train_df, warn=warn_missing_scores, metric=metric)
-            test_performance = _compute_metric(score_dict, test_df, warn=warn_missing_scores, metric=metric)
-            train_performances.append(train_performance)
-            test_performances.append(test_performance)
-        except IOError:
-            # return missing results if fasttext failed for at least one CV fold
-            results_df = pd.DataFrame()
-            results_df['mean_test_score'] = [np.nan]
-            results_df['stdev_test_score'] = [np.nan]
-            results_df['mean_train_score'] = [np.nan]
-            results_df['stdev_train_score'] = [np.nan]
-            for stats_row in cv_stats_df.itertuples():
-                cv_fold = str(stats_row.fold)
-                results_df['split_' + cv_fold + '_test_score'] = [np.nan]
-                results_df['split_' + cv_fold + '_train_score'] = [np.nan]
-                results_df['split_' + cv_fold + '_n_test'] = [np.nan]
-                results_df['split_' + cv_fold + '_pos_test'] = [np.nan]
-                results_df['split_' + cv_fold + '_n_train'] = [np.nan]
-                results_df['split_' + cv_fold + '_pos_train'] = [np.nan]
-            return results_df
-        finally:
-            if os.path.isfile(score_file_path):
-                os.remove(score_file_path)
+        train_scores, test_scores = _get_train_test_scores(train_df, test_df, fasttext_function, fasttext_epochs,
+                                                           fasttext_dim, fasttext_bucket,
+                                                           new_match_distance_function,
+                                                           constant_scoring,
+                                                           sentence_score_cache=sentence_score_cache,
+                                                           sentence_score_settings=sentence_score_settings)
+        train_df['predicted'] = train_scores
+        test_df['predicted'] = test_scores
+
+        # score sentences/documents/paragraphs of both sets and evaluate training and validation AUROC
+        cv_df = pd.concat([train_df, test_df], axis=0)
+        score_dict = co_occurrence_score_data_frame(cv_df, ignore_scores=False, **param_dict)
+
+        train_performance = _compute_metric(score_dict, train_df, warn=warn_missing_scores, metric=metric)
+        test_performance = _compute_metric(score_dict, test_df, warn=warn_missing_scores, metric=metric)
+        return train_performance, test_performance
+
+    try:
+        fold_performances = cv.run_cv_folds(evaluate_fold, cv_sets,
+                                            max_workers=cv.get_fold_workers(n_jobs, fasttext_thread))
+    except IOError:
+        # return missing results if fasttext failed for at least one CV fold
+        results_df = pd.DataFrame()
+        results_df['mean_test_score'] = [np.nan]
+        results_df['stdev_test_score'] = [np.nan]
+        results_df['mean_train_score'] = [np.nan]
+        results_df['stdev_train_score'] = [np.nan]
+        for stats_row in cv_stats_df.itertuples():
+            cv_fold = str(stats_row.fold)
+            results_df['split_' + cv_fold + '_test_score'] = [np.nan]
+            results_df['split_' + cv_fold + '_train_score'] = [np.nan]
+            results_df['split_' + cv_fold + '_n_test'] = [np.nan]
+            results_df['split_' + cv_fold + '_pos_test'] = [np.nan]
+            results_df['split_' + cv_fold + '_n_train'] = [np.nan]
+            results_df['split_' + cv_fold + '_pos_train'] = [np.nan]
+        return results_df
+    train_performances = [train_performance for train_performance, _ in fold_performances]
+    test_performances = [test_performance for _, test_performance in fold_performances]
 
     # aggregate performance measures and fold statistics in result DataFrame
     results_df = pd.DataFrame()
@@ -0,0 +1,202 @@
+"""
+Approximate co-occurrence scoring with a fixed memory budget.
+
+Weighted pair counts are kept in a count-min sketch instead of a dictionary, and a heavy-hitters set tracks the pairs
+with the largest estimated counts. Entity counts and the total count remain exact. Count-min estimates never
+underestimate: with probability at least 1 - exp(-depth), the estimate of a pair exceeds its true count by at most
+e / width * total count. Since the co-occurrence score is increasing in the pair count for fixed entity counts, this
+yields lower and upper bounds for the score of each reported pair.
+"""
+import math
+
+import numpy as np
+
+from .co_occurrence_score import iterate_weighted_count_updates, load_score_file, split_scores
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+_heavy_hitter_bytes = 16  # int64 key and float64 estimate per heavy hitter
+
+
+class CountMinPairSketch(object):
+    """
+    Count-min sketch of weighted pair counts with exact entity and total counts and a heavy-hitters set.
+    """
+
+    def __init__(self, memory_budget_bytes, heavy_hitter_count=10000, depth=5, batch_size=65536, seed=0):
+        """
+        :param memory_budget_bytes: int, the number of bytes available for the sketch and the heavy hitters. Entity
+        counts are exact and not part of the budget.
+        :param heavy_hitter_count: int, the number of pairs with the largest estimated counts to keep track of
+        :param depth: int, the number of hash functions of the sketch. Error bounds hold with probability
+        1 - exp(-depth).
+        :param batch_size: int, the number of updates to buffer before adding them to the sketch
+        :param seed: int, seed of the hash functions
+        """
+        width = (memory_budget_bytes - _heavy_hitter_bytes * heavy_hitter_count) // (8 * depth)
+        if depth < 1 or width < 1:
+            raise ValueError('Memory budget of {} bytes is too small for a sketch of depth {} and {} heavy hitters.'
+                             .format(memory_budget_bytes, depth, heavy_hitter_count))
+        self.depth = depth
+        self.width = int(width)
+        self.heavy_hitter_count = heavy_hitter_count
+        self._table = np.zeros((depth, self.width), dtype=np.float64)
+        random_state = np.random.RandomState(seed)
+        # odd multipliers for multiply-shift hashing of 64-bit keys
+        self._multipliers = random_state.randint(1, 2 ** 62, size=depth, dtype=np.int64).astype(np.uint64) * \
+            np.uint64(2) + np.uint64(1)
+        self._offsets = random_state.randint(0, 2 ** 62, size=depth, dtype=np.int64).astype(np.uint64)
+        self._heavy_keys = np.zeros(0, dtype=np.int64)
+        self._entity_ids = {}
+        self._entities = []
+        self._entity_counts = np.zeros(64, dtype=np.float64)
+        self._total_count = 0.0
+        self._batch_size = batch_size
+        self._buffer_entity_1, self._buffer_entity_2, self._buffer_updates = [], [], []
+
+    def _get_entity_id(self, entity):
+        entity_id = self._entity_ids.get(entity)
+        if entity_id is None:
+            entity_id = len(self._entities)
+            self._entity_ids[entity] = entity_id
+            self._entities.append(entity)
+        return entity_id
+
+    def add(self, entity_1, entity_2, update):
+        """
+        Adds a non-negative update to the count of the pair (entity_1, entity_2), to the counts of both entities and
+        to the total.
+
+        :param entity_1: str, name of the first entity
+        :param entity_2: str, name of the second entity
+        :param update: float, the weighted count update
+        """
+        self._buffer_entity_1.append(self._get_entity_id(entity_1))
+        self._buffer_entity_2.append(self._get_entity_id(entity_2))
+        self._buffer_updates.append(update)
+        if len(self._buffer_updates) >= self._batch_size:
+            self.flush()
+
+    def _get_buckets(self, keys, row):
+        hashes = keys.astype(np.uint64) * self._multipliers[row] + self._offsets[row]
+        return ((hashes >> np.uint64(32)) % np.uint64(self.width)).astype(np.int64)
+
+    def _estimate_keys(self, keys):
+        estimates = self._table[0, self._get_buckets(keys, 0)]
+        for row in range(1, self.depth):
+            estimates = np.minimum(estimates, self._table[row, self._get_buckets(keys, row)])
+        return estimates
+
+    def flush(self):
+        """
+        Adds all buffered updates to the sketch and updates the heavy hitters.
+        """
+        if len(self._buffer_updates) == 0:
+            return
+        entity_1 = np.array(self._buffer_entity_1, dtype=np.int64)
+        entity_2 = np.array(self._buffer_entity_2, dtype=np.int64)
+        updates = np.array(self._buffer_updates, dtype=np.float64)
+        self._buffer_entity_1, self._buffer_entity_2, self._buffer_updates = [], [], []
+        if (updates < 0).any():
+            raise ValueError('Count-min sketches only support non-negative updates.')
+
+        if len(self._entities) > len(self._entity_counts):
+            entity_counts = np.zeros(max(len(self._entities), 2 * len(self._entity_counts)), dtype=np.float64)
+            entity_counts[:len(self._entity_counts)] = self._entity_counts
+            self._entity_counts = entity_counts
+        np.add.at(self._entity_counts, np.column_stack((entity_1, entity_2)).ravel(), np.repeat(updates, 2))
+        self._total_count += float(updates.sum())
+
+        unique_keys, inverse = np.unique((entity_1 << 32) | entity_2, return_inverse=True)
+        key_updates = np.bincount(inverse, weights=updates, minlength=len(unique_keys))
+        for row in range(self.depth):
+            np.add.at(self._table[row], self._get_buckets(unique_keys, row), key_updates)
+
+        # candidates are the current heavy hitters and all pairs updated in this batch
+        candidates = np.union1d(self._heavy_keys, unique_keys)
+        if len(candidates) > self.heavy_hitter_count:
+            estimates = self._estimate_keys(candidates)
+            top = np.argpartition(-estimates, self.heavy_hitter_count - 1)[:self.heavy_hitter_count]
+            candidates = np.sort(candidates[top])
+        self._heavy_keys = candidates
+
+    def memory_bytes(self):
+        """
+        :return: int, the number of bytes used by the sketch and the heavy hitters, excluding exact entity counts
+        """
+        return self._table.nbytes + _heavy_hitter_bytes * self.heavy_hitter_count
+
+    @property
+    def total_count(self):
+        self.flush()
+        return self._total_count
+
+    @property
+    def error_bound(self):
+        """
+        :return: float, the maximum overestimation of any pair count with probability at least 1 - exp(-depth)
+        """
+        return math.e / self.width * self.total_count
+
+    def get_heavy_hitters(self):
+        """
+        :return: dict mapping the heavy-hitter entity pairs to their estimated counts
+        """
+        self.flush()
+        entities = np.array(self._entities, dtype=object)
+        return dict(zip(zip(entities[self._heavy_keys >> 32].tolist(),
+                            entities[self._heavy_keys & 0xFFFFFFFF].tolist()),
+                        self._estimate_keys(self._heavy_keys).tolist()))
+
+    def get_scores(self, weighting_exponent):
+        """
+        Computes approximate co-occurrence scores of the heavy hitters.
+
+        :param weighting_exponent: exponent weight in the co-occurrence score
+        :return: dict mapping the heavy-hitter entity pairs to (score, lower_bound, upper_bound) tuples. The score is
+        computed from the estimated pair count. The bounds hold with probability at least 1 - exp(-depth).
+        """
+        self.flush()
+        keys = self._heavy_keys
+        estimates = self._estimate_keys(keys)
+        entity_1_counts = self._entity_counts[keys >> 32]
+        entity_2_counts = self._entity_counts[keys & 0xFFFFFFFF]
+        # the true count lies in [estimate - error_bound, estimate] and cannot exceed the count of either entity
+        lower_counts = np.maximum(estimates - self.error_bound, 0.0)
+        upper_counts = np.minimum(estimates, np.minimum(entity_1_counts, entity_2_counts))
+
+        def score(counts):
+            return (counts ** weighting_exponent) * \
+                (((counts * self._total_count) / (entity_1_counts * entity_2_counts)) ** (1 - weighting_exponent))
+
+        entities = np.array(self._entities, dtype=object)
+        return dict(zip(zip(entities[keys >> 32].tolist(), entities[keys & 0xFFFFFFFF].tolist()),
+                        zip(score(estimates).tolist(), score(lower_counts).tolist(), score(upper_counts).tolist())))
+
+
+def co_occurrence_score_sketch(matches_file_path, score_file_path, entities_file, first_type, second_type,
+                               memory_budget_bytes, heavy_hitter_count=10000, depth=5,
+                               document_weight=15.0, paragraph_weight=0.0, sentence_weight=1.0,
+                               weighting_exponent=0.6, ignore_scores=False, silent=False, matches_chunk_size=None):
+    """
+    Approximate counterpart of co_occurrence_score.co_occurrence_score() that keeps weighted pair counts in a
+    CountMinPairSketch of fixed size. See co_occurrence_score() for a description of the remaining parameters.
+
+    :param memory_budget_bytes: int, the number of bytes available for pair counts, see CountMinPairSketch
+    :param heavy_hitter_count: int, the number of pairs with the largest estimated counts to return scores for
+    :param depth: int, the number of hash functions of the sketch
+    :return: dict mapping the heavy-hitter entity pairs to (score, lower_bound, upper_bound) tuples
+    """
+    if matches_file_path is None and score_file_path is None:
+        raise ValueError('matches_file_path or score_file_path must be specified.')
+    sketch = CountMinPairSketch(memory_budget_bytes, heavy_hitter_count=heavy_hitter_count, depth=depth)
+    if score_file_path is not None:
+        sentence_scores, paragraph_scores, document_scores = split_scores(load_score_file(score_file_path))
+    else:
+        sentence_scores, paragraph_scores, document_scores = None, None, None
+    for _, entity_1, entity_2, update in iterate_weighted_count_updates(
+            matches_file_path, sentence_scores, paragraph_scores, document_scores, entities_file, first_type,
+            second_type, document_weight, paragraph_weight, sentence_weight, ignore_scores=ignore_scores,
+            silent=silent, matches_chunk_size=matches_chunk_size):
+        sketch.add(entity_1, entity_2, update)
+    return sketch.get_scores(weighting_exponent)
@@ -0,0 +1,151 @@
+"""
+Streaming writer for co-occurrence scores.
+
+Scores are consumed as an iterable of (entity_1, entity_2, score) tuples and written in chunks of bounded size, so that
+the output does not need to be held in memory a second time. If the output is to be sorted, sorted runs of at most
+one chunk are written to temporary files and merged afterwards (external merge sort).
+
+Tab-separated output without header is written unless the file name ends in .parquet. Tab-separated files ending in
+.gz are gzip-compressed and those ending in .zst are zstd-compressed, which requires the zstandard package. Parquet
+output requires pyarrow.
+"""
+import gzip
+import heapq
+import io
+import itertools
+import os
+import tempfile
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+# sort keys of (entity_1, entity_2, score) rows
+_sort_keys = {
+    'pair': lambda row: (row[0], row[1]),  # by entity pair
+    'score': lambda row: (-row[2], row[0], row[1]),  # by decreasing score
+    'entity': lambda row: (row[0], -row[2], row[1]),  # by first entity of each pair, then by decreasing score
+}
+
+
+class _TsvWriter(object):
+    def __init__(self, file_path):
+        if file_path.endswith('.zst'):
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError('Writing zstd-compressed files requires the zstandard package.')
+            self._raw_file = open(file_path, 'wb')
+            self._file = io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(self._raw_file), encoding='utf-8')
+        elif file_path.endswith('.gz'):
+            self._raw_file = None
+            self._file = gzip.open(file_path, 'wt', encoding='utf-8')
+        else:
+            self._raw_file = None
+            self._file = open(file_path, 'wt', encoding='utf-8')
+
+    def write(self, rows):
+        self._file.writelines('{}\t{}\t{!r}\n'.format(*row) for row in rows)
+
+    def close(self):
+        self._file.close()
+        if self._raw_file is not None and not self._raw_file.closed:
+            self._raw_file.close()
+
+
+class _ParquetWriter(object):
+    def __init__(self, file_path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Writing Parquet files requires the pyarrow package.')
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([('entity_1', pyarrow.string()), ('entity_2', pyarrow.string()),
+                                       ('score', pyarrow.float64())])
+        self._writer = pyarrow.parquet.ParquetWriter(file_path, self._schema)
+
+    def write(self, rows):
+        if len(rows) == 0:
+            return
+        entity_1, entity_2, score = zip(*rows)
+        self._writer.write_table(self._pyarrow.Table.from_arrays(
+            [self._pyarrow.array(entity_1, type=self._pyarrow.string()),
+             self._pyarrow.array(entity_2, type=self._pyarrow.string()),
+             self._pyarrow.array(score, type=self._pyarrow.float64())], schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _get_writer(file_path):
+    if file_path.endswith('.parquet'):
+        return _ParquetWriter(file_path)
+    return _TsvWriter(file_path)
+
+
+def _iterate_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def _read_run(run_path):
+    with open(run_path, 'rt', encoding='utf-8') as run_file:
+        for line in run_file:
+            entity_1, entity_2, score = line.rstrip('\n').split('\t')
+            yield entity_1, entity_2, float(score)
+
+
+def write_co_occurrence_scores(scores, file_path, score_threshold=None, sort=None, chunk_size=1000000,
+                               temp_dir=None):
+    """
+    Writes co-occurrence scores to a file, holding at most chunk_size rows in memory at a time.
+
+    :param scores: iterable of (entity_1, entity_2, score) tuples or a dictionary mapping entity pairs to scores
+    :param file_path: path of the file to write; see the module docstring for supported formats
+    :param score_threshold: float, if given, only pairs with a score >= score_threshold are written
+    :param sort: None to write pairs in the order they are given, 'pair' to sort by entity pair, 'score' to sort by
+    decreasing score or 'entity' to sort by the first entity of each pair and then by decreasing score. Each pair is
+    written once, in the orientation it is given in; co_occurrence_score.co_occurrence_score() orders the entities
+    of a pair by name. Hence, with 'entity', the rows having an entity as first entity are contiguous, but its
+    partners with smaller names are found in the groups of those partners.
+    :param chunk_size: int, the maximum number of rows to hold in memory
+    :param temp_dir: directory for temporary files used for sorting. If None, the system default is used.
+    :return: int, the number of pairs written
+    """
+    if sort is not None and sort not in _sort_keys:
+        raise ValueError('Unknown sort order: {}'.format(sort))
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be positive.')
+    if isinstance(scores, dict):
+        scores = ((entity_1, entity_2, score) for (entity_1, entity_2), score in scores.items())
+    if score_threshold is not None:
+        scores = (row for row in scores if row[2] >= score_threshold)
+
+    row_count = 0
+    writer = _get_writer(file_path)
+    try:
+        if sort is None:
+            for chunk in _iterate_chunks(scores, chunk_size):
+                writer.write(chunk)
+                row_count += len(chunk)
+        else:
+            sort_key = _sort_keys[sort]
+            with tempfile.TemporaryDirectory(dir=temp_dir) as run_dir:
+                run_paths = []
+                for chunk in _iterate_chunks(scores, chunk_size):
+                    chunk.sort(key=sort_key)
+                    run_path = os.path.join(run_dir, 'run_{}.tsv'.format(len(run_paths)))
+                    run_writer = _TsvWriter(run_path)
+                    run_writer.write(chunk)
+                    run_writer.close()
+                    run_paths.append(run_path)
+                for chunk in _iterate_chunks(heapq.merge(*(_read_run(run_path) for run_path in run_paths),
+                                                         key=sort_key), chunk_size):
+                    writer.write(chunk)
+                    row_count += len(chunk)
+    finally:
+        writer.close()
+    return row_count
@@ -1,12 +1,27 @@
 #!/usr/bin/env python
 import collections
 import gzip
+import hashlib
+import os
 import re
+import sys
+import tempfile
+
+import numpy as np
 
 __author__ = 'Alexander Junge (alexander.junge@gmail.com)'
 
 _whitespace_hyphen_pattern = re.compile(r'\s+|-')
 
+# Parsed serial mappers are cached in memory per process and, if a cache directory is given as argument or via the
+# environment variable below, on disk. Cache entries are keyed by entity file path, size, modification time, requested
+# taxids and compression so that changed entity files are parsed again. The in-memory cache maps keys to tuples of
+# mapper and its approximate size in bytes.
+_serial_mapper_memo = collections.OrderedDict()
+_serial_mapper_memo_max_bytes = 2 ** 30
+_serial_mapper_cache_dir_variable = 'COCOSCORE_MAPPER_CACHE_DIR'
+_serial_mapper_cache_max_bytes = 2 ** 30
+
 
 def reverse_dict(input_dict):
     return_dict = collections.defaultdict(set)
@@ -30,15 +45,28 @@ def get_file_handle(file_path, compression):
         return open(file_path, 'rt', encoding='utf-8', errors='strict')
 
 
-def get_serial_to_taxid_name_mapper(entity_file, taxids=(9606, -26), compressed=True):
-    """
-    Returns a mapper for serial numbers to their final names.
-    
-    :param entity_file: tab-delimited file with three columns (serial number, taxonomy ID, entity name).
-    :param taxids: list of integers, the taxonomy IDs to use.
-    :param compressed: indicates whether files are gzipped or not
-    :return: dict: int -> (int, str) that maps serial numbers to the corresponding taxonomy ID and entity name.
-    """
+class _ReadOnlyDict(dict):
+    # dict that is shared between callers of get_serial_to_taxid_name_mapper() and therefore must not be changed
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Cached serial mappers are read-only; copy them with dict() to modify them.')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    __ior__ = _read_only
+
+    def __reduce__(self):
+        return _ReadOnlyDict, (dict(self),)
+
+
+def _get_serial_mapper_bytes(serial_to_taxid_name):
+    # approximate memory used by the mapper: hash table, serial number and (taxid, name) tuple of each entry and the
+    # names; taxids are shared between entries
+    entry_bytes = sys.getsizeof(0) + sys.getsizeof((0, ''))
+    return sys.getsizeof(serial_to_taxid_name) + len(serial_to_taxid_name) * entry_bytes + \
+        sum(sys.getsizeof(name) for _, name in serial_to_taxid_name.values())
+
+
+def _parse_serial_to_taxid_name_mapper(entity_file, taxids, compressed):
     serial_to_taxid_name = {}
     fin = get_file_handle(entity_file, compressed)
     try:
@@ -56,6 +84,122 @@ def get_serial_to_taxid_name_mapper(entity_file, taxids=(9606, -26), compressed=
     return serial_to_taxid_name
 
 
+def _get_serial_mapper_cache_key(entity_file, taxids, compressed):
+    entity_file_stat = os.stat(entity_file)
+    return (os.path.abspath(entity_file), entity_file_stat.st_size, entity_file_stat.st_mtime_ns,
+            tuple(sorted(set(taxids))), bool(compressed))
+
+
+def _get_serial_mapper_cache_path(cache_dir, cache_key):
+    return os.path.join(cache_dir, 'serial_mapper_{}.npz'.format(hashlib.sha1(repr(cache_key).encode('utf-8'))
+                                                                 .hexdigest()))
+
+
+def _save_serial_mapper(serial_to_taxid_name, cache_path):
+    # entity names cannot contain newlines as entity files are line-based, so they are stored newline-joined
+    names = '\n'.join(name for _, name in serial_to_taxid_name.values()).encode('utf-8')
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # write to a temporary file first so that concurrent readers never see partially written cache files
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            np.savez(temp_file, serial=np.fromiter(serial_to_taxid_name.keys(), dtype=np.int64),
+                     taxid=np.array([taxid for taxid, _ in serial_to_taxid_name.values()], dtype=np.int64),
+                     names=np.frombuffer(names, dtype=np.uint8))
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _load_serial_mapper(cache_path):
+    with np.load(cache_path) as cache:
+        serials, taxids = cache['serial'].tolist(), cache['taxid'].tolist()
+        names = cache['names'].tobytes().decode('utf-8').split('\n') if len(serials) > 0 else []
+    return dict(zip(serials, zip(taxids, names)))
+
+
+def _evict_serial_mapper_cache(cache_dir, max_bytes):
+    # least recently used cache files are removed first; cache hits update the modification time
+    cache_files = []
+    for file_name in os.listdir(cache_dir):
+        if file_name.startswith('serial_mapper_') and file_name.endswith('.npz'):
+            file_stat = os.stat(os.path.join(cache_dir, file_name))
+            cache_files.append((file_stat.st_mtime_ns, file_stat.st_size, file_name))
+    total_bytes = sum(size for _, size, _ in cache_files)
+    for _, size, file_name in sorted(cache_files):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass  # removed by a concurrent process
+        total_bytes -= size
+
+
+def clear_serial_mapper_memo():
+    """
+    Empties the in-memory cache of get_serial_to_taxid_name_mapper().
+    """
+    _serial_mapper_memo.clear()
+
+
+def get_serial_to_taxid_name_mapper(entity_file, taxids=(9606, -26), compressed=True, cache_dir=None,
+                                    cache_max_bytes=_serial_mapper_cache_max_bytes,
+                                    memo_max_bytes=_serial_mapper_memo_max_bytes):
+    """
+    Returns a mapper for serial numbers to their final names.
+
+    Parsed mappers are cached in memory up to memo_max_bytes and shared between callers, so the returned dict is
+    read-only. If cache_dir is given or the environment variable COCOSCORE_MAPPER_CACHE_DIR is set, they are also
+    cached on disk in a compact binary format. Cache entries are invalidated when the size or modification time of
+    entity_file changes.
+    
+    :param entity_file: tab-delimited file with three columns (serial number, taxonomy ID, entity name).
+    :param taxids: list of integers, the taxonomy IDs to use.
+    :param compressed: indicates whether files are gzipped or not
+    :param cache_dir: directory to cache parsed mappers in. Defaults to the value of COCOSCORE_MAPPER_CACHE_DIR.
+    :param cache_max_bytes: int, the maximum total size of cached mappers in cache_dir. Least recently used mappers
+    are removed once it is exceeded.
+    :param memo_max_bytes: int, the maximum approximate total size of the mappers cached in memory. Least recently used
+    mappers are dropped once it is exceeded; 0 disables the in-memory cache.
+    :return: read-only dict: int -> (int, str) that maps serial numbers to the corresponding taxonomy ID and entity
+    name.
+    """
+    cache_key = _get_serial_mapper_cache_key(entity_file, taxids, compressed)
+    if cache_key in _serial_mapper_memo:
+        _serial_mapper_memo.move_to_end(cache_key)
+        return _serial_mapper_memo[cache_key][0]
+
+    if cache_dir is None:
+        cache_dir = os.environ.get(_serial_mapper_cache_dir_variable)
+    cache_path = _get_serial_mapper_cache_path(cache_dir, cache_key) if cache_dir else None
+    serial_to_taxid_name = None
+    if cache_path is not None and os.path.isfile(cache_path):
+        try:
+            serial_to_taxid_name = _load_serial_mapper(cache_path)
+            os.utime(cache_path)
+        except (OSError, ValueError, KeyError):
+            serial_to_taxid_name = None  # corrupt or concurrently evicted cache file; parse the entity file instead
+    if serial_to_taxid_name is None:
+        serial_to_taxid_name = _parse_serial_to_taxid_name_mapper(entity_file, taxids, compressed)
+        if cache_path is not None:
+            _save_serial_mapper(serial_to_taxid_name, cache_path)
+            _evict_serial_mapper_cache(cache_dir, cache_max_bytes)
+
+    serial_to_taxid_name = _ReadOnlyDict(serial_to_taxid_name)
+    mapper_bytes = _get_serial_mapper_bytes(serial_to_taxid_name)
+    if mapper_bytes <= memo_max_bytes:
+        _serial_mapper_memo[cache_key] = serial_to_taxid_name, mapper_bytes
+        memo_bytes = sum(size for _, size in _serial_mapper_memo.values())
+        while memo_bytes > memo_max_bytes:
+            _, (_, size) = _serial_mapper_memo.popitem(last=False)
+            memo_bytes -= size
+    return serial_to_taxid_name
+
+
 def get_taxid_name_to_serial_mapper(entity_file, taxids=(9606, -26), compressed=True):
     """
     Returns a mapper for final names to their serials numbers.
@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the scoring pipeline.
+
+Runs co_occurrence_score(), load_score_file(), split_scores() and cv_independent_associations() on synthetic corpora of
+several sizes (see synthetic_data.py) and records wall-clock time and peak memory. Peak memory is measured in a
+separate run with tracemalloc, which only sees memory allocated through Python (including NumPy and pandas) and would
+otherwise slow down the timed runs. Results are saved as JSON along with the git commit and library versions, so that
+runs on different commits can be compared with compare_benchmarks().
+
+Usage:
+    python -m cocoscore.tools.benchmark --sizes 1000 10000 --output benchmark.json [--baseline previous.json]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .data_tools import load_data_frame
+from .synthetic_data import generate_corpus
+from ..tagger import co_occurrence_score
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+_first_type = 9606
+_second_type = -26
+_cv_param_dict = {'document_weight': 15.0, 'paragraph_weight': 0.0, 'sentence_weight': 1.0,
+                  'weighting_exponent': 0.6}
+
+
+def _co_occurrence_score_matches(paths):
+    return lambda: co_occurrence_score.co_occurrence_score(paths['matches_file'], None, paths['entities_file'],
+                                                           _first_type, _second_type, silent=True,
+                                                           matches_chunk_size=1000000)
+
+
+def _co_occurrence_score_matches_scores(paths):
+    return lambda: co_occurrence_score.co_occurrence_score(paths['matches_file'], paths['score_file'],
+                                                           paths['entities_file'], _first_type, _second_type,
+                                                           silent=True, matches_chunk_size=1000000)
+
+
+def _co_occurrence_score_scores(paths):
+    return lambda: co_occurrence_score.co_occurrence_score(None, paths['score_file'], None, 0, 0, silent=True)
+
+
+def _load_score_file(paths):
+    return lambda: co_occurrence_score.load_score_file(paths['score_file'])
+
+
+def _split_scores(paths):
+    scores = co_occurrence_score.load_score_file(paths['score_file'])
+    return lambda: co_occurrence_score.split_scores(scores)
+
+
+def _cv_independent_associations(paths):
+    data_df = load_data_frame(paths['dataset_file'], match_distance=True)
+    # constant sentence scores keep fastText training out of the measurement
+    return lambda: co_occurrence_score.cv_independent_associations(data_df, _cv_param_dict,
+                                                                   constant_scoring='sentence', cv_folds=3,
+                                                                   random_state=np.random.RandomState(0),
+                                                                   warn_missing_scores=False)
+
+
+# benchmark name -> function that takes the paths of a synthetic corpus, does any setup that is not to be measured and
+# returns the function to measure
+benchmarks = {
+    'co_occurrence_score_matches': _co_occurrence_score_matches,
+    'co_occurrence_score_matches_scores': _co_occurrence_score_matches_scores,
+    'co_occurrence_score_scores': _co_occurrence_score_scores,
+    'load_score_file': _load_score_file,
+    'split_scores': _split_scores,
+    'cv_independent_associations': _cv_independent_associations,
+}
+
+
+def get_git_commit():
+    """
+    :return: str, the commit checked out in the repository containing this module or None if it cannot be determined
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata():
+    """
+    :return: dict describing the environment benchmarks are run in
+    """
+    return {'commit': get_git_commit(), 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'pandas': pd.__version__}
+
+
+def measure(function, repeat=3, measure_memory=True):
+    """
+    Measures the run time and peak memory of a function.
+
+    :param function: function without arguments to measure
+    :param repeat: int, the number of timed runs
+    :param measure_memory: boolean, if True, an additional run measures peak memory with tracemalloc
+    :return: dict with keys seconds (the fastest run), seconds_all (all runs) and peak_memory_bytes (None if memory
+    is not measured)
+    """
+    if repeat < 1:
+        raise ValueError('repeat must be positive.')
+    seconds_all = []
+    for _ in range(repeat):
+        gc.collect()
+        start_time = time.perf_counter()
+        function()
+        seconds_all.append(time.perf_counter() - start_time)
+    peak_memory_bytes = None
+    if measure_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'seconds': min(seconds_all), 'seconds_all': seconds_all, 'peak_memory_bytes': peak_memory_bytes}
+
+
+def run_benchmarks(sizes=(1000, 10000), benchmark_names=None, repeat=3, measure_memory=True,
+                   output_path=None, corpus_dir=None, random_seed=0, silent=False, **corpus_kwargs):
+    """
+    Runs benchmarks on synthetic corpora of several sizes.
+
+    :param sizes: iterable of int, the numbers of documents of the corpora to benchmark
+    :param benchmark_names: iterable of str, the names of the benchmarks to run, see benchmarks. If None, all are run.
+    :param repeat: int, the number of timed runs of each benchmark
+    :param measure_memory: boolean, if True, peak memory is measured in an additional run
+    :param output_path: if given, results are written to this JSON file
+    :param corpus_dir: directory to keep generated corpora in, so that they are reused by later runs. If None, corpora
+    are written to a temporary directory that is removed afterwards.
+    :param random_seed: int, seed used to generate corpora
+    :param silent: If True, no progress is printed
+    :param corpus_kwargs: further keyword arguments to synthetic_data.generate_corpus()
+    :return: dict with keys metadata (see get_metadata()) and results, a list of dicts holding benchmark,
+    document_count and the measurements described in measure()
+    """
+    benchmark_names = list(benchmarks) if benchmark_names is None else list(benchmark_names)
+    unknown_names = set(benchmark_names) - set(benchmarks)
+    if unknown_names:
+        raise ValueError('Unknown benchmarks: {}'.format(', '.join(sorted(unknown_names))))
+    results = {'metadata': get_metadata(), 'results': []}
+    results['metadata']['corpus'] = dict(corpus_kwargs, random_seed=random_seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for document_count in sizes:
+            corpus_path = os.path.join(corpus_dir if corpus_dir is not None else temp_dir,
+                                       'corpus_{:d}_{:d}'.format(document_count, random_seed))
+            # generate_corpus() writes the dataset last
+            if corpus_dir is None or not os.path.isfile(os.path.join(corpus_path, 'dataset.tsv')):
+                paths = generate_corpus(corpus_path, document_count=document_count, random_seed=random_seed,
+                                        **corpus_kwargs)
+            else:
+                paths = {key: os.path.join(corpus_path, file_name)
+                         for key, file_name in (('entities_file', 'entities.tsv.gz'),
+                                                ('matches_file', 'matches.tsv'), ('score_file', 'scores.tsv'),
+                                                ('dataset_file', 'dataset.tsv'))}
+            for name in benchmark_names:
+                result = {'benchmark': name, 'document_count': document_count}
+                result.update(measure(benchmarks[name](paths), repeat=repeat, measure_memory=measure_memory))
+                results['results'].append(result)
+                if not silent:
+                    print('{}\t{:d} documents\t{:.3f} s\t{} bytes'.format(name, document_count, result['seconds'],
+                                                                          result['peak_memory_bytes']))
+    if output_path is not None:
+        with open(output_path, 'wt') as output_file:
+            json.dump(results, output_file, indent=2)
+    return results
+
+
+def load_benchmarks(results_path):
+    """
+    :param results_path: path of a JSON file written by run_benchmarks()
+    :return: dict as returned by run_benchmarks()
+    """
+    with open(results_path, 'rt') as results_file:
+        return json.load(results_file)
+
+
+def compare_benchmarks(baseline, current):
+    """
+    Compares two sets of benchmark results.
+
+    :param baseline: dict as returned by run_benchmarks() or path to a JSON file written by it
+    :param current: dict as returned by run_benchmarks() or path to a JSON file written by it
+    :return: pandas DataFrame with one row per benchmark and corpus size present in both results and columns
+    benchmark, document_count, seconds_baseline, seconds_current, time_ratio, peak_memory_bytes_baseline,
+    peak_memory_bytes_current and memory_ratio. Ratios below 1 indicate an improvement.
+    """
+    data_frames = []
+    for results in (baseline, current):
+        if isinstance(results, str):
+            results = load_benchmarks(results)
+        data_frames.append(pd.DataFrame(results['results'],
+                                        columns=['benchmark', 'document_count', 'seconds', 'peak_memory_bytes']))
+    comparison_df = pd.merge(*data_frames, on=['benchmark', 'document_count'], suffixes=('_baseline', '_current'))
+    comparison_df['time_ratio'] = comparison_df['seconds_current'] / comparison_df['seconds_baseline']
+    comparison_df['memory_ratio'] = comparison_df['peak_memory_bytes_current'].astype(float) / \
+        comparison_df['peak_memory_bytes_baseline'].astype(float)
+    return comparison_df.loc[:, ['benchmark', 'document_count', 'seconds_baseline', 'seconds_current', 'time_ratio',
+                                 'peak_memory_bytes_baseline', 'peak_memory_bytes_current', 'memory_ratio']]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the co-occurrence scoring pipeline on synthetic corpora.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='numbers of documents of the synthetic corpora')
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(benchmarks), default=None,
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--output', default=None, help='JSON file to write results to')
+    parser.add_argument('--baseline', default=None, help='JSON file of earlier results to compare with')
+    parser.add_argument('--corpus-dir', default=None, help='directory to keep generated corpora in for reuse')
+    parser.add_argument('--seed', type=int, default=0, help='random seed used to generate corpora')
+    parsed_args = parser.parse_args(args)
+    results = run_benchmarks(sizes=parsed_args.sizes, benchmark_names=parsed_args.benchmarks,
+                             repeat=parsed_args.repeat, measure_memory=not parsed_args.no_memory,
+                             output_path=parsed_args.output, corpus_dir=parsed_args.corpus_dir,
+                             random_seed=parsed_args.seed)
+    if parsed_args.baseline is not None:
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(compare_benchmarks(parsed_args.baseline, results).to_string(index=False))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,168 @@
+"""
+Generator for synthetic tagger output used to test and benchmark the scoring pipeline.
+
+A synthetic corpus consists of documents that each mention a number of entities of two types. Entities are drawn from
+a Zipfian distribution, so that a few entities are mentioned in many documents as in real corpora. From the same
+documents, the generator writes
+- an entities file and a matches file in the formats written by tagger,
+- a score file with a configurable mix of sentence-, paragraph- and document-level scores and
+- a labelled dataset in the format read by data_tools.load_data_frame(..., match_distance=True).
+"""
+import gzip
+import os
+
+import numpy as np
+
+__author__ = 'Alexander Junge (alexander.junge@gmail.com)'
+
+_words = ('protein', 'gene', 'disease', 'binds', 'regulates', 'expression', 'cell', 'patients', 'mutation',
+          'pathway', 'associated', 'increased', 'levels', 'risk', 'study', 'role')
+
+
+def get_zipf_probabilities(entity_count, zipf_exponent):
+    """
+    :param entity_count: int, the number of entities
+    :param zipf_exponent: float, exponent s of the Zipf distribution; 0 gives a uniform distribution
+    :return: numpy array of probabilities proportional to 1 / rank^s
+    """
+    weights = 1.0 / np.arange(1, entity_count + 1, dtype=np.float64) ** zipf_exponent
+    return weights / weights.sum()
+
+
+def get_entity_names(entity_count):
+    """
+    :param entity_count: int, the number of entities of each of the two types
+    :return: tuple of two lists holding the names of the entities of the first and second type
+    """
+    return ['A{:d}'.format(i) for i in range(entity_count)], ['B{:d}'.format(i) for i in range(entity_count)]
+
+
+def generate_documents(document_count, entity_count=1000, entities_per_document=10, zipf_exponent=1.0,
+                       paragraphs_per_document=5, sentences_per_paragraph=4, random_state=None):
+    """
+    Generates the entity mentions of synthetic documents.
+
+    :param document_count: int, the number of documents
+    :param entity_count: int, the number of entities of each of the two types
+    :param entities_per_document: int, the number of entity draws per document, half of them of each type. Entities
+    drawn twice are mentioned once.
+    :param zipf_exponent: float, exponent of the Zipf distribution entities are drawn from
+    :param paragraphs_per_document: int, the number of paragraphs of each document
+    :param sentences_per_paragraph: int, the number of sentences of each paragraph
+    :param random_state: numpy RandomState
+    :return: generator of (pmid, first_entities, second_entities, mentions) tuples. first_entities and second_entities
+    are sorted arrays of entity indices, mentions is a list of (paragraph, sentence, type_index, entity) tuples sorted
+    by position with type_index 0 for the first and 1 for the second type.
+    """
+    if random_state is None:
+        random_state = np.random.RandomState()
+    probabilities = get_zipf_probabilities(entity_count, zipf_exponent)
+    first_draws = max(entities_per_document // 2, 1)
+    second_draws = max(entities_per_document - first_draws, 1)
+    for pmid in range(1, document_count + 1):
+        first_entities = np.unique(random_state.choice(entity_count, size=first_draws, p=probabilities))
+        second_entities = np.unique(random_state.choice(entity_count, size=second_draws, p=probabilities))
+        mentions = []
+        for type_index, entities in enumerate((first_entities, second_entities)):
+            mention_counts = random_state.randint(1, 4, size=len(entities))
+            mention_entities = np.repeat(entities, mention_counts)
+            paragraphs = random_state.randint(1, paragraphs_per_document + 1, size=len(mention_entities))
+            sentences = random_state.randint(1, sentences_per_paragraph + 1, size=len(mention_entities))
+            mentions.extend(zip(paragraphs.tolist(), sentences.tolist(), [type_index] * len(mention_entities),
+                                mention_entities.tolist()))
+        mentions.sort()
+        yield pmid, first_entities, second_entities, mentions
+
+
+def generate_corpus(output_dir, document_count=1000, entity_count=1000, entities_per_document=10, zipf_exponent=1.0,
+                    paragraphs_per_document=5, sentences_per_paragraph=4, level_mix=(0.6, 0.3, 0.1),
+                    positive_fraction=0.3, first_type=9606, second_type=-26, random_seed=None):
+    """
+    Writes a synthetic corpus to output_dir.
+
+    Every pair of a first-type and a second-type entity mentioned in the same document receives scores at one level
+    drawn according to level_mix: one to three sentence-level scores, one or two paragraph-level scores or one
+    document-level score. The same rows make up the labelled dataset, in which a random positive_fraction of all
+    entity pairs belongs to the positive class.
+
+    :param output_dir: directory to write the files to; created if it does not exist
+    :param document_count: int, the number of documents
+    :param entity_count: int, the number of entities of each of the two types
+    :param entities_per_document: int, see generate_documents()
+    :param zipf_exponent: float, see generate_documents()
+    :param paragraphs_per_document: int, see generate_documents()
+    :param sentences_per_paragraph: int, see generate_documents()
+    :param level_mix: tuple of three floats, the relative frequency of sentence-, paragraph- and document-level scores
+    :param positive_fraction: float, the fraction of entity pairs labelled as positive in the dataset
+    :param first_type: int, type of the first entity class
+    :param second_type: int, type of the second entity class
+    :param random_seed: int, seed for the random number generator
+    :return: dict mapping 'entities_file', 'matches_file', 'score_file' and 'dataset_file' to the paths written
+    """
+    if len(level_mix) != 3 or min(level_mix) < 0 or sum(level_mix) <= 0:
+        raise ValueError('level_mix must hold three non-negative frequencies with a positive sum.')
+    if not 0 <= positive_fraction <= 1:
+        raise ValueError('positive_fraction must be between 0 and 1.')
+    random_state = np.random.RandomState(random_seed)
+    level_probabilities = np.asarray(level_mix, dtype=np.float64) / sum(level_mix)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {'entities_file': os.path.join(output_dir, 'entities.tsv.gz'),
+             'matches_file': os.path.join(output_dir, 'matches.tsv'),
+             'score_file': os.path.join(output_dir, 'scores.tsv'),
+             'dataset_file': os.path.join(output_dir, 'dataset.tsv')}
+
+    first_names, second_names = get_entity_names(entity_count)
+    types = (first_type, second_type)
+    # serials of the first type are 1, ..., entity_count, those of the second type follow
+    with gzip.open(paths['entities_file'], 'wt') as entities_file:
+        for type_index, names in enumerate((first_names, second_names)):
+            for i, name in enumerate(names):
+                entities_file.write('{:d}\t{:d}\t{}\n'.format(type_index * entity_count + i + 1, types[type_index],
+                                                              name))
+
+    positive_pairs = {}
+    with open(paths['matches_file'], 'wt') as matches_file, open(paths['score_file'], 'wt') as score_file, \
+            open(paths['dataset_file'], 'wt') as dataset_file:
+        for pmid, first_entities, second_entities, mentions in generate_documents(
+                document_count, entity_count=entity_count, entities_per_document=entities_per_document,
+                zipf_exponent=zipf_exponent, paragraphs_per_document=paragraphs_per_document,
+                sentences_per_paragraph=sentences_per_paragraph, random_state=random_state):
+            for start, (paragraph, sentence, type_index, entity) in enumerate(mentions):
+                name = (first_names, second_names)[type_index][entity]
+                matches_file.write('{:d}\t{:d}\t{:d}\t{:d}\t{:d}\t{}\t{:d}\t{:d}\n'.format(
+                    pmid, paragraph, sentence, 10 * start, 10 * start + len(name) - 1, name, types[type_index],
+                    type_index * entity_count + entity + 1))
+
+            first_pair_entities = np.repeat(first_entities, len(second_entities)).tolist()
+            second_pair_entities = np.tile(second_entities, len(first_entities)).tolist()
+            pair_labels = []
+            for first_entity, second_entity in zip(first_pair_entities, second_pair_entities):
+                entity_pair = (first_names[first_entity], second_names[second_entity])
+                if entity_pair not in positive_pairs:
+                    positive_pairs[entity_pair] = int(random_state.random_sample() < positive_fraction)
+                pair_labels.append(positive_pairs[entity_pair])
+
+            pair_count = len(pair_labels)
+            levels = random_state.choice(3, size=pair_count, p=level_probabilities)
+            row_counts = np.where(levels == 0, random_state.randint(1, 4, size=pair_count),
+                                  np.where(levels == 1, random_state.randint(1, 3, size=pair_count), 1))
+            row_pairs = np.repeat(np.arange(pair_count), row_counts)
+            row_levels = levels[row_pairs]
+            row_count = len(row_pairs)
+            paragraphs = np.where(row_levels < 2, random_state.randint(1, paragraphs_per_document + 1,
+                                                                       size=row_count), -1)
+            sentences = np.where(row_levels < 1, random_state.randint(1, sentences_per_paragraph + 1,
+                                                                      size=row_count), -1)
+            scores = random_state.random_sample(row_count)
+            distances = np.where(row_levels > 0, random_state.randint(1, 100, size=row_count), -1)
+            words = random_state.randint(len(_words), size=(row_count, 8))
+            for pair, paragraph, sentence, score, distance, row_words in zip(
+                    row_pairs.tolist(), paragraphs.tolist(), sentences.tolist(), scores.tolist(),
+                    distances.tolist(), words.tolist()):
+                entity_1, entity_2 = first_names[first_pair_entities[pair]], second_names[second_pair_entities[pair]]
+                score_file.write('{:d}\t{:d}\t{:d}\t{}\t{}\t{!r}\n'.format(pmid, paragraph, sentence, entity_1,
+                                                                         entity_2, score))
+                dataset_file.write('{:d}\t{:d}\t{:d}\t{}\t{}\t{}\t{:d}\t{:d}\n'.format(
+                    pmid, paragraph, sentence, entity_1, entity_2, ' '.join(_words[word] for word in row_words),
+                    pair_labels[pair], distance))
+    return paths
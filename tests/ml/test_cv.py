@@ -1,7 +1,10 @@
+import threading
+import time
 import numpy as np
 import pandas
 from pandas.util.testing import assert_frame_equal
 import unittest
+from unittest import mock
 
 import cocoscore.ml.cv as cv
 import cocoscore.ml.fasttext_helpers as fth
@@ -92,6 +95,40 @@ class CVTest(unittest.TestCase):
         observed_df = cv.compute_cv_fold_stats(self.testcase_cv_fold_stats, cv_splits)
         assert_frame_equal(expected_df, observed_df)
 
+    def test_get_fold_workers(self):
+        with mock.patch('os.cpu_count', return_value=8):
+            self.assertEqual(8, cv.get_fold_workers(8))
+            self.assertEqual(8, cv.get_fold_workers(16))
+            self.assertEqual(2, cv.get_fold_workers(8, thread=3))
+            self.assertEqual(1, cv.get_fold_workers(2, thread=4))
+            self.assertEqual(1, cv.get_fold_workers(1))
+        with self.assertRaises(ValueError):
+            cv.get_fold_workers(0)
+
+    def test_run_cv_folds(self):
+        cv_splits = [([0], [i]) for i in range(3)]
+        # all folds must run at the same time to pass the barrier
+        barrier = threading.Barrier(3, timeout=10)
+
+        def fold_function(train_test_indices):
+            fold = train_test_indices[1][0]
+            barrier.wait()
+            time.sleep(0.01 * (3 - fold))
+            return fold
+
+        self.assertListEqual([0, 1, 2], cv.run_cv_folds(fold_function, cv_splits, max_workers=3))
+        self.assertListEqual([0, 1, 2], cv.run_cv_folds(lambda indices: indices[1][0], cv_splits))
+
+        def failing_fold_function(train_test_indices):
+            fold = train_test_indices[1][0]
+            if fold > 0:
+                raise IOError('fold {}'.format(fold))
+            return fold
+
+        with self.assertRaises(IOError) as cm:
+            cv.run_cv_folds(failing_fold_function, cv_splits, max_workers=3)
+        self.assertEqual('fold 1', cm.exception.args[0])
+
     def test_reproducibility_associations(self):
         test_case_df = data_tools.load_data_frame(self.test_case_df_path)
         run1 = cv.cv_independent_associations(test_case_df, cv_folds=3, random_state=np.random.RandomState(0))
@@ -275,6 +312,144 @@ class CVTest(unittest.TestCase):
         expected_test_df = expected_df.drop(random_col_names + ignore_params, axis=1)
         assert_frame_equal(results_test_df, expected_test_df)
 
+    def test_fth_random_cv_n_jobs(self):
+        def cv_function(data_df, params, random_state):
+            return fth.fasttext_cv_independent_associations(data_df, params, self.ft_path, cv_folds=2,
+                                                            random_state=random_state)
+
+        test_df = data_tools.load_data_frame(self.ft_cv_test_path)
+        test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
+        serial_results = cv.random_cv(test_df, cv_function, 4, {'-bucket': 1000, '-dim': 20},
+                                      fth.get_hyperparameter_distributions(), 3)
+        parallel_results = cv.random_cv(test_df, cv_function, 4, {'-bucket': 1000, '-dim': 20},
+                                        fth.get_hyperparameter_distributions(), 3, n_jobs=2)
+        self.assertFalse(parallel_results.isnull().any().any())
+        assert_frame_equal(serial_results, parallel_results)
+
+    def test_random_cv_n_jobs_failed_iteration(self):
+        def cv_function(data_df, params, random_state):
+            if params['x'] == 1:
+                raise ValueError('bad parameter')
+            return pandas.DataFrame({'score': [params['x'] * 10.0], 'seed': [random_state.randint(1000)]})
+
+        with self.assertWarns(UserWarning) as cm:
+            cv_results = cv.random_cv(self.testcase_df, cv_function, 5, {'y': 5}, {'x': iter(range(5)).__next__}, 7,
+                                      n_jobs=2)
+        self.assertIn('iteration 1 failed: ValueError: bad parameter', str(cm.warning))
+        with self.assertWarns(UserWarning) as cm:
+            serial_results = cv.random_cv(self.testcase_df, cv_function, 5, {'y': 5},
+                                          {'x': iter(range(5)).__next__}, 7, raise_errors=False)
+        self.assertIn('iteration 1 failed: ValueError: bad parameter', str(cm.warning))
+        assert_frame_equal(serial_results, cv_results)
+        self.assertListEqual(['x', 'y', 'score', 'seed'], list(cv_results.columns))
+        # the remaining iterations are returned in serial order
+        self.assertListEqual([0, 1, 2, 3, 4], cv_results['x'].tolist())
+        self.assertListEqual([5] * 5, cv_results['y'].tolist())
+        self.assertTrue(np.isnan(cv_results.loc[1, 'score']))
+        self.assertListEqual([0.0, 20.0, 30.0, 40.0], cv_results['score'].drop(1).tolist())
+        # each iteration is seeded with the same random seed
+        self.assertEqual(np.random.RandomState(7).randint(1000), cv_results.loc[2, 'seed'])
+
+    def test_random_cv_raise_errors(self):
+        def cv_function(data_df, params, random_state):
+            if params['x'] == 1:
+                raise ValueError('bad parameter')
+            return pandas.DataFrame({'score': [params['x'] * 10.0]})
+
+        for n_jobs in (1, 2):
+            with self.assertRaisesRegex(ValueError, 'bad parameter'):
+                cv.random_cv(self.testcase_df, cv_function, 3, {}, {'x': iter(range(3)).__next__}, 7, n_jobs=n_jobs,
+                             raise_errors=True)
+
+    def test_random_cv_n_jobs_without_fork(self):
+        def cv_function(data_df, params, random_state):
+            return pandas.DataFrame({'score': [params['x'] * 10.0], 'seed': [random_state.randint(1000)]})
+
+        serial_results = cv.random_cv(self.testcase_df, cv_function, 3, {}, {'x': iter(range(3)).__next__}, 7)
+        with mock.patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+            self.assertIsNone(cv.get_fork_context())
+            parallel_results = cv.random_cv(self.testcase_df, cv_function, 3, {}, {'x': iter(range(3)).__next__}, 7,
+                                            n_jobs=2)
+        assert_frame_equal(serial_results, parallel_results)
+
+    @staticmethod
+    def _halving_cv_function(data_df, params, random_state):
+        # settings closer to x = 4 score better; larger datasets and epochs add a small bonus
+        if params['x'] == 7:
+            raise ValueError('bad parameter')
+        score = -abs(params['x'] - 4) + 0.001 * len(data_df) + 0.0001 * params.get('-epoch', 0)
+        return pandas.DataFrame({'mean_test_score': [score], 'n_rows': [len(data_df)],
+                                 'seed': [random_state.randint(1000)]})
+
+    def test_get_association_ranks(self):
+        data_df = pandas.DataFrame({'entity1': ['a', 'b', 'c', 'a', 'd'], 'entity2': ['b', 'a', 'd', 'c', 'c']})
+        ranks = cv.get_association_ranks(data_df, random_state=np.random.RandomState(0))
+        self.assertEqual(ranks[0], ranks[1])
+        self.assertEqual(ranks[2], ranks[4])
+        self.assertListEqual([0, 1, 2], sorted(set(ranks.tolist())))
+        np.testing.assert_array_equal(ranks, cv.get_association_ranks(data_df,
+                                                                      random_state=np.random.RandomState(0)))
+
+    def test_successive_halving_cv(self):
+        test_df = data_tools.load_data_frame(self.cos_cv_test_path, match_distance=True)
+        with self.assertWarns(UserWarning):
+            results = cv.successive_halving_cv(test_df, self._halving_cv_function, 9, {'y': 1},
+                                               {'x': iter(range(9)).__next__}, 3)
+        self.assertListEqual(['x', 'y', 'mean_test_score', 'n_rows', 'seed', 'halving_round', 'halving_resource'],
+                             list(results.columns))
+        self.assertListEqual([0] * 9 + [1] * 3 + [2], results['halving_round'].tolist())
+        np.testing.assert_allclose([1 / 9] * 9 + [1 / 3] * 3 + [1.0], results['halving_resource'])
+        # the best third of settings survives each round; the failed setting 7 is ranked last
+        self.assertListEqual(list(range(9)) + [3, 4, 5, 4], results['x'].tolist())
+        self.assertTrue(np.isnan(results.loc[7, 'mean_test_score']))
+        # rows are subsampled by association and the last round uses the whole dataset
+        n_rows = results.groupby('halving_round')['n_rows'].first().tolist()
+        self.assertLess(n_rows[0], n_rows[1])
+        self.assertLess(n_rows[1], n_rows[2])
+        self.assertEqual(len(test_df), n_rows[2])
+        self.assertTrue((results['seed'].dropna() == np.random.RandomState(3).randint(1000)).all())
+
+    def test_successive_halving_cv_resource_param(self):
+        results = cv.successive_halving_cv(self.testcase_df, self._halving_cv_function, 5, {},
+                                           {'x': iter([0, 3, 4, 5, 6]).__next__}, 0, reduction_factor=2,
+                                           resource_param='-epoch', max_resource=40, min_resource=10)
+        self.assertListEqual([0] * 5 + [1] * 2 + [2], results['halving_round'].tolist())
+        self.assertListEqual([10] * 5 + [20] * 2 + [40], results['epoch'].tolist())
+        self.assertListEqual([10] * 5 + [20] * 2 + [40], results['halving_resource'].tolist())
+        self.assertListEqual([0, 3, 4, 5, 6, 3, 4, 4], results['x'].tolist())
+        self.assertTrue((results['n_rows'] == len(self.testcase_df)).all())
+        with self.assertRaises(ValueError):
+            cv.successive_halving_cv(self.testcase_df, self._halving_cv_function, 5, {}, {'x': lambda: 1}, 0,
+                                     resource_param='-epoch')
+
+    def test_hyperband_cv(self):
+        results = cv.hyperband_cv(self.testcase_df, self._halving_cv_function, {}, {'x': iter(range(100)).__next__},
+                                  0, 10, resource_param='-epoch', max_resource=90)
+        # brackets start 9, 5 and 3 settings with 10, 30 and 90 epochs, respectively
+        first_round = results[results['halving_round'] == 0]
+        self.assertListEqual([9, 5, 3], first_round.groupby('hyperband_bracket').size().tolist())
+        self.assertListEqual([10, 30, 90], first_round.groupby('hyperband_bracket')['epoch'].first().tolist())
+        self.assertListEqual([90, 90, 90], results.groupby('hyperband_bracket')['epoch'].max().tolist())
+        # each bracket samples new settings
+        self.assertEqual(17, first_round['x'].nunique())
+
+    def test_fth_successive_halving_cv(self):
+        def cv_function(data_df, params, random_state):
+            return fth.fasttext_cv_independent_associations(data_df, params, self.ft_path, cv_folds=2,
+                                                            random_state=random_state)
+
+        test_df = data_tools.load_data_frame(self.ft_cv_test_path)
+        test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
+        results = cv.successive_halving_cv(test_df, cv_function, 3, {'-bucket': 1000, '-dim': 20},
+                                           fth.get_hyperparameter_distributions(), 3, resource_param='-epoch',
+                                           max_resource=30)
+        random_cv_results = cv.random_cv(test_df, cv_function, 3, {'-bucket': 1000, '-dim': 20},
+                                         fth.get_hyperparameter_distributions(), 3)
+        self.assertListEqual(list(random_cv_results.columns) + ['halving_round', 'halving_resource'],
+                             list(results.columns))
+        self.assertListEqual([10, 10, 10, 30], results['epoch'].tolist())
+        self.assertFalse(results['mean_test_score'].isnull().any())
+
     def test_cos_random_cv_bad_param(self):
         cv_folds = 2
         cv_iterations = 2
@@ -291,7 +466,7 @@ class CVTest(unittest.TestCase):
                             cos.get_hyperparameter_distributions(), 3)
 
         self.assertEqual(cm.exception.args[0],
-                         "co_occurrence_score() got an unexpected keyword argument 'sentence_weightXXXX'")
+                         "co_occurrence_score_data_frame() got an unexpected keyword argument 'sentence_weightXXXX'")
 
     def test_cos_random_cv(self):
         paragraph_weight = 3
@@ -3,6 +3,7 @@ import os
 import pandas as pd
 from pandas.util.testing import assert_frame_equal
 import unittest
+from unittest import mock
 
 import cocoscore.ml.fasttext_helpers as fth
 import cocoscore.tools.data_tools as dt
@@ -138,5 +139,18 @@ class CVTest(unittest.TestCase):
                                    columns=expected_col_names)
         assert_frame_equal(cv_results, expected_df)
 
+    def test_fasttext_cv_independent_associations_n_jobs(self):
+        test_df = dt.load_data_frame(self.cv_test_path)
+        test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
+        serial_results = fth.fasttext_cv_independent_associations(test_df, {'-bucket': 1000, '-dim': 20}, self.ft_path,
+                                                                  cv_folds=2, random_state=np.random.RandomState(3))
+        with mock.patch('os.cpu_count', return_value=2):
+            parallel_results = fth.fasttext_cv_independent_associations(test_df, {'-bucket': 1000, '-dim': 20},
+                                                                        self.ft_path, cv_folds=2,
+                                                                        random_state=np.random.RandomState(3),
+                                                                        n_jobs=2)
+        assert_frame_equal(serial_results, parallel_results)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import collections
+import random
+import unittest
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_accumulator import PairCountAccumulator
+from tests.tagger.test_co_occurrence_score import assert_deep_almost_equal
+
+
+class PairCountAccumulatorTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    sentence_score_file_path = 'tests/tagger/sentence_scores_file.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+
+    def test_random_updates(self):
+        random_state = random.Random(0)
+        accumulator = PairCountAccumulator(initial_capacity=2, batch_size=50)
+        expected = collections.defaultdict(float)
+        for _ in range(5000):
+            entity_1 = 'A{}'.format(random_state.randrange(100))
+            entity_2 = 'B{}'.format(random_state.randrange(50))
+            update = random_state.random()
+            accumulator.add(entity_1, entity_2, update)
+            for key in ((entity_1, entity_2), entity_1, entity_2, None):
+                expected[key] += update
+        self.assertDictEqual(dict(expected), accumulator.to_dict())
+        self.assertEqual(len([key for key in expected if isinstance(key, tuple)]), len(accumulator))
+        self.assertLessEqual(accumulator.memory_bytes(), 64 * len(accumulator) + 8 * 256)
+
+    def test_to_weighted_counts(self):
+        accumulator = PairCountAccumulator()
+        accumulator.add('B', 'A', 1.0)
+        accumulator.add('C', 'A', 2.0)
+        accumulator.add('B', 'A', 0.5)
+        weighted_counts = accumulator.to_weighted_counts()
+        self.assertListEqual(['A', 'B', 'C'], weighted_counts.entities.tolist())
+        pairs = dict(zip(zip(weighted_counts.entity_1.tolist(), weighted_counts.entity_2.tolist()),
+                         weighted_counts.pair_counts.tolist()))
+        self.assertDictEqual({(1, 0): 1.5, (2, 0): 2.0}, pairs)
+        self.assertListEqual([3.5, 1.5, 2.0], weighted_counts.entity_counts.tolist())
+        self.assertEqual(3.5, weighted_counts.total_count)
+
+    def test_co_occurrence_score_compact_counts(self):
+        for matches_file_path, score_file_path in ((self.matches_file_cross_path, None),
+                                                   (self.matches_file_cross_path, self.sentence_score_file_path),
+                                                   (None, self.sentence_score_file_path)):
+            expected = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path,
+                                                               self.entity_file_path, first_type=9606,
+                                                               second_type=-26, silent=True)
+            actual = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path,
+                                                             self.entity_file_path, first_type=9606,
+                                                             second_type=-26, silent=True, compact_counts=True)
+            assert_deep_almost_equal(self, expected, actual)
+            sparse_scores = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path,
+                                                                    self.entity_file_path, first_type=9606,
+                                                                    second_type=-26, silent=True,
+                                                                    compact_counts=True, return_type='sparse')
+            assert_deep_almost_equal(self, expected, sparse_scores.to_dict())
+
+    def test_compact_counts_bad_param(self):
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                    first_type=9606, second_type=-26, compact_counts=True, n_jobs=2)
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import cocoscore.tagger.co_occurrence_arrays as co_occurrence_arrays
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from tests.tagger.test_co_occurrence_score import assert_deep_almost_equal
+
+
+class CooccurrenceArraysTest(unittest.TestCase):
+    matches_file_path = 'tests/tagger/matches_file.tsv'
+    matches_file_same_type_path = 'tests/tagger/matches_file_same_type.tsv'
+    matches_document_level_comentions_file_path = 'tests/tagger/matches_file_document_level_comentions.tsv'
+    matches_file_single_matches_path = 'tests/tagger/matches_file_single_matches.tsv'
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    matches_file_cross_fantasy_types_path = 'tests/tagger/matches_file_cross_fantasy_types.tsv'
+    score_file_paths = ['tests/tagger/sentence_scores_file.tsv',
+                        'tests/tagger/paragraph_scores_file.tsv',
+                        'tests/tagger/document_scores_file.tsv',
+                        'tests/tagger/paragraph_sentence_scores_file.tsv',
+                        'tests/tagger/document_paragraph_sentence_scores_file.tsv',
+                        'tests/tagger/document_paragraph_scores_file.tsv',
+                        'tests/tagger/precedence_document_paragraph_sentence_scores_file.tsv']
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+    entity_fantasy_types_file_path = 'tests/tagger/entities2_fantasy_types.tsv.gz'
+    entity_file_same_type_path = 'tests/tagger/entities2_same_type.tsv.gz'
+    weights = {'document_weight': 2.0, 'paragraph_weight': 1.5, 'sentence_weight': 1.0, 'weighting_exponent': 0.6}
+
+    def assert_engines_agree(self, matches_file_path, score_file_path, entities_file, first_type, second_type,
+                             ignore_scores=False):
+        expected = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path, entities_file,
+                                                           first_type=first_type, second_type=second_type,
+                                                           ignore_scores=ignore_scores, silent=True, **self.weights)
+        actual = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path, entities_file,
+                                                         first_type=first_type, second_type=second_type,
+                                                         ignore_scores=ignore_scores, silent=True, engine='numpy',
+                                                         **self.weights)
+        self.assertGreater(len(expected), 0)
+        assert_deep_almost_equal(self, expected, actual)
+
+    def test_intern_entities(self):
+        entities, ids = co_occurrence_arrays.intern_entities(['B', 'A', '--D', 'B'])
+        self.assertListEqual(['--D', 'A', 'B'], entities.tolist())
+        self.assertListEqual([2, 1, 0, 2], ids.tolist())
+
+    def test_group_ids(self):
+        ids, group_count = co_occurrence_arrays.group_ids(numpy.array([3, 1, 3, 1]), numpy.array([0, 0, 0, 1]))
+        self.assertEqual(3, group_count)
+        self.assertListEqual([2, 0, 2, 1], ids.tolist())
+
+    def test_load_score_table(self):
+        score_table = co_occurrence_arrays.load_score_table('tests/tagger/sentence_scores_file.tsv')
+        self.assertListEqual(['--D', 'A', 'B', 'C'], score_table.entities.tolist())
+        self.assertListEqual([1111, 1111, 2222, 3333, 3333], score_table.pmid.tolist())
+        self.assertListEqual([0, 0, 2, 0, 0], score_table.entity_1.tolist())
+        self.assertListEqual([1, 1, 3, 1, 1], score_table.entity_2.tolist())
+        self.assertListEqual([0.9, 0.5, 0, 0.4, 0.44], score_table.score.tolist())
+
+    def test_weighted_counts_score_files(self):
+        for score_file_path in self.score_file_paths:
+            score_dict = co_occurrence_score.load_score_file(score_file_path)
+            expected = co_occurrence_score.get_weighted_counts(None, *co_occurrence_score.split_scores(score_dict),
+                                                               None, first_type=9606, second_type=-26,
+                                                               document_weight=2.0, paragraph_weight=1.5,
+                                                               sentence_weight=1.0)
+            score_table = co_occurrence_arrays.load_score_table(score_file_path)
+            co_mention_table = co_occurrence_arrays.get_co_mention_table(None, score_table, 9606, -26)
+            weighted_counts = co_occurrence_arrays.get_weighted_counts_arrays(co_mention_table, document_weight=2.0,
+                                                                              paragraph_weight=1.5,
+                                                                              sentence_weight=1.0)
+            assert_deep_almost_equal(self, expected, co_occurrence_arrays.weighted_counts_to_dict(weighted_counts))
+
+    def test_co_occurrence_score_score_files(self):
+        for score_file_path in self.score_file_paths:
+            self.assert_engines_agree(None, score_file_path, None, 9606, -26)
+
+    def test_co_occurrence_score_matches_files(self):
+        for matches_file_path in (self.matches_file_path, self.matches_document_level_comentions_file_path,
+                                  self.matches_file_single_matches_path, self.matches_file_cross_path):
+            for first_type, second_type in ((9606, -26), (-26, 9606)):
+                for ignore_scores in (False, True):
+                    self.assert_engines_agree(matches_file_path, None, self.entity_file_path, first_type,
+                                              second_type, ignore_scores=ignore_scores)
+                    for score_file_path in self.score_file_paths:
+                        self.assert_engines_agree(matches_file_path, score_file_path, self.entity_file_path,
+                                                  first_type, second_type, ignore_scores=ignore_scores)
+
+    def test_co_occurrence_score_matches_file_fantasy_types(self):
+        for score_file_path in (None, 'tests/tagger/sentence_scores_file.tsv'):
+            self.assert_engines_agree(self.matches_file_cross_fantasy_types_path, score_file_path,
+                                      self.entity_fantasy_types_file_path, 1, 2)
+
+    def test_co_occurrence_score_matches_file_same_type(self):
+        self.assert_engines_agree(self.matches_file_same_type_path, None, self.entity_file_same_type_path, 2, 2,
+                                  ignore_scores=True)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError) as cm:
+            co_occurrence_score.co_occurrence_score(None, self.score_file_paths[0], None, first_type=9606,
+                                                    second_type=-26, engine='pandas')
+        self.assertEqual(cm.exception.args[0], 'Unknown engine: pandas')
+
+    def test_binary_score_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for score_file_path in self.score_file_paths:
+                binary_score_path = os.path.join(temp_dir, os.path.basename(score_file_path) + '.bin')
+                co_occurrence_arrays.convert_score_file(score_file_path, binary_score_path)
+                self.assertTrue(co_occurrence_arrays.is_binary_score_file(binary_score_path))
+                self.assertFalse(co_occurrence_arrays.is_binary_score_file(score_file_path))
+
+                score_table = co_occurrence_arrays.load_binary_score_table(binary_score_path)
+                self.assertIsInstance(score_table.score, numpy.memmap)
+                self.assertDictEqual(co_occurrence_score.load_score_file(score_file_path),
+                                     co_occurrence_arrays.score_table_to_dict(score_table))
+                for engine in ('dict', 'numpy'):
+                    expected = co_occurrence_score.co_occurrence_score(None, score_file_path, None,
+                                                                       first_type=9606, second_type=-26,
+                                                                       **self.weights)
+                    actual = co_occurrence_score.co_occurrence_score(None, binary_score_path, None,
+                                                                     first_type=9606, second_type=-26,
+                                                                     engine=engine, **self.weights)
+                    assert_deep_almost_equal(self, expected, actual)
+
+    def test_co_occurrence_score_settings(self):
+        parameter_settings = [self.weights,
+                              {'document_weight': 0.0, 'paragraph_weight': 0.0, 'sentence_weight': 1.0,
+                               'weighting_exponent': 0.3},
+                              {'document_weight': 15.0, 'paragraph_weight': 0.0, 'sentence_weight': 0.0,
+                               'weighting_exponent': 1.0}]
+        for matches_file_path, score_file_path in ((None, self.score_file_paths[4]),
+                                                   (self.matches_file_cross_path, self.score_file_paths[0]),
+                                                   (self.matches_file_path, None)):
+            pairs, scores = co_occurrence_arrays.co_occurrence_score_settings(matches_file_path, score_file_path,
+                                                                              self.entity_file_path, 9606, -26,
+                                                                              parameter_settings)
+            self.assertTupleEqual((len(pairs), len(parameter_settings)), scores.shape)
+            for settings, setting_scores in zip(parameter_settings, scores.T):
+                expected = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path,
+                                                                   self.entity_file_path, first_type=9606,
+                                                                   second_type=-26, silent=True, **settings)
+                actual = {pair: score for pair, score in zip(pairs, setting_scores.tolist())
+                          if not numpy.isnan(score)}
+                assert_deep_almost_equal(self, expected, actual)
+
+    def test_co_occurrence_score_settings_negative_weight(self):
+        with self.assertRaises(ValueError):
+            co_occurrence_arrays.co_occurrence_score_settings(None, self.score_file_paths[0], None, 9606, -26,
+                                                              [{'document_weight': -1.0}])
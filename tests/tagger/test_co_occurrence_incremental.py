@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_incremental import CoOccurrenceState
+from tests.tagger.test_co_occurrence_score import assert_deep_almost_equal
+
+
+class CoOccurrenceStateTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    sentence_score_file_path = 'tests/tagger/sentence_scores_file.tsv'
+    document_score_file_path = 'tests/tagger/document_scores_file.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+    weights = {'document_weight': 2.0, 'paragraph_weight': 1.5, 'sentence_weight': 1.0, 'weighting_exponent': 0.6}
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_state(self):
+        return CoOccurrenceState(9606, -26, entities_file=self.entity_file_path, **self.weights)
+
+    def split_file(self, file_path, pmids):
+        """Writes the lines of file_path with and without the given pmids to two temporary files."""
+        selected_path = os.path.join(self.temp_dir.name, 'selected_' + os.path.basename(file_path))
+        other_path = os.path.join(self.temp_dir.name, 'other_' + os.path.basename(file_path))
+        with open(file_path) as f, open(selected_path, 'w') as selected, open(other_path, 'w') as other:
+            for line in f:
+                (selected if line.split('\t')[0] in pmids else other).write(line)
+        return selected_path, other_path
+
+    def test_matches_file(self):
+        for score_file_path in (None, self.sentence_score_file_path):
+            state = self.get_state()
+            self.assertSetEqual({1111, 2222, 3333}, state.add_documents(self.matches_file_cross_path,
+                                                                        score_file_path))
+            expected = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, score_file_path,
+                                                               self.entity_file_path, first_type=9606,
+                                                               second_type=-26, silent=True, **self.weights)
+            assert_deep_almost_equal(self, expected, state.get_scores())
+
+    def test_score_file(self):
+        state = self.get_state()
+        state.add_documents(score_file_path=self.sentence_score_file_path)
+        expected = co_occurrence_score.co_occurrence_score(None, self.sentence_score_file_path, None,
+                                                           first_type=9606, second_type=-26, **self.weights)
+        assert_deep_almost_equal(self, expected, state.get_scores())
+
+    def test_incremental_add_and_remove(self):
+        full_state = self.get_state()
+        full_state.add_documents(self.matches_file_cross_path, self.sentence_score_file_path)
+
+        selected_matches, other_matches = self.split_file(self.matches_file_cross_path, {'3333'})
+        state = self.get_state()
+        state.add_documents(other_matches, self.sentence_score_file_path)
+        other_scores_dict = state.get_scores()
+        other_unnormalized_scores = dict(state._unnormalized_scores)
+        state.add_documents(selected_matches, self.sentence_score_file_path)
+        # only pairs sharing an entity with the added document are re-scored; the others keep their score objects
+        affected_entities = {entity for pair in state._pmid_counts[3333] for entity in pair}
+        untouched_pairs = [pair for pair in other_unnormalized_scores if not affected_entities.intersection(pair)]
+        self.assertGreater(len(untouched_pairs), 0)
+        for pair in untouched_pairs:
+            self.assertIs(other_unnormalized_scores[pair], state._unnormalized_scores[pair])
+        self.assertDictEqual(full_state.get_scores(), state.get_scores())
+        self.assertDictEqual(full_state.get_weighted_counts(), state.get_weighted_counts())
+
+        # re-adding documents replaces them instead of counting them twice
+        state.add_documents(self.matches_file_cross_path, self.sentence_score_file_path)
+        self.assertDictEqual(full_state.get_scores(), state.get_scores())
+
+        self.assertSetEqual({3333}, state.remove_documents([3333, 4444]))
+        self.assertSetEqual({1111, 2222}, state.pmids)
+        self.assertDictEqual(other_scores_dict, state.get_scores())
+
+        state.remove_documents([1111, 2222])
+        self.assertDictEqual({}, state.get_scores())
+        self.assertDictEqual({}, state.get_weighted_counts())
+
+    def test_new_score_level(self):
+        state = self.get_state()
+        state.add_documents(self.matches_file_cross_path, self.sentence_score_file_path)
+        with self.assertRaises(ValueError):
+            state.add_documents(self.matches_file_cross_path, self.document_score_file_path)
+        with self.assertRaises(ValueError):
+            state.add_documents(self.matches_file_cross_path)
+
+    def test_save_load(self):
+        state = self.get_state()
+        state.add_documents(self.matches_file_cross_path, self.sentence_score_file_path)
+        state_path = os.path.join(self.temp_dir.name, 'state.pickle.gz')
+        state.save(state_path)
+        loaded_state = CoOccurrenceState.load(state_path)
+        self.assertDictEqual(state.get_scores(), loaded_state.get_scores())
+        loaded_state.remove_documents([1111])
+        state.remove_documents([1111])
+        self.assertDictEqual(state.get_scores(), loaded_state.get_scores())
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_index import PartnerIndex, build_partner_index
+
+
+class PartnerIndexTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+    scores = {('A', 'X'): 1.0, ('A', 'Y'): 3.0, ('A', 'Z'): 2.0, ('B', 'Y'): 2.0, ('A', 'W'): 2.0}
+
+    def test_top_k(self):
+        index = build_partner_index(self.scores)
+        self.assertEqual(6, len(index))
+        self.assertListEqual([('Y', 3.0), ('W', 2.0)], index.top_k('A', 2))
+        self.assertListEqual([('Y', 3.0), ('W', 2.0), ('Z', 2.0), ('X', 1.0)], index.top_k('A', 10))
+        self.assertListEqual([('A', 3.0), ('B', 2.0)], index.top_k('Y', 5))
+        self.assertListEqual([], index.top_k('A', 0))
+        self.assertListEqual([], index.top_k('unknown', 5))
+        with self.assertRaises(ValueError):
+            index.top_k('A', -1)
+
+    def test_above_threshold(self):
+        index = build_partner_index(self.scores)
+        self.assertListEqual([('Y', 3.0), ('W', 2.0), ('Z', 2.0)], index.above_threshold('A', 2.0))
+        self.assertListEqual([], index.above_threshold('A', 3.5))
+        self.assertListEqual([('A', 1.0)], index.above_threshold('X', 0.0))
+        self.assertListEqual([], index.above_threshold('unknown', 0.0))
+
+    def test_co_occurrence_scores(self):
+        scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                         first_type=9606, second_type=-26, silent=True)
+        index = build_partner_index(scores)
+        for (entity_1, entity_2), score in scores.items():
+            self.assertIn((entity_2, score), index.top_k(entity_1, len(scores)))
+            self.assertIn((entity_1, score), index.top_k(entity_2, len(scores)))
+
+    def test_save_load(self):
+        index = build_partner_index(self.scores)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = os.path.join(temp_dir, 'index')
+            index.save(index_path)
+            loaded_index = PartnerIndex.load(index_path)
+            self.assertIsInstance(loaded_index.scores, numpy.memmap)
+            for entity in index.entities:
+                self.assertListEqual(index.top_k(entity, 10), loaded_index.top_k(entity, 10))
+                self.assertListEqual(index.above_threshold(entity, 2.0), loaded_index.above_threshold(entity, 2.0))
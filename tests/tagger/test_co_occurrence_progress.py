@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import unittest
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_progress import ProgressTracker, log_progress, phases
+
+
+class ProgressTrackerTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+
+    def test_progress_tracker(self):
+        reports = []
+        progress = ProgressTracker(reports.append, interval=2)
+        progress.set_phase('parse')
+        for _ in range(5):
+            progress.update(documents=1, lines=3, pairs=2, bytes_read=10)
+        progress.set_phase('finalize')
+        summary = progress.finish()
+        self.assertListEqual(['progress', 'progress', 'summary'], [report['event'] for report in reports])
+        self.assertListEqual([2, 4, 5], [report['documents'] for report in reports])
+        self.assertEqual(summary, reports[-1])
+        self.assertEqual(15, summary['lines'])
+        self.assertEqual(10, summary['pairs'])
+        self.assertEqual(50, summary['bytes_read'])
+        self.assertSetEqual(set(phases), set(summary['phase_seconds']))
+        self.assertLessEqual(sum(summary['phase_seconds'].values()), summary['elapsed_seconds'])
+        with self.assertRaises(ValueError):
+            ProgressTracker(interval=0)
+
+    def test_co_occurrence_score_progress(self):
+        expected_pairs = sum(1 for _ in co_occurrence_score.iterate_weighted_count_updates(
+            self.matches_file_cross_path, None, None, None, self.entity_file_path, 9606, -26, document_weight=15.0,
+            paragraph_weight=0.0, sentence_weight=1.0, silent=True))
+        for matches_chunk_size in (None, 5):
+            reports = []
+            scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None,
+                                                             self.entity_file_path, first_type=9606,
+                                                             second_type=-26, silent=True,
+                                                             matches_chunk_size=matches_chunk_size,
+                                                             progress_callback=reports.append, progress_interval=2)
+            self.assertDictEqual(co_occurrence_score.co_occurrence_score(
+                self.matches_file_cross_path, None, self.entity_file_path, first_type=9606, second_type=-26,
+                silent=True), scores)
+            self.assertListEqual(['progress', 'summary'], [report['event'] for report in reports])
+            summary = reports[-1]
+            self.assertEqual(3, summary['documents'])
+            self.assertEqual(12, summary['lines'])
+            self.assertEqual(os.path.getsize(self.matches_file_cross_path), summary['bytes_read'])
+            self.assertEqual(expected_pairs, summary['pairs'])
+            self.assertGreater(summary['phase_seconds']['map'], 0)
+            self.assertGreater(summary['phase_seconds']['finalize'], 0)
+
+    def test_log_progress(self):
+        with self.assertLogs('cocoscore.tagger.co_occurrence_progress', level=logging.INFO) as logs:
+            co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                    first_type=9606, second_type=-26, silent=True,
+                                                    progress_callback=log_progress)
+        self.assertEqual(1, len(logs.records))
+        self.assertEqual('summary', json.loads(logs.records[0].getMessage())['event'])
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas
+from scipy import sparse
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from tests.tagger.test_co_occurrence_score import assert_deep_almost_equal
+
+parquet_available = importlib.util.find_spec('pyarrow') is not None
+
+
+class CoOccurrenceScoresTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    sentence_score_file_path = 'tests/tagger/sentence_scores_file.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+    weights = {'document_weight': 2.0, 'paragraph_weight': 1.5, 'sentence_weight': 1.0, 'weighting_exponent': 0.6}
+
+    def get_scores(self, matches_file_path, score_file_path, **kwargs):
+        return co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path, self.entity_file_path,
+                                                       first_type=9606, second_type=-26, silent=True,
+                                                       **self.weights, **kwargs)
+
+    def test_sparse_scores(self):
+        for matches_file_path, score_file_path in ((self.matches_file_cross_path, None),
+                                                   (self.matches_file_cross_path, self.sentence_score_file_path),
+                                                   (None, self.sentence_score_file_path)):
+            expected = self.get_scores(matches_file_path, score_file_path)
+            for engine in ('dict', 'numpy'):
+                result = self.get_scores(matches_file_path, score_file_path, engine=engine, return_type='sparse')
+                self.assertTrue(sparse.isspmatrix_csr(result.scores))
+                self.assertEqual(len(expected), len(result))
+                assert_deep_almost_equal(self, expected, result.to_dict())
+
+    def test_marginals(self):
+        weighted_counts = co_occurrence_score.get_weighted_counts(self.matches_file_cross_path, None, None, None,
+                                                                  self.entity_file_path, 9606, -26,
+                                                                  document_weight=2.0, paragraph_weight=1.5,
+                                                                  sentence_weight=1.0, silent=True)
+        for engine in ('dict', 'numpy'):
+            result = self.get_scores(self.matches_file_cross_path, None, engine=engine, return_type='sparse')
+            self.assertAlmostEqual(weighted_counts[None], result.total_count)
+            for entity, count in zip(result.entities.tolist(), result.entity_counts.tolist()):
+                self.assertAlmostEqual(weighted_counts.get(entity, 0.0), count)
+
+    def test_to_data_frame(self):
+        expected = self.get_scores(self.matches_file_cross_path, None)
+        data_frame = self.get_scores(self.matches_file_cross_path, None, return_type='sparse').to_data_frame()
+        self.assertListEqual(['entity_1', 'entity_2', 'score'], data_frame.columns.tolist())
+        self.assertListEqual(sorted(expected), list(zip(data_frame['entity_1'], data_frame['entity_2'])))
+        self.assertListEqual([expected[pair] for pair in sorted(expected)], data_frame['score'].tolist())
+
+    def test_to_file(self):
+        result = self.get_scores(self.matches_file_cross_path, None, return_type='sparse')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for file_name in ('scores.tsv', 'scores.tsv.gz'):
+                file_path = os.path.join(temp_dir, file_name)
+                result.to_file(file_path)
+                read_df = pandas.read_csv(file_path, sep='\t', header=None,
+                                          names=['entity_1', 'entity_2', 'score'])
+                pandas.testing.assert_frame_equal(result.to_data_frame(), read_df)
+
+    @unittest.skipUnless(parquet_available, 'Parquet support requires pyarrow')
+    def test_to_parquet(self):
+        result = self.get_scores(self.matches_file_cross_path, None, return_type='sparse')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'scores.parquet')
+            result.to_file(file_path)
+            pandas.testing.assert_frame_equal(result.to_data_frame(), pandas.read_parquet(file_path))
+
+    def test_unknown_return_type(self):
+        with self.assertRaises(ValueError) as cm:
+            self.get_scores(self.matches_file_cross_path, None, return_type='list')
+        self.assertEqual(cm.exception.args[0], 'Unknown return_type: list')
@@ -1,8 +1,13 @@
+import os
+import tempfile
 import unittest
+import warnings
+from unittest import mock
 
 import numpy
 import pandas
 from pandas.util.testing import assert_frame_equal
+import sklearn.metrics
 
 from cocoscore.ml.distance_scores import polynomial_decay_distance
 from cocoscore.ml.fasttext_helpers import fasttext_fit_predict_default
@@ -93,6 +98,27 @@ class CooccurrenceTest(unittest.TestCase):
                                              3333: 2},
                               ('B', 'C'): {2222: 3}}, document_scores)
 
+    def test_max_score_index(self):
+        scores = co_occurrence_score.load_score_file(self.document_paragraph_sentence_score_file_path)
+        for level_scores in co_occurrence_score.split_scores(scores):
+            max_score_index = co_occurrence_score.get_max_score_index(level_scores)
+            for pmid in (1111, 2222, 3333, 4444):
+                for entity_pair in (('--D', 'A'), ('B', 'C')):
+                    self.assertEqual(co_occurrence_score.get_max_score(level_scores, pmid, *entity_pair),
+                                     max_score_index.get((*entity_pair, pmid), 0.0))
+
+    def test_co_mention_index(self):
+        scores = co_occurrence_score.load_score_file(self.paragraph_sentence_score_file_path)
+        sentence_scores, paragraph_scores, _ = co_occurrence_score.split_scores(scores)
+        self.assertDictEqual({('--D', 'A', 1111): {(1, 2), (2, 3)},
+                              ('--D', 'A', 3333): {(2, 2), (2, 3)},
+                              ('B', 'C', 2222): {(1, 1)}},
+                             co_occurrence_score.get_co_mention_index(sentence_scores))
+        self.assertDictEqual({('--D', 'A', 1111): {1, 2},
+                              ('--D', 'A', 3333): {2},
+                              ('B', 'C', 2222): {1}},
+                             co_occurrence_score.get_co_mention_index(paragraph_scores))
+
     def test_weighted_counts_sentences(self):
         sentence_scores = co_occurrence_score.load_score_file(self.sentence_score_file_path)
         weighted_counts = co_occurrence_score.get_weighted_counts(None, sentence_scores, None, None, None,
@@ -810,6 +836,102 @@ class CooccurrenceTest(unittest.TestCase):
                                        columns=expected_col_names)
         assert_frame_equal(cv_results, expected_df)
 
+    def test_cocoscore_cv_independent_associations_n_jobs(self):
+        test_df = dt.load_data_frame(self.cos_cv_test_path, match_distance=True)
+        test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
+        cv_kwargs = dict(cv_folds=2, fasttext_epochs=5, fasttext_bucket=1000, fasttext_dim=20)
+        param_dict = {'sentence_weight': 1, 'paragraph_weight': 1, 'document_weight': 1}
+        serial_results = co_occurrence_score.cv_independent_associations(
+            test_df, param_dict, random_state=numpy.random.RandomState(3), **cv_kwargs)
+        with mock.patch('os.cpu_count', return_value=2):
+            parallel_results = co_occurrence_score.cv_independent_associations(
+                test_df, param_dict, random_state=numpy.random.RandomState(3), n_jobs=2, **cv_kwargs)
+        assert_frame_equal(serial_results, parallel_results)
+
+    def test_cocoscore_cv_independent_associations_fasttext_thread(self):
+        test_df = dt.load_data_frame(self.cos_cv_test_path, match_distance=True)
+
+        def fasttext_fit_predict(train_df, test_df, **kwargs):
+            return None, [0.5] * len(train_df), None, [0.5] * len(test_df)
+
+        with mock.patch('os.cpu_count', return_value=4), \
+                mock.patch.object(co_occurrence_score, 'fasttext_fit_predict_default',
+                                  side_effect=fasttext_fit_predict) as fit_predict, \
+                mock.patch.object(co_occurrence_score.cv, 'run_cv_folds',
+                                  wraps=co_occurrence_score.cv.run_cv_folds) as run_cv_folds:
+            co_occurrence_score.cv_independent_associations(test_df, {'sentence_weight': 1}, fasttext_epochs=5,
+                                                            cv_folds=2, random_state=numpy.random.RandomState(3),
+                                                            n_jobs=4, fasttext_thread=2)
+        # two folds with two fastText threads each use all four CPUs
+        self.assertEqual(2, run_cv_folds.call_args[1]['max_workers'])
+        self.assertEqual(2, fit_predict.call_count)
+        for call in fit_predict.call_args_list:
+            self.assertEqual(2, call[1]['thread'])
+
+    def test_cocoscore_cv_independent_associations_sentence_score_cache(self):
+        test_df = dt.load_data_frame(self.cos_cv_test_path, match_distance=True)
+        test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
+        fasttext_calls = []
+
+        def fasttext_function(train_df, test_df, epochs, dim, bucket):
+            fasttext_calls.append(epochs)
+            return None, [len(text) / 100 for text in train_df['text']], None, \
+                [len(text) / 100 for text in test_df['text']]
+
+        def run_cv(param_dict, sentence_score_cache, fasttext_epochs=5, sentence_score_settings='length',
+                   random_seed=3):
+            return co_occurrence_score.cv_independent_associations(test_df, param_dict,
+                                                                   fasttext_function=fasttext_function,
+                                                                   fasttext_epochs=fasttext_epochs, cv_folds=2,
+                                                                   random_state=numpy.random.RandomState(random_seed),
+                                                                   sentence_score_cache=sentence_score_cache,
+                                                                   sentence_score_settings=sentence_score_settings)
+
+        cache = {}
+        param_dicts = [{'sentence_weight': 1, 'paragraph_weight': 1, 'document_weight': 1},
+                       {'sentence_weight': 2, 'paragraph_weight': 0, 'document_weight': 5, 'weighting_exponent': 0.3}]
+        for param_dict in param_dicts:
+            expected = run_cv(param_dict, None)
+            assert_frame_equal(expected, run_cv(param_dict, cache))
+        # fastText only runs for the two folds of the first cached call
+        self.assertEqual(2 * len(param_dicts) + 2, len(fasttext_calls))
+        self.assertEqual(2, len(cache))
+
+        # other fastText settings or folds are not served from the cache
+        run_cv(param_dicts[0], cache, fasttext_epochs=6)
+        self.assertListEqual([6, 6], fasttext_calls[-2:])
+        run_cv(param_dicts[0], cache, random_seed=6)
+        self.assertEqual(6, len(cache))
+        # neither are scores of another classifier
+        run_cv(param_dicts[0], cache, sentence_score_settings='other')
+        self.assertListEqual([5, 5], fasttext_calls[-2:])
+        self.assertEqual(8, len(cache))
+        with self.assertRaises(ValueError):
+            run_cv(param_dicts[0], cache, sentence_score_settings=None)
+
+    def test_compute_metric(self):
+        data_df = pandas.DataFrame({'entity1': ['B', 'A', 'A', 'C', 'C', 'D', 'D'],
+                                    'entity2': ['A', 'B', 'B', 'A', 'A', 'E', 'F'],
+                                    'class': [1, 1, 1, 0, 1, 0, 1]})
+        score_dict = {('A', 'B'): 3.0, ('A', 'C'): 2.0, ('D', 'F'): 1.0}
+        # associations (A, B, 1), (B, A, 1), (C, A, 0), (C, A, 1), (D, E, 0), (D, F, 1); the score of (D, E) is missing
+        classes = [1, 1, 0, 1, 0, 1]
+        scores = [3.0, 3.0, 2.0, 2.0, 0.0, 1.0]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            auc = co_occurrence_score._compute_metric(score_dict, data_df)
+        self.assertEqual(1, len(caught))
+        self.assertIn("Missing scores for 1 of 6 associations, e.g. entity pair ('D', 'E')", str(caught[0].message))
+        self.assertAlmostEqual(sklearn.metrics.roc_auc_score(classes, scores), auc)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            average_precision = co_occurrence_score._compute_metric(score_dict, data_df, warn=False,
+                                                                    metric='average_precision_score')
+        self.assertEqual(0, len(caught))
+        self.assertAlmostEqual(sklearn.metrics.average_precision_score(classes, scores), average_precision)
+        with self.assertRaises(ValueError):
+            co_occurrence_score._compute_metric(score_dict, data_df, metric='XXX')
+
     def test_cocoscore_cv_independent_associations_bad_param(self):
         test_df = dt.load_data_frame(self.cos_cv_test_path, match_distance=True)
         test_df['text'] = test_df['text'].apply(lambda s: s.strip().lower())
@@ -825,7 +947,7 @@ class CooccurrenceTest(unittest.TestCase):
                                                                 fasttext_dim=20,
                                                                 constant_scoring='document')
         self.assertEqual(cm.exception.args[0],
-                         "co_occurrence_score() got an unexpected keyword argument 'sentence_weightXXXX'")
+                         "co_occurrence_score_data_frame() got an unexpected keyword argument 'sentence_weightXXXX'")
 
 
     def test_cocoscore_cv_independent_associations_bad_constant_scoring(self):
@@ -844,6 +966,31 @@ class CooccurrenceTest(unittest.TestCase):
                                                                 constant_scoring='documenti')
         self.assertEqual(cm.exception.args[0], 'Unknown constant_scoring parameter: documenti')
 
+    def test_co_occurrence_score_data_frame(self):
+        for score_file_path in (self.sentence_score_file_path, self.paragraph_score_file_path,
+                                self.document_score_file_path, self.document_paragraph_sentence_score_file_path,
+                                self.precedence_document_paragraph_sentence_score_file_path):
+            score_df = pandas.read_csv(score_file_path, sep='\t', header=None,
+                                       names=['pmid', 'paragraph', 'sentence', 'entity1', 'entity2', 'predicted'])
+            for weights in ({}, {'document_weight': 2.0, 'paragraph_weight': 3.0, 'sentence_weight': 0.5,
+                                 'weighting_exponent': 0.3}):
+                expected = co_occurrence_score.co_occurrence_score(None, score_file_path, None, 0, 0, silent=True,
+                                                                   **weights)
+                actual = co_occurrence_score.co_occurrence_score_data_frame(score_df, **weights)
+                assert_deep_almost_equal(self, expected, actual)
+
+    def test_co_occurrence_score_data_frame_columns(self):
+        score_df = pandas.read_csv(self.sentence_score_file_path, sep='\t', header=None,
+                                   names=['pmid', 'paragraph', 'sentence', 'gene', 'disease', 'score'])
+        expected = co_occurrence_score.co_occurrence_score(None, self.sentence_score_file_path, None, 0, 0,
+                                                           silent=True)
+        actual = co_occurrence_score.co_occurrence_score_data_frame(score_df, score_column='score',
+                                                                    entity_columns=('gene', 'disease'),
+                                                                    return_type='sparse')
+        assert_deep_almost_equal(self, expected, actual.to_dict())
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score_data_frame(score_df, return_type='list')
+
     def test_cocoscore_constant_sentence_scoring(self):
         df = dt.load_data_frame(self.cos_cv_test_path, match_distance=True)
         df['text'] = df['text'].apply(lambda s: s.strip().lower())
@@ -914,3 +1061,196 @@ class CooccurrenceTest(unittest.TestCase):
         for scores in (train_scores, test_scores):
             self.assertTrue((scores[paragraph_matches] == -1).all())
             self.assertTrue((scores[document_matches] == 1).all())
+
+    def test_matches_file_byte_ranges(self):
+        byte_ranges = co_occurrence_score.get_matches_file_byte_ranges(self.matches_file_cross_path, 3)
+        self.assertListEqual([(0, 114), (114, 226), (226, 340)], byte_ranges)
+        documents = []
+        for byte_range in byte_ranges:
+            documents += [sorted(matches[1:3] for matches in document_matches) for document_matches in
+                          co_occurrence_score.load_matches_file(self.matches_file_cross_path, self.entity_file_path,
+                                                                9606, -26, byte_range=byte_range)]
+        self.assertListEqual([sorted(matches[1:3] for matches in document_matches) for document_matches in
+                              co_occurrence_score.load_matches_file(self.matches_file_cross_path,
+                                                                    self.entity_file_path, 9606, -26)],
+                             documents)
+
+    def test_co_occurrence_score_matches_file_cross_parallel(self):
+        for score_file_path in (None, self.sentence_score_file_path):
+            serial_scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, score_file_path,
+                                                                    self.entity_file_path,
+                                                                    first_type=9606, second_type=-26)
+            parallel_scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, score_file_path,
+                                                                      self.entity_file_path,
+                                                                      first_type=9606, second_type=-26, n_jobs=3)
+            assert_deep_almost_equal(self, serial_scores, parallel_scores)
+            with mock.patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+                unforked_scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path,
+                                                                          score_file_path, self.entity_file_path,
+                                                                          first_type=9606, second_type=-26, n_jobs=3)
+            assert_deep_almost_equal(self, serial_scores, unforked_scores)
+
+    def test_load_matches_file_chunked(self):
+        for matches_file_path in (self.matches_file_path, self.matches_file_cross_path,
+                                  self.matches_file_single_matches_path,
+                                  self.matches_document_level_comentions_file_path):
+            expected = [sorted(matches[:3] for matches in document_matches) for document_matches in
+                        co_occurrence_score.load_matches_file(matches_file_path, self.entity_file_path, 9606, -26)]
+            for chunk_size in (1, 3, 1000):
+                actual = [sorted(matches[:3] for matches in document_matches) for document_matches in
+                          co_occurrence_score.load_matches_file_chunked(matches_file_path, self.entity_file_path,
+                                                                        9606, -26, chunk_size=chunk_size)]
+                self.assertListEqual(expected, actual)
+
+    def test_process_document_matches_arrays(self):
+        random_state = numpy.random.RandomState(0)
+        # several serials per entity to check that repeated mentions are merged
+        cross_mapper = {serial: (9606, 'gene_{:d}'.format(serial % 20)) if serial < 40 else
+                        (-26, 'species_{:d}'.format(serial % 20)) for serial in range(80)}
+        single_mapper = {serial: (9606, 'gene_{:d}'.format(serial % 40)) for serial in range(80)}
+        for serial_to_type_entity, first_type, second_type in ((cross_mapper, 9606, -26), (cross_mapper, -26, 9606),
+                                                               (single_mapper, 9606, 9606)):
+            for match_total in (0, 1, 20, 300):
+                serials = random_state.randint(0, 80, size=match_total).tolist()
+                args = (42, random_state.randint(1, 6, size=match_total).tolist(),
+                        random_state.randint(1, 4, size=match_total).tolist(),
+                        [serial_to_type_entity[serial][0] for serial in serials], serials, serial_to_type_entity,
+                        first_type, second_type)
+                expected = sorted(co_occurrence_score._process_document_matches_sets(*args))
+                self.assertListEqual(expected, sorted(co_occurrence_score._process_document_matches_arrays(*args)))
+                self.assertListEqual(expected, sorted(co_occurrence_score.process_document_matches(*args)))
+
+    def test_get_entity_pair_indices(self):
+        type_entities = [(9606, 'A'), (-26, 'B'), (9606, 'C'), (-26, 'D'), (9606, 'E')]
+        entity_types = numpy.array([type_entity[0] for type_entity in type_entities])
+        for first_type, second_type in ((9606, -26), (-26, 9606), (9606, 9606)):
+            if first_type == second_type:
+                my_type_entities = [type_entity for type_entity in type_entities if type_entity[0] == first_type]
+            else:
+                my_type_entities = type_entities
+            my_entity_types = numpy.array([type_entity[0] for type_entity in my_type_entities])
+            indices_1, indices_2 = co_occurrence_score.get_entity_pair_indices(my_entity_types, first_type,
+                                                                               second_type)
+            expected = {frozenset(pair) for pair in co_occurrence_score.get_entity_pairs(set(my_type_entities),
+                                                                                         first_type, second_type)}
+            actual = [frozenset((my_type_entities[i], my_type_entities[j])) for i, j in zip(indices_1, indices_2)]
+            self.assertEqual(len(expected), len(actual))
+            self.assertSetEqual(expected, set(actual))
+        with self.assertRaises(ValueError):
+            co_occurrence_score.get_entity_pair_indices(entity_types, 9606, 10090)
+
+    def test_weighted_counts_max_document_entities(self):
+        # document 2222 mentions three entities, documents 1111 and 3333 two
+        def get_expected(factor):
+            weighted_counts = {}
+            for pmid, entity_1, entity_2, update in co_occurrence_score.iterate_weighted_count_updates(
+                    self.matches_file_cross_path, None, None, None, self.entity_file_path, 9606, -26,
+                    document_weight=15.0, paragraph_weight=0.0, sentence_weight=1.0, silent=True):
+                if pmid == 2222:
+                    update *= factor
+                if update > 0:
+                    for key in ((entity_1, entity_2), entity_1, entity_2, None):
+                        weighted_counts[key] = weighted_counts.get(key, 0.0) + update
+            return weighted_counts
+
+        for matches_chunk_size in (None, 3):
+            for max_document_entities, dense_document_policy, factor in ((2, 'skip', 0.0), (2, 'downweight', 2 / 3),
+                                                                         (3, 'skip', 1.0), (3, 'downweight', 1.0)):
+                weighted_counts = co_occurrence_score.get_weighted_counts(
+                    self.matches_file_cross_path, None, None, None, self.entity_file_path, 9606, -26,
+                    document_weight=15.0, paragraph_weight=0.0, sentence_weight=1.0, silent=True,
+                    matches_chunk_size=matches_chunk_size, max_document_entities=max_document_entities,
+                    dense_document_policy=dense_document_policy)
+                assert_deep_almost_equal(self, get_expected(factor), weighted_counts)
+
+    def test_co_occurrence_score_max_document_entities(self):
+        scores = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                         first_type=9606, second_type=-26, max_document_entities=2,
+                                                         silent=True)
+        self.assertSetEqual({('--D', 'A')}, set(scores))
+        multi_scores, = co_occurrence_score.co_occurrence_score_multi(
+            self.matches_file_cross_path, self.entity_file_path,
+            [{'first_type': 9606, 'second_type': -26, 'max_document_entities': 2,
+              'dense_document_policy': 'downweight'}], silent=True, matches_chunk_size=3)
+        assert_deep_almost_equal(self, co_occurrence_score.co_occurrence_score(
+            self.matches_file_cross_path, None, self.entity_file_path, first_type=9606, second_type=-26,
+            max_document_entities=2, dense_document_policy='downweight', silent=True), multi_scores)
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                    first_type=9606, second_type=-26, max_document_entities=2,
+                                                    dense_document_policy='cap')
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score(None, self.sentence_score_file_path, self.entity_file_path,
+                                                    first_type=9606, second_type=-26, max_document_entities=2)
+
+    def test_co_occurrence_score_matches_file_cross_chunked(self):
+        expected = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, self.sentence_score_file_path,
+                                                           self.entity_file_path, first_type=9606, second_type=-26)
+        actual = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, self.sentence_score_file_path,
+                                                         self.entity_file_path, first_type=9606, second_type=-26,
+                                                         matches_chunk_size=2)
+        assert_deep_almost_equal(self, expected, actual)
+
+    def test_sort_score_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sorted_path = os.path.join(temp_dir, 'sorted_scores.tsv.gz')
+            co_occurrence_score.sort_score_file(self.document_paragraph_sentence_score_file_path, sorted_path,
+                                                max_lines_in_memory=5)
+            pmids = [pmid for pmid, _ in co_occurrence_score.iterate_score_file_documents(sorted_path)]
+            self.assertListEqual([1111, 2222, 3333], pmids)
+            self.assertDictEqual(co_occurrence_score.load_score_file(self.document_paragraph_sentence_score_file_path),
+                                 co_occurrence_score.load_score_file(sorted_path))
+
+    def test_iterate_score_file_documents_unsorted(self):
+        with self.assertRaises(ValueError):
+            list(co_occurrence_score.iterate_score_file_documents(self.paragraph_sentence_score_file_path))
+
+    def test_co_occurrence_score_streaming(self):
+        score_file_paths = (self.sentence_score_file_path, self.paragraph_score_file_path,
+                            self.document_score_file_path, self.paragraph_sentence_score_file_path,
+                            self.document_paragraph_sentence_score_file_path, self.document_paragraph_score_file_path,
+                            self.precedence_document_paragraph_sentence_score_file_path)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for score_file_path in score_file_paths:
+                sorted_path = os.path.join(temp_dir, os.path.basename(score_file_path))
+                co_occurrence_score.sort_score_file(score_file_path, sorted_path, max_lines_in_memory=2)
+                for ignore_scores in (False, True):
+                    expected = co_occurrence_score.co_occurrence_score(None, score_file_path, None,
+                                                                       first_type=9606, second_type=-26,
+                                                                       document_weight=2.0, paragraph_weight=1.5,
+                                                                       ignore_scores=ignore_scores)
+                    actual = co_occurrence_score.co_occurrence_score(None, sorted_path, None,
+                                                                     first_type=9606, second_type=-26,
+                                                                     document_weight=2.0, paragraph_weight=1.5,
+                                                                     ignore_scores=ignore_scores, streaming=True)
+                    assert_deep_almost_equal(self, expected, actual)
+
+    def test_co_occurrence_score_streaming_bad_param(self):
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score(self.matches_file_path, self.sentence_score_file_path,
+                                                    self.entity_file_path, first_type=9606, second_type=-26,
+                                                    streaming=True)
+
+    def test_co_occurrence_score_multi(self):
+        targets = [{'first_type': 9606, 'second_type': -26, 'score_file_path': self.sentence_score_file_path,
+                    'document_weight': 2.0, 'paragraph_weight': 1.5},
+                   {'first_type': -26, 'second_type': 9606, 'ignore_scores': True, 'weighting_exponent': 0.3},
+                   {'first_type': 9606, 'second_type': 9606, 'ignore_scores': True}]
+        actual = co_occurrence_score.co_occurrence_score_multi(self.matches_file_cross_path, self.entity_file_path,
+                                                               targets, matches_chunk_size=3)
+        self.assertEqual(len(targets), len(actual))
+        for target, target_scores in zip(targets, actual):
+            target = {'score_file_path': None, **target}
+            expected = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path,
+                                                               entities_file=self.entity_file_path,
+                                                               matches_chunk_size=3, **target)
+            self.assertGreater(len(expected), 0)
+            self.assertDictEqual(expected, target_scores)
+
+    def test_co_occurrence_score_multi_bad_target(self):
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score_multi(self.matches_file_cross_path, self.entity_file_path,
+                                                          [{'first_type': 9606}])
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score_multi(self.matches_file_cross_path, self.entity_file_path,
+                                                          [{'first_type': 9606, 'second_type': -26, 'weight': 1}])
@@ -0,0 +1,58 @@
+import collections
+import math
+import random
+import unittest
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_sketch import CountMinPairSketch, co_occurrence_score_sketch
+
+
+class CountMinPairSketchTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    sentence_score_file_path = 'tests/tagger/sentence_scores_file.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+
+    def test_large_budget_is_exact(self):
+        for matches_file_path, score_file_path in ((self.matches_file_cross_path, None),
+                                                   (self.matches_file_cross_path, self.sentence_score_file_path)):
+            expected = co_occurrence_score.co_occurrence_score(matches_file_path, score_file_path,
+                                                               self.entity_file_path, first_type=9606,
+                                                               second_type=-26, silent=True)
+            actual = co_occurrence_score_sketch(matches_file_path, score_file_path, self.entity_file_path,
+                                                first_type=9606, second_type=-26, memory_budget_bytes=2 ** 20,
+                                                heavy_hitter_count=10, silent=True)
+            self.assertSetEqual(set(expected), set(actual))
+            for pair, (score, lower_bound, upper_bound) in actual.items():
+                self.assertAlmostEqual(expected[pair], score)
+                self.assertLessEqual(lower_bound, expected[pair] + 1e-12)
+                self.assertGreaterEqual(upper_bound, expected[pair] - 1e-12)
+
+    def test_small_budget(self):
+        random_state = random.Random(0)
+        depth = 4
+        sketch = CountMinPairSketch(memory_budget_bytes=8 * depth * 200 + 16 * 20, heavy_hitter_count=20,
+                                    depth=depth, batch_size=97)
+        self.assertLessEqual(sketch.memory_bytes(), 8 * depth * 200 + 16 * 20)
+        counts = collections.defaultdict(float)
+        for _ in range(20000):
+            # a few frequent pairs among many rare ones
+            if random_state.random() < 0.3:
+                pair = ('A{}'.format(random_state.randrange(5)), 'B0')
+            else:
+                pair = ('C{}'.format(random_state.randrange(1000)), 'D{}'.format(random_state.randrange(100)))
+            update = random_state.random()
+            sketch.add(*pair, update)
+            counts[pair] += update
+
+        heavy_hitters = sketch.get_heavy_hitters()
+        self.assertEqual(20, len(heavy_hitters))
+        for i in range(5):
+            self.assertIn(('A{}'.format(i), 'B0'), heavy_hitters)
+        self.assertAlmostEqual(sum(counts.values()), sketch.total_count)
+        within_bounds = [counts[pair] <= estimate <= counts[pair] + sketch.error_bound + 1e-9
+                         for pair, estimate in heavy_hitters.items()]
+        self.assertGreaterEqual(sum(within_bounds) / len(within_bounds), 1 - math.exp(-depth))
+
+    def test_budget_too_small(self):
+        with self.assertRaises(ValueError):
+            CountMinPairSketch(memory_budget_bytes=100, heavy_hitter_count=10)
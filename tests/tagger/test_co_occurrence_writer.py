@@ -0,0 +1,91 @@
+import gzip
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import pandas
+
+import cocoscore.tagger.co_occurrence_score as co_occurrence_score
+from cocoscore.tagger.co_occurrence_writer import write_co_occurrence_scores
+
+zstandard_available = importlib.util.find_spec('zstandard') is not None
+pyarrow_available = importlib.util.find_spec('pyarrow') is not None
+
+
+def read_tsv(file_path):
+    with (gzip.open(file_path, 'rt') if file_path.endswith('.gz') else open(file_path, 'rt')) as f:
+        return [(entity_1, entity_2, float(score)) for entity_1, entity_2, score in
+                (line.rstrip('\n').split('\t') for line in f)]
+
+
+class CoOccurrenceWriterTest(unittest.TestCase):
+    matches_file_cross_path = 'tests/tagger/matches_file_cross.tsv'
+    entity_file_path = 'tests/tagger/entities2.tsv.gz'
+    scores = {('B', 'X'): 0.5, ('A', 'Y'): 3.0, ('A', 'X'): 1.0, ('C', 'Z'): 2.0, ('A', 'Z'): 2.0}
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_sort_orders(self):
+        expected_orders = {
+            'pair': [('A', 'X', 1.0), ('A', 'Y', 3.0), ('A', 'Z', 2.0), ('B', 'X', 0.5), ('C', 'Z', 2.0)],
+            'score': [('A', 'Y', 3.0), ('A', 'Z', 2.0), ('C', 'Z', 2.0), ('A', 'X', 1.0), ('B', 'X', 0.5)],
+            'entity': [('A', 'Y', 3.0), ('A', 'Z', 2.0), ('A', 'X', 1.0), ('B', 'X', 0.5), ('C', 'Z', 2.0)],
+        }
+        for sort, expected in expected_orders.items():
+            for chunk_size in (1, 2, 100):
+                file_path = os.path.join(self.temp_dir.name, 'scores.tsv.gz')
+                self.assertEqual(5, write_co_occurrence_scores(self.scores, file_path, sort=sort,
+                                                               chunk_size=chunk_size))
+                self.assertListEqual(expected, read_tsv(file_path))
+
+    def test_unsorted_threshold(self):
+        file_path = os.path.join(self.temp_dir.name, 'scores.tsv')
+        self.assertEqual(3, write_co_occurrence_scores(self.scores, file_path, score_threshold=2.0, chunk_size=2))
+        self.assertListEqual([('A', 'Y', 3.0), ('C', 'Z', 2.0), ('A', 'Z', 2.0)], read_tsv(file_path))
+
+    def test_unknown_sort(self):
+        with self.assertRaises(ValueError):
+            write_co_occurrence_scores(self.scores, os.path.join(self.temp_dir.name, 'scores.tsv'), sort='name')
+
+    @unittest.skipUnless(zstandard_available, 'zstd output requires zstandard')
+    def test_zstd(self):
+        import zstandard
+        file_path = os.path.join(self.temp_dir.name, 'scores.tsv.zst')
+        write_co_occurrence_scores(self.scores, file_path, sort='pair')
+        with open(file_path, 'rb') as f:
+            lines = zstandard.ZstdDecompressor().stream_reader(f).read().decode('utf-8').splitlines()
+        self.assertEqual('A\tX\t1.0', lines[0])
+
+    @unittest.skipUnless(pyarrow_available, 'Parquet output requires pyarrow')
+    def test_parquet(self):
+        file_path = os.path.join(self.temp_dir.name, 'scores.parquet')
+        write_co_occurrence_scores(self.scores, file_path, sort='score', chunk_size=2)
+        self.assertListEqual([3.0, 2.0, 2.0, 1.0, 0.5], pandas.read_parquet(file_path)['score'].tolist())
+
+    def test_co_occurrence_score_output_file(self):
+        expected = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                           first_type=9606, second_type=-26, silent=True)
+        for kwargs in ({}, {'engine': 'numpy'}, {'compact_counts': True}):
+            file_path = os.path.join(self.temp_dir.name, 'scores.tsv.gz')
+            row_count = co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None,
+                                                                self.entity_file_path, first_type=9606,
+                                                                second_type=-26, silent=True,
+                                                                output_file_path=file_path, output_sort='pair',
+                                                                **kwargs)
+            rows = read_tsv(file_path)
+            self.assertEqual(len(expected), row_count)
+            self.assertListEqual(sorted(expected), [row[:2] for row in rows])
+            for entity_1, entity_2, score in rows:
+                self.assertAlmostEqual(expected[(entity_1, entity_2)], score)
+
+    def test_co_occurrence_score_output_file_sparse(self):
+        with self.assertRaises(ValueError):
+            co_occurrence_score.co_occurrence_score(self.matches_file_cross_path, None, self.entity_file_path,
+                                                    first_type=9606, second_type=-26,
+                                                    output_file_path=os.path.join(self.temp_dir.name, 'scores.tsv'),
+                                                    return_type='sparse')
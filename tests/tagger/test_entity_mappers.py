@@ -1,4 +1,7 @@
 #!/usr/bin/env python
+import os
+import shutil
+import tempfile
 import unittest
 
 import cocoscore.tagger.entity_mappers as ent
@@ -40,5 +43,63 @@ class EntityMapperTest(unittest.TestCase):
                                                       compressed=True)
         self.assertDictEqual({(9606, '--D'): '--D', (-26, 'A'): 'A', (-26, ' B-  b '): ' B-  b '}, obtained)
 
+    def test_serial_mapper_memo(self):
+        ent.clear_serial_mapper_memo()
+        obtained = ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False)
+        with self.assertRaises(TypeError):
+            obtained[1] = (-26, 'changed')
+        with self.assertRaises(TypeError):
+            obtained.update({2: (-26, 'E')})
+        # cached mappers are shared instead of copied
+        self.assertIs(obtained, ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False))
+        self.assertDictEqual({1000: (9606, '--D'), 1: (-26, 'A'), 10: (-26, ' B-  b ')},
+                             ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False))
+        self.assertDictEqual({1000: (9606, '--D')},
+                             ent.get_serial_to_taxid_name_mapper(self.entity_file, taxids=(9606,), compressed=False))
+
+    def test_serial_mapper_memo_max_bytes(self):
+        ent.clear_serial_mapper_memo()
+        obtained = ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False, memo_max_bytes=0)
+        self.assertIsNot(obtained, ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False,
+                                                                       memo_max_bytes=0))
+        # mappers are dropped least recently used first once their total size exceeds the limit
+        mapper_bytes = ent._get_serial_mapper_bytes(obtained)
+        first = ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False, memo_max_bytes=mapper_bytes)
+        ent.get_serial_to_taxid_name_mapper(self.entity_file, taxids=(9606,), compressed=False,
+                                            memo_max_bytes=mapper_bytes)
+        self.assertIsNot(first, ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False))
+
+    def test_serial_mapper_disk_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            entity_file = os.path.join(temp_dir, 'entities.tsv')
+            shutil.copyfile(self.entity_file, entity_file)
+            cache_dir = os.path.join(temp_dir, 'cache')
+            expected = {1000: (9606, '--D'), 1: (-26, 'A'), 10: (-26, ' B-  b ')}
+            ent.clear_serial_mapper_memo()
+            self.assertDictEqual(expected, ent.get_serial_to_taxid_name_mapper(entity_file, compressed=False,
+                                                                               cache_dir=cache_dir))
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            ent.clear_serial_mapper_memo()
+            self.assertDictEqual(expected, ent.get_serial_to_taxid_name_mapper(entity_file, compressed=False,
+                                                                               cache_dir=cache_dir))
+
+            # changing the entity file invalidates cached mappers
+            with open(entity_file, 'at') as fout:
+                fout.write('\n2\t-26\tE')
+            expected[2] = (-26, 'E')
+            self.assertDictEqual(expected, ent.get_serial_to_taxid_name_mapper(entity_file, compressed=False,
+                                                                               cache_dir=cache_dir))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+    def test_serial_mapper_disk_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ent.clear_serial_mapper_memo()
+            ent.get_serial_to_taxid_name_mapper(self.entity_file, compressed=False, cache_dir=cache_dir)
+            cache_file_size = os.path.getsize(os.path.join(cache_dir, os.listdir(cache_dir)[0]))
+            obtained = ent.get_serial_to_taxid_name_mapper(self.entity_file, taxids=(9606,), compressed=False,
+                                                           cache_dir=cache_dir, cache_max_bytes=cache_file_size)
+            self.assertDictEqual({1000: (9606, '--D')}, obtained)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
     if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from cocoscore.tools.benchmark import benchmarks, compare_benchmarks, measure, run_benchmarks
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_measure(self):
+        result = measure(lambda: [0] * 100000, repeat=2)
+        self.assertEqual(2, len(result['seconds_all']))
+        self.assertEqual(min(result['seconds_all']), result['seconds'])
+        self.assertGreaterEqual(result['peak_memory_bytes'], 800000)
+        self.assertIsNone(measure(lambda: None, repeat=1, measure_memory=False)['peak_memory_bytes'])
+        with self.assertRaises(ValueError):
+            measure(lambda: None, repeat=0)
+
+    def test_run_and_compare_benchmarks(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, 'results.json')
+            corpus_dir = os.path.join(temp_dir, 'corpora')
+            results = run_benchmarks(sizes=(60,), repeat=1, output_path=output_path, corpus_dir=corpus_dir,
+                                     silent=True)
+            self.assertEqual(sorted(benchmarks), sorted(result['benchmark'] for result in results['results']))
+            self.assertIn('commit', results['metadata'])
+            self.assertTrue(os.path.isfile(os.path.join(corpus_dir, 'corpus_60_0', 'dataset.tsv')))
+
+            # reuses the stored corpus
+            current = run_benchmarks(sizes=(60,), benchmark_names=['load_score_file'], repeat=1,
+                                     measure_memory=False, corpus_dir=corpus_dir, silent=True)
+            comparison_df = compare_benchmarks(output_path, current)
+            self.assertEqual(['load_score_file'], comparison_df['benchmark'].tolist())
+            self.assertGreater(comparison_df['time_ratio'].iloc[0], 0)
+        with self.assertRaises(ValueError):
+            run_benchmarks(sizes=(10,), benchmark_names=['unknown'], silent=True)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from cocoscore.tagger.co_occurrence_score import co_occurrence_score, get_score_file_levels
+from cocoscore.tools.data_tools import load_data_frame
+from cocoscore.tools.synthetic_data import generate_corpus, generate_documents, get_zipf_probabilities
+
+
+class SyntheticDataTest(unittest.TestCase):
+
+    def test_zipf_probabilities(self):
+        probabilities = get_zipf_probabilities(10, 1.0)
+        self.assertAlmostEqual(1.0, probabilities.sum())
+        self.assertAlmostEqual(2.0, probabilities[0] / probabilities[1])
+        np.testing.assert_allclose(get_zipf_probabilities(4, 0.0), np.full(4, 0.25))
+
+    def test_generate_documents_zipf(self):
+        first_counts = np.zeros(100)
+        for _, first_entities, _, mentions in generate_documents(500, entity_count=100, entities_per_document=10,
+                                                                 random_state=np.random.RandomState(0)):
+            first_counts[first_entities] += 1
+            self.assertEqual(sorted(mentions), mentions)
+        self.assertGreater(first_counts[0], 5 * first_counts[50:].mean())
+
+    def test_generate_corpus_reproducible(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            contents = []
+            for sub_dir in ('a', 'b'):
+                paths = generate_corpus(os.path.join(temp_dir, sub_dir), document_count=30, random_seed=3)
+                with open(paths['score_file']) as score_file, open(paths['matches_file']) as matches_file:
+                    contents.append((score_file.read(), matches_file.read()))
+            self.assertEqual(contents[0], contents[1])
+
+    def test_generate_corpus_level_mix(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = generate_corpus(temp_dir, document_count=50, level_mix=(1, 0, 0), random_seed=0)
+            self.assertEqual((True, False, False), get_score_file_levels(paths['score_file']))
+            paths = generate_corpus(temp_dir, document_count=50, level_mix=(0, 0, 1), random_seed=0)
+            self.assertEqual((False, False, True), get_score_file_levels(paths['score_file']))
+        with self.assertRaises(ValueError):
+            generate_corpus(temp_dir, level_mix=(1, 0))
+
+    def test_generate_corpus_loads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = generate_corpus(temp_dir, document_count=50, random_seed=0)
+            scores_matches = co_occurrence_score(paths['matches_file'], paths['score_file'], paths['entities_file'],
+                                                 9606, -26, silent=True)
+            scores_only = co_occurrence_score(None, paths['score_file'], None, 0, 0, silent=True)
+            self.assertGreater(len(scores_matches), 0)
+            # pairs scored only at paragraph level get zero weight without matches
+            self.assertGreater(len(scores_only), 0)
+            self.assertTrue(set(scores_only) <= set(scores_matches))
+            data_df = load_data_frame(paths['dataset_file'], match_distance=True)
+            self.assertEqual({0, 1}, set(data_df['class']))
+            self.assertTrue((data_df.loc[data_df['sentence'] == -1, 'distance'] > 0).all())
+            # labels are consistent across all rows of a pair
+            self.assertEqual(1, data_df.groupby(['entity1', 'entity2'])['class'].nunique().max())